@@ -0,0 +1 @@
+# Performance benchmarks (require a running database)
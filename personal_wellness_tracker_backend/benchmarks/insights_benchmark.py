@@ -0,0 +1,121 @@
+"""
+Benchmark: vectorized insights (analytics.to_arrays + analytics.summarize)
+vs. a naive per-row Python loop over the same daily rows.
+
+Uses synthetic in-memory data (no database needed), 5 years by default,
+and checks both implementations agree before timing them.
+
+    poetry run python -m benchmarks.insights_benchmark --years 5
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from personal_wellness_tracker_backend import analytics
+
+TARGETS = {"calories": 2000, "water": 8, "exercise_minutes": 30, "sleep_hours": 8.0}
+
+
+def synthetic_rows(days: int, seed: int = 42):
+    """Rows shaped like analytics._DAILY_SQL output (NaN = missing); ~15% of days have no data"""
+    rng = random.Random(seed)
+    nan = float("nan")
+    rows = []
+    for day_index in range(days):
+        if rng.random() < 0.15:
+            continue
+        rows.append((
+            day_index,
+            float(rng.randint(1200, 2800)) if rng.random() > 0.1 else nan,
+            float(rng.randint(2, 12)) if rng.random() > 0.1 else nan,
+            float(rng.choice([0, 15, 30, 45, 60])) if rng.random() > 0.3 else nan,
+            round(rng.uniform(5, 9.5), 1) if rng.random() > 0.2 else nan,
+        ))
+    return rows
+
+
+def naive_insights(rows, n_days: int, window_days: int):
+    """Per-row reference: dict lookups and loops, no NumPy"""
+    by_day = {row[0]: row[1:] for row in rows}
+    offset = n_days - window_days
+    result = {}
+    for m, metric in enumerate(analytics.METRICS):
+        series = []
+        for i in range(n_days):
+            value = by_day[i][m] if i in by_day else None
+            series.append(None if value is None or value != value else value)
+        rolling = []
+        for i in range(n_days):
+            window = [v for v in series[max(0, i - analytics.ROLLING_DAYS + 1):i + 1] if v is not None]
+            rolling.append(sum(window) / len(window) if window else None)
+        logged = [v for v in series[offset:] if v is not None]
+        target = TARGETS[metric]
+        if metric == "calories":
+            met = [abs(v - target) <= target * analytics.CALORIE_TOLERANCE for v in logged]
+        else:
+            met = [v >= target for v in logged]
+        weeks = []
+        for end in range(n_days, 6, -7):
+            block = [v for v in series[end - 7:end] if v is not None]
+            weeks.insert(0, sum(block) / len(block) if block else None)
+        result[metric] = {
+            "rolling": rolling[offset:],
+            "adherence": sum(met) / len(met) if met else None,
+            "weekly": weeks,
+        }
+    return result
+
+
+def check(vectorized, naive):
+    for metric, expected in naive.items():
+        got = vectorized.metrics[metric]
+        for a, b in zip(got.rolling_7d, expected["rolling"]):
+            assert (a is None and b is None) or abs(a - round(b, 2)) < 0.011, (metric, a, b)
+        if expected["adherence"] is not None:
+            assert abs(got.adherence - expected["adherence"]) < 1e-9, metric
+        for week, mean in zip(got.weekly, expected["weekly"][-len(got.weekly):]):
+            assert (week.average is None and mean is None) or abs(week.average - round(mean, 2)) < 0.011, metric
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    date_to = date.today()
+    window_days = args.years * 365
+    loaded_from = date_to - timedelta(days=window_days + 6)
+    n_days = window_days + 7
+    rows = synthetic_rows(n_days)
+
+    def vectorized():
+        arrays = analytics.to_arrays(rows, loaded_from, date_to)
+        return analytics.summarize(arrays, loaded_from, date_to, window_days, TARGETS)
+
+    def naive():
+        return naive_insights(rows, n_days, window_days)
+
+    check(vectorized(), naive())
+    vector_ms = timed(vectorized, args.repeat)
+    naive_ms = timed(naive, args.repeat)
+    print(f"{len(rows)} daily rows over {args.years} years")
+    print(f"{'implementation':<16} {'median ms':>10}")
+    print(f"{'numpy':<16} {vector_ms:>10.2f}")
+    print(f"{'naive loop':<16} {naive_ms:>10.2f}")
+    print(f"speedup: {naive_ms / vector_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
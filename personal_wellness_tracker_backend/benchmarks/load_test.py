@@ -0,0 +1,83 @@
+"""
+Load test: requests/sec and latency of authenticated endpoints under
+concurrent clients.
+
+Start the API with DB_ASYNC=True and again with DB_ASYNC=False, then run:
+    poetry run python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --clients 50 200 1000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient) -> tuple[str, str]:
+    email = f"load_{uuid.uuid4().hex[:12]}@bench.local"
+    password = "bench-password"
+    resp = await client.post("/api/auth/register", json={"email": email, "password": password})
+    resp.raise_for_status()
+    user_id = resp.json()["data"]["user_id"]
+    resp = await client.post("/api/auth/login", data={"username": email, "password": password})
+    resp.raise_for_status()
+    return user_id, resp.json()["access_token"]
+
+
+async def run_level(base_url: str, clients: int, duration: float, paths: list[str], token: str):
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(path)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    p50 = latencies[count // 2] * 1000 if count else 0
+    p99 = latencies[max(int(count * 0.99) - 1, 0)] * 1000 if count else 0
+    print(f"{clients:>8} {count / elapsed:>10.1f} {p50:>10.1f} {p99:>10.1f} {errors:>8}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        user_id, token = await login(client)
+
+    paths = [
+        f"/users/{user_id}",
+        f"/users/{user_id}/goals/",
+        f"/users/{user_id}/food-logs/",
+        f"/users/{user_id}/meals/",
+    ]
+    print(f"{'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for clients in args.clients:
+        await run_level(args.base_url, clients, args.duration, paths, token)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
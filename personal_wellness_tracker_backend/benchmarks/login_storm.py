@@ -0,0 +1,73 @@
+"""
+Benchmark: login throughput during a login storm, and p99 latency of an
+unrelated endpoint (/health) measured at the same time.
+
+    poetry run python -m benchmarks.login_storm --base-url http://127.0.0.1:8000 --logins 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(int(len(values) * pct) - 1, 0)] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    email = f"storm_{uuid.uuid4().hex[:12]}@bench.local"
+    password = "bench-password"
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        (await client.post("/api/auth/register", json={"email": email, "password": password})).raise_for_status()
+
+        login_latencies: list[float] = []
+        health_latencies: list[float] = []
+        status_counts: dict[int, int] = {}
+        remaining = args.logins
+        done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                resp = await client.post("/api/auth/login", data={"username": email, "password": password})
+                login_latencies.append(time.perf_counter() - start)
+                status_counts[resp.status_code] = status_counts.get(resp.status_code, 0) + 1
+
+        async def health_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(health_probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    succeeded = status_counts.get(200, 0)
+    print(f"logins/s (200 OK):   {succeeded / elapsed:.1f}")
+    print(f"status codes:        {dict(sorted(status_counts.items()))}")
+    print(f"login p50/p99 ms:    {percentile(login_latencies, 0.5):.1f} / {percentile(login_latencies, 0.99):.1f}")
+    print(f"/health p50/p99 ms:  {percentile(health_latencies, 0.5):.1f} / {percentile(health_latencies, 0.99):.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Benchmark: bulk nutrition import (nutrition_import, COPY + batched upsert)
+vs. one crud.create_nutrition_item call per row.
+
+Writes a synthetic catalog file (nutrition_search_benchmark.catalog) of
+--rows rows, imports it twice (inserts, then no-op upserts) and reports
+rows/s and the peak RSS, which should not grow with the file size.
+Imported items have a "bench-" id prefix; all created items are removed afterwards.
+
+    poetry run python -m benchmarks.nutrition_import_benchmark --rows 500000 --format csv
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.nutrition_search_benchmark import catalog
+from personal_wellness_tracker_backend import crud, models, nutrition_import, schemas
+from personal_wellness_tracker_backend.database import SessionLocal
+
+COLUMNS = ["id", "food_name", "food_name_en", "calories", "protein", "carbs", "fat"]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_file(path: str, rows: int, fmt: str):
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        writer = csv.DictWriter(out, COLUMNS, extrasaction="ignore") if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for row in catalog(rows):
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps({key: row[key] for key in COLUMNS}, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--format", choices=nutrition_import.FORMATS, default="csv")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--baseline-rows", type=int, default=2_000, help="rows created one request at a time")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=f".{args.format}", prefix="nutrition-import-")
+    os.close(fd)
+    db, created = SessionLocal(), []
+    try:
+        write_file(path, args.rows, args.format)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1024 / 1024:.0f} MB {args.format}; "
+              f"peak RSS before import {peak_rss_mb():.0f} MB")
+
+        for label in ("import (insert)", "re-import (unchanged)"):
+            result = nutrition_import.import_file(db, path, args.format, batch_size=args.batch_size)
+            print(f"{label:<22} {result.rows_per_second:>8.0f} rows/s  {result.seconds:>6.1f}s  "
+                  f"inserted {result.inserted}, updated {result.updated}, unchanged {result.unchanged}, "
+                  f"rejected {result.rejected}; peak RSS {peak_rss_mb():.0f} MB")
+
+        start = time.perf_counter()
+        for row in catalog(args.baseline_rows):
+            created.append(crud.create_nutrition_item(db, schemas.NutritionDatabaseCreate(
+                **{key: row[key] for key in COLUMNS[1:]}
+            )).id)
+        elapsed = time.perf_counter() - start
+        print(f"{'per-row create':<22} {args.baseline_rows / elapsed:>8.0f} rows/s  "
+              f"(~{args.rows / (args.baseline_rows / elapsed) / 60:.0f} min for {args.rows} rows)")
+    finally:
+        os.unlink(path)
+        db.rollback()
+        db.query(models.NutritionDatabase).filter(
+            models.NutritionDatabase.id.like("bench-%") | models.NutritionDatabase.id.in_(created)
+        ).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: p50/p95/p99 latency of nutrition.search over a synthetic
+Thai/English catalog (500k items by default), per query kind, compared
+with the unindexed ILIKE '%name%' scan it replaces.
+
+Items are inserted with a "bench-" id prefix and removed afterwards.
+
+    poetry run python -m benchmarks.nutrition_search_benchmark --items 500000
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from sqlalchemy import insert, text
+
+from personal_wellness_tracker_backend import models, nutrition
+from personal_wellness_tracker_backend.database import SessionLocal
+
+DISHES = [
+    ("ข้าวผัด", "fried rice"), ("ผัดกะเพรา", "stir-fried holy basil"), ("ต้มยำ", "tom yum"),
+    ("แกงเขียวหวาน", "green curry"), ("ก๋วยเตี๋ยวน้ำใส", "clear noodle soup"), ("ส้มตำ", "papaya salad"),
+    ("ผัดไทย", "pad thai"), ("ข้าวมันไก่", "chicken rice"), ("แกงส้ม", "sour curry"),
+    ("ต้มข่า", "coconut galangal soup"), ("ราดหน้า", "rad na noodles"), ("ผัดซีอิ๊ว", "pad see ew"),
+    ("ข้าวขาหมู", "stewed pork leg rice"), ("โจ๊ก", "rice porridge"), ("บะหมี่แห้ง", "dry egg noodles"),
+    ("ลาบ", "larb"), ("สุกี้น้ำ", "suki soup"), ("ข้าวหมูแดง", "red pork rice"),
+    ("แกงมัสมั่น", "massaman curry"), ("ยำวุ้นเส้น", "glass noodle salad"),
+]
+PROTEINS = [
+    ("ไก่", "chicken"), ("หมู", "pork"), ("กุ้ง", "shrimp"), ("ปลาหมึก", "squid"), ("เนื้อ", "beef"),
+    ("ทะเล", "seafood"), ("เต้าหู้", "tofu"), ("หมูกรอบ", "crispy pork"), ("ปลา", "fish"), ("ไข่", "egg"),
+]
+STYLES = [
+    ("", ""), ("พิเศษ", "large"), ("ไข่ดาว", "with fried egg"), ("เผ็ดน้อย", "mild"),
+    ("ไม่ใส่ผัก", "no vegetables"), ("จานเล็ก", "small"), ("คลีน", "clean"), ("ไข่เจียว", "with omelette"),
+]
+
+
+def catalog(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    combos = list(itertools.product(DISHES, PROTEINS, STYLES))
+    for i in range(count):
+        (dish, dish_en), (protein, protein_en), (style, style_en) = combos[i % len(combos)]
+        brand = i // len(combos)
+        food_name = " ".join(part for part in (f"{dish}{protein}", style, f"ร้าน {brand}") if part)
+        food_name_en = " ".join(part for part in (f"{protein_en} {dish_en}", style_en, f"shop {brand}") if part)
+        yield {
+            "id": f"bench-{i}",
+            "food_name": food_name,
+            "food_name_en": food_name_en,
+            "search_name": nutrition.normalize_name(food_name, food_name_en),
+            "calories": float(rng.randint(150, 900)),
+            "protein": round(rng.uniform(2, 45), 1),
+            "carbs": round(rng.uniform(5, 120), 1),
+            "fat": round(rng.uniform(1, 45), 1),
+        }
+
+
+def queries(rng: random.Random, count: int):
+    """(kind, query) pairs: exact-ish Thai, Thai prefix, Thai without tone marks, typo, English word"""
+    kinds = []
+    for _ in range(count):
+        (dish, dish_en), (protein, protein_en) = rng.choice(DISHES), rng.choice(PROTEINS)
+        name = f"{dish}{protein}"
+        kinds += [
+            ("thai", name),
+            ("thai prefix", dish[:max(3, len(dish) // 2)]),
+            ("no tone marks", name.translate(dict.fromkeys(range(0x0E48, 0x0E4C), None))),
+            ("typo", name[:len(name) // 2] + name[len(name) // 2 + 1:]),
+            ("english", f"{protein_en} {dish_en.split()[-1]}"),
+        ]
+    return kinds
+
+
+def percentile(sorted_ms, p: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=100, help="queries per kind")
+    parser.add_argument("--scan-queries", type=int, default=10, help="ILIKE scans to time")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rows = catalog(args.items)
+        while batch := list(itertools.islice(rows, args.batch_size)):
+            db.execute(insert(models.NutritionDatabase), batch)
+        db.commit()
+        db.execute(text("ANALYZE nutrition_database"))
+        db.commit()
+        print(f"Inserted {args.items} items in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(1)
+        timings, empty = {}, {}
+        for kind, query in queries(rng, args.queries):
+            start = time.perf_counter()
+            results = nutrition.search(db, query, limit=20)
+            timings.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+            empty[kind] = empty.get(kind, 0) + (not results)
+            db.rollback()
+
+        scan_ms = []
+        # The previous crud query: ILIKE on the raw name, no limit
+        for _, query in queries(rng, args.scan_queries)[::5]:
+            start = time.perf_counter()
+            db.query(models.NutritionDatabase).filter(
+                models.NutritionDatabase.food_name.ilike(f"%{query}%")
+            ).all()
+            scan_ms.append((time.perf_counter() - start) * 1000)
+
+        print(f"{'query kind':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'no result':>10}")
+        for kind, ms in timings.items():
+            ms.sort()
+            print(f"{kind:<16} {statistics.median(ms):>8.2f} {percentile(ms, 0.95):>8.2f} "
+                  f"{percentile(ms, 0.99):>8.2f} {empty[kind]:>10}")
+        scan_ms.sort()
+        print(f"{'ILIKE scan':<16} {statistics.median(scan_ms):>8.2f} {percentile(scan_ms, 0.95):>8.2f} "
+              f"{percentile(scan_ms, 0.99):>8.2f}")
+    finally:
+        db.rollback()
+        db.query(models.NutritionDatabase).filter(
+            models.NutritionDatabase.id.like("bench-%")
+        ).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
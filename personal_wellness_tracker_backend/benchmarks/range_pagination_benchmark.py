@@ -0,0 +1,73 @@
+"""
+Benchmark: per-page latency of the keyset-paginated food log range query
+at page 1 and page 500, compared with OFFSET/LIMIT paging.
+
+    poetry run python -m benchmarks.range_pagination_benchmark --pages 500 --page-size 50
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from personal_wellness_tracker_backend import crud, models
+from personal_wellness_tracker_backend.database import SessionLocal
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = args.pages * args.page_size
+    user_id = f"bench_{uuid.uuid4()}"
+    first_day = date(1900, 1, 1)
+    last_day = first_day + timedelta(days=rows - 1)
+
+    db = SessionLocal()
+    try:
+        db.add(models.User(uid=user_id, email=f"{user_id}@bench.local", password_hash="x"))
+        db.flush()
+        db.execute(insert(models.FoodLog), [
+            {"id": str(uuid.uuid4()), "user_id": user_id, "date": first_day + timedelta(days=i)}
+            for i in range(rows)
+        ])
+        db.commit()
+
+        # Walk to the last page to collect its cursor
+        cursor, cursors = None, [None]
+        for _ in range(args.pages - 1):
+            page = crud.get_food_logs_range(db, user_id, first_day, last_day, cursor, args.page_size)
+            cursor = page.next_cursor
+            cursors.append(cursor)
+
+        print(f"{'page':>6} {'keyset ms':>10} {'offset ms':>10}")
+        for page_no in (1, args.pages):
+            keyset_ms = timed(lambda: crud.get_food_logs_range(
+                db, user_id, first_day, last_day, cursors[page_no - 1], args.page_size), args.repeat)
+            offset_ms = timed(lambda: crud.get_food_logs(
+                db, user_id, skip=(page_no - 1) * args.page_size, limit=args.page_size), args.repeat)
+            print(f"{page_no:>6} {keyset_ms:>10.2f} {offset_ms:>10.2f}")
+    finally:
+        db.rollback()
+        db.query(models.FoodLog).filter(models.FoodLog.user_id == user_id).delete(synchronize_session=False)
+        db.query(models.User).filter(models.User.uid == user_id).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: list response serialization, response_model validation of ORM
+objects (the FastAPI default) vs. serializers (column rows + orjson).
+
+For meals, food logs and achievements of --rows sizes, times turning the
+fetched rows into the response body: ORM objects validated with
+from_attributes, dumped and encoded with json (as JSONResponse does) vs.
+row tuples through the precompiled serializer and orjson. The two bodies
+are checked to decode to the same JSON first. Synthetic rows, no database
+needed; the cheaper column-only fetch comes on top of these numbers.
+
+    poetry run python -m benchmarks.serialization_benchmark --rows 100 1000 10000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from personal_wellness_tracker_backend import models, schemas, serializers
+
+
+def synthetic_rows(serializer: serializers.RowSerializer, count: int, seed: int = 42):
+    """Row tuples in serializer.columns order, with values shaped like the real columns"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 7, 30)
+    values = {
+        "id": lambda n: f"00000000-0000-4000-8000-{n:012d}",
+        "user_id": lambda n: "user-1",
+        "food_log_id": lambda n: f"log-{n // 3}",
+        "food_name": lambda n: rng.choice(["ข้าวผัดกะเพราไก่", "ต้มยำกุ้ง", "Pad Thai", "ส้มตำ"]),
+        "description": lambda n: rng.choice([None, "ไข่ดาว 1 ฟอง"]),
+        "meal_type": lambda n: rng.choice(list(models.MealTypeEnum)),
+        "calories": lambda n: rng.randint(150, 900),
+        "protein": lambda n: round(rng.uniform(2, 40), 1),
+        "carbs": lambda n: round(rng.uniform(5, 90), 1),
+        "fat": lambda n: round(rng.uniform(1, 35), 1),
+        "fiber": lambda n: rng.choice([None, round(rng.uniform(0, 8), 1)]),
+        "sugar": lambda n: rng.choice([None, round(rng.uniform(0, 20), 1)]),
+        "has_nutrition_data": lambda n: True,
+        "image_url": lambda n: rng.choice([None, f"/static/blobs/ab/cd/{n:064x}.list.webp", "https://example.com/a.jpg"]),
+        "created_at": lambda n: start + timedelta(minutes=97 * n, microseconds=n),
+        "updated_at": lambda n: start + timedelta(minutes=97 * n + 5),
+        "date": lambda n: date(2024, 1, 1) + timedelta(days=n),
+        "total_calories": lambda n: rng.randint(0, 3000),
+        "meal_count": lambda n: rng.randint(0, 6),
+        "type": lambda n: f"type_{n}",
+        "name": lambda n: f"Achievement {n}",
+        "target": lambda n: rng.choice([1, 7, 30]),
+        "current": lambda n: rng.randint(0, 30),
+        "achieved": lambda n: n % 2 == 0,
+        "achieved_at": lambda n: start if n % 2 == 0 else None,
+    }
+    return [tuple(values[field](n) for field in serializer.fields) for n in range(count)]
+
+
+def orm_path(schema, model, rows, fields):
+    """ORM objects -> response_model validation -> dict -> json (the current list endpoints)"""
+    adapter = TypeAdapter(List[schema])
+    objects = [model(**dict(zip(fields, row))) for row in rows]
+
+    def render():
+        value = adapter.validate_python(objects, from_attributes=True)
+        return JSONResponse(adapter.dump_python(value, mode="json")).body
+    return render
+
+
+def achievements_dict_path(rows, fields):
+    """The previous /api/achievements: dicts built by hand with isoformat() in StandardResponse"""
+    objects = [models.Achievement(**dict(zip(fields, row))) for row in rows]
+
+    def render():
+        response = schemas.StandardResponse(success=True, message="Achievements retrieved successfully", data=[{
+            "id": a.id, "user_id": a.user_id, "type": a.type, "name": a.name, "description": a.description,
+            "target": a.target, "current": a.current, "achieved": a.achieved,
+            "achieved_at": a.achieved_at.isoformat() if a.achieved_at else None,
+            "created_at": a.created_at.isoformat(), "updated_at": a.updated_at.isoformat(),
+        } for a in objects])
+        return JSONResponse(response.model_dump(mode="json")).body
+    return render
+
+
+def fast_path(serializer, rows, wrap=None):
+    def render():
+        data = [serializer(row) for row in rows]
+        return serializers.json_response(wrap(data) if wrap else data).body
+    return render
+
+
+def timed(render, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    def achievements_wrap(data):
+        return {"success": True, "message": "Achievements retrieved successfully", "data": data}
+
+    cases = [
+        ("meals", serializers.meal, lambda rows, f: orm_path(schemas.Meal, models.Meal, rows, f), None),
+        ("food logs", serializers.food_log, lambda rows, f: orm_path(schemas.FoodLog, models.FoodLog, rows, f), None),
+        ("achievements", serializers.achievement, achievements_dict_path, achievements_wrap),
+    ]
+    print(f"{'endpoint':<14} {'rows':>6} {'current ms':>11} {'fast ms':>9} {'speedup':>8} {'KB':>7}")
+    for label, serializer, current, wrap in cases:
+        for count in args.rows:
+            rows = synthetic_rows(serializer, count)
+            slow, fast = current(rows, serializer.fields), fast_path(serializer, rows, wrap)
+            body = fast()
+            assert json.loads(slow()) == json.loads(body), f"{label}: responses differ"
+            slow_ms, fast_ms = timed(slow, args.repeat), timed(fast, args.repeat)
+            print(f"{label:<14} {count:>6} {slow_ms:>11.2f} {fast_ms:>9.2f} {slow_ms / fast_ms:>7.1f}x "
+                  f"{len(body) / 1024:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: /static image serving throughput and client cache hits.
+
+Runs the app with uvicorn in a background thread of this process, serving
+a temporary UPLOAD_DIR with content-addressed images (cached for a year) and
+flat-named images (revalidated), and measures:
+
+  - throughput of full GETs, single byte-range GETs and conditional GETs
+    answered with 304, with N concurrent clients;
+  - a browser-like client cache over repeated page views, showing how many
+    requests, 304s and body bytes each naming scheme costs.
+
+    poetry run python -m benchmarks.static_benchmark --clients 50 --seconds 5
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+def make_images(count: int, size: int):
+    """count content-addressed and count flat images of size bytes; returns their URLs"""
+    from personal_wellness_tracker_backend import images
+
+    blob_urls, flat_urls = [], []
+    for i in range(count):
+        data = os.urandom(size)
+        digest = hashlib.sha256(data).hexdigest()
+        path = images.UPLOAD_ROOT / images.blob_key(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        blob_urls.append(images.blob_url(digest))
+        (images.MEALS_DIR / f"flat_{i}.jpg").write_bytes(data)
+        flat_urls.append(f"/static/meals/flat_{i}.jpg")
+    return blob_urls, flat_urls
+
+
+async def hammer(client: httpx.AsyncClient, urls, clients: int, seconds: float, headers_for):
+    """Requests per second and body MB/s of N clients looping over urls"""
+    done, received, statuses = 0, 0, {}
+    deadline = time.perf_counter() + seconds
+
+    async def worker(offset: int):
+        nonlocal done, received
+        i = offset
+        while time.perf_counter() < deadline:
+            url = urls[i % len(urls)]
+            response = await client.get(url, headers=headers_for(url))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            received += len(response.content)
+            done += 1
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    return done / elapsed, received / elapsed / 1024 / 1024, statuses
+
+
+class BrowserCache:
+    """Minimal private HTTP cache: max-age freshness, ETag revalidation"""
+
+    def __init__(self):
+        self.entries = {}
+        self.requests = self.not_modified = self.local_hits = self.bytes = 0
+
+    async def get(self, client: httpx.AsyncClient, url: str, now: float):
+        entry = self.entries.get(url)
+        if entry and now < entry["fresh_until"]:
+            self.local_hits += 1
+            return
+        headers = {"If-None-Match": entry["etag"]} if entry else {}
+        response = await client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.content)
+        if response.status_code == 304:
+            self.not_modified += 1
+        max_age = 0
+        for directive in response.headers.get("cache-control", "").split(","):
+            name, _, value = directive.strip().partition("=")
+            if name == "max-age":
+                max_age = int(value)
+            elif name == "no-cache":
+                max_age = 0
+                break
+        self.entries[url] = {"etag": response.headers.get("etag"), "fresh_until": now + max_age}
+
+
+async def run(port: int, args, blob_urls, flat_urls):
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        etags = {url: (await client.get(url)).headers["etag"] for url in blob_urls}
+        scenarios = [
+            ("full GET", lambda url: {}),
+            ("range 64 KB", lambda url: {"Range": "bytes=0-65535"}),
+            ("conditional 304", lambda url: {"If-None-Match": etags[url]}),
+        ]
+        print(f"{'scenario':<18} {'req/s':>10} {'MB/s':>10}  statuses")
+        for label, headers_for in scenarios:
+            rps, mbps, statuses = await hammer(client, blob_urls, args.clients, args.seconds, headers_for)
+            print(f"{label:<18} {rps:>10.0f} {mbps:>10.1f}  {statuses}")
+
+        print(f"\n{args.views} page views of {len(blob_urls)} images, one hour apart")
+        print(f"{'naming':<18} {'requests':>9} {'304':>6} {'local hits':>11} {'hit ratio':>10} {'body MB':>9}")
+        for label, urls in (("content-addressed", blob_urls), ("flat", flat_urls)):
+            cache = BrowserCache()
+            for view in range(args.views):
+                for url in urls:
+                    await cache.get(client, url, now=view * 3600)
+            total = args.views * len(urls)
+            hits = cache.local_hits + cache.not_modified
+            print(f"{label:<18} {cache.requests:>9} {cache.not_modified:>6} {cache.local_hits:>11} "
+                  f"{hits / total:>9.0%} {cache.bytes / 1024 / 1024:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=150)
+    parser.add_argument("--views", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    upload_dir = tempfile.mkdtemp(prefix="static-bench-")
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["STORAGE_BACKEND"] = "local"
+    from personal_wellness_tracker_backend.main import app
+
+    blob_urls, flat_urls = make_images(args.images, args.size_kb * 1024)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        asyncio.run(run(args.port, args, blob_urls, flat_urls))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
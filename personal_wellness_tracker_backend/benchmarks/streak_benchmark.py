@@ -0,0 +1,69 @@
+"""
+Benchmark: day-streak computation latency vs. streak length.
+
+Seeds a throw-away user with an N-day streak ending today, then times
+crud.compute_and_update_user_streak. Latency should stay flat as N grows.
+
+Usage:
+    poetry run python -m benchmarks.streak_benchmark --lengths 10 100 300 1000
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from personal_wellness_tracker_backend import crud, models
+from personal_wellness_tracker_backend.database import SessionLocal
+
+
+def seed_streak(db, length: int) -> str:
+    user_id = f"bench_{uuid.uuid4()}"
+    db.add(models.User(uid=user_id, email=f"{user_id}@bench.local", password_hash="x"))
+    today = date.today()
+    for offset in range(length):
+        daily_id = str(uuid.uuid4())
+        db.add(models.DailyTask(id=daily_id, user_id=user_id, date=today - timedelta(days=offset)))
+        db.add(models.Task(id=str(uuid.uuid4()), daily_task_id=daily_id, task_type="water", value_number=1))
+    db.commit()
+    return user_id
+
+
+def cleanup(db, user_id: str):
+    daily_ids = [d.id for d in db.query(models.DailyTask.id).filter(models.DailyTask.user_id == user_id)]
+    if daily_ids:
+        db.query(models.Task).filter(models.Task.daily_task_id.in_(daily_ids)).delete(synchronize_session=False)
+    db.query(models.DailyTask).filter(models.DailyTask.user_id == user_id).delete(synchronize_session=False)
+    db.query(models.User).filter(models.User.uid == user_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 300, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"{'streak':>8} {'p50 ms':>10} {'p95 ms':>10}")
+        for length in args.lengths:
+            user_id = seed_streak(db, length)
+            try:
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    streak = crud.compute_and_update_user_streak(db, user_id)
+                    timings.append((time.perf_counter() - start) * 1000)
+                assert streak == length, f"expected {length}, got {streak}"
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{length:>8} {statistics.median(timings):>10.2f} {p95:>10.2f}")
+            finally:
+                cleanup(db, user_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: the in-memory nutrition typeahead index (typeahead.TypeaheadIndex).
+
+Builds a snapshot of the synthetic catalog of nutrition_search_benchmark
+(no database needed) and reports:
+
+  - snapshot build time, file size and bytes per 100k items, and the
+    per-process heap and resident memory of the mapped index;
+  - p50/p95/p99 search latency per query kind and for every keystroke of
+    typing dish names;
+  - upsert cost and memory of the overlay after --writes catalog writes.
+
+    poetry run python -m benchmarks.typeahead_benchmark --items 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.nutrition_search_benchmark import DISHES, PROTEINS, catalog, queries, percentile
+from personal_wellness_tracker_backend import nutrition, typeahead
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def items(count: int):
+    now = datetime.utcnow()
+    for row in catalog(count):
+        yield typeahead.Item(row["id"], row["food_name"], row["food_name_en"], row["search_name"],
+                             row["calories"], row["protein"], row["carbs"], row["fat"], None, None, now)
+
+
+def timed(index, query_list, limit: int):
+    timings = {}
+    for kind, query in query_list:
+        start = time.perf_counter()
+        index.search(query, limit)
+        timings.setdefault(kind, []).append((time.perf_counter() - start) * 1e6)
+    for kind, us in timings.items():
+        us.sort()
+        print(f"{kind:<16} {statistics.median(us):>8.0f} {percentile(us, 0.95):>8.0f} {percentile(us, 0.99):>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--writes", type=int, default=1000, help="items upserted into the overlay")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="typeahead-bench-"), "nutrition.idx")
+    try:
+        start = time.perf_counter()
+        typeahead.write_snapshot(path, items(args.items))
+        size = os.path.getsize(path)
+        print(f"Snapshot of {args.items} items built in {time.perf_counter() - start:.1f}s: "
+              f"{size / 1024 / 1024:.1f} MB, {size * 100_000 / args.items / 1024 / 1024:.1f} MB per 100k items")
+
+        rss_before = rss_bytes()
+        tracemalloc.start()
+        index = typeahead.TypeaheadIndex()
+        index.snapshot = typeahead.Snapshot(path)
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        rng = random.Random(1)
+        print(f"\n{'query kind':<16} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8}")
+        timed(index, queries(rng, args.queries), args.limit)
+        keystrokes = []
+        for _ in range(args.queries // 10 or 1):
+            (dish, _), (protein, _) = rng.choice(DISHES), rng.choice(PROTEINS)
+            name = f"{dish}{protein}"
+            keystrokes += [("keystroke", name[:n]) for n in range(1, len(name) + 1)]
+        timed(index, keystrokes, args.limit)
+        print(f"\nPer process: {heap / 1024:.0f} KB heap for the mapped snapshot, "
+              f"{(rss_bytes() - rss_before) / 1024 / 1024:.1f} MB resident after the queries (shared page cache)")
+
+        start = time.perf_counter()
+        for i in range(args.writes):
+            food_name = f"เมนูใหม่ {i}"
+            index.upsert(typeahead.Item(
+                f"new-{i}", food_name, f"new dish {i}", nutrition.normalize_name(food_name, f"new dish {i}"),
+                350.0, 12.0, 40.0, 9.0, None, None, datetime.utcnow(),
+            ))
+        upsert_us = (time.perf_counter() - start) / max(args.writes, 1) * 1e6
+        print(f"\n{args.writes} upserts: {upsert_us:.0f} us each")
+        print(f"{'query kind':<16} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8}")
+        timed(index, queries(rng, args.queries) + [("overlay", f"เมนูใหม่ {i}") for i in range(args.queries)], args.limit)
+        print(f"\n{index.memory_report()}")
+    finally:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
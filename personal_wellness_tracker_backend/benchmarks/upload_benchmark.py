@@ -0,0 +1,144 @@
+"""
+Benchmark: peak RSS and event-loop lag of the API process during concurrent
+meal image uploads.
+
+Runs the app with uvicorn in a background thread of this process (uploads
+go to a temporary directory, authentication is overridden), samples the
+server loop's scheduling lag and the process RSS every few milliseconds,
+and sends N concurrent uploads of just under 5 MB each. The payload is a
+noise JPEG padded after its end marker, so every upload is also transcoded
+into its variants.
+
+    poetry run python -m benchmarks.upload_benchmark --clients 100
+"""
+import argparse
+import asyncio
+import io
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from PIL import Image
+
+PROBE_INTERVAL = 0.005
+BOUNDARY = "benchmark-boundary"
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class LoopProbe:
+    """Measures how late the server loop wakes up from a fixed sleep"""
+
+    def __init__(self):
+        self.lags = []
+        self.rss = []
+        self.running = True
+
+    async def run(self):
+        while self.running:
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            self.lags.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+            self.rss.append(rss_bytes())
+
+
+def jpeg_payload(size: int) -> bytes:
+    """A 12 MP noise JPEG (~3.8 MB), padded with zeros (ignored by decoders) to size bytes"""
+    out = io.BytesIO()
+    Image.effect_noise((4000, 3000), 32).convert("RGB").save(out, format="JPEG", quality=60)
+    data = out.getvalue()
+    return data + bytes(size - len(data))
+
+
+def multipart_body(size: int, payload: bytes):
+    head = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="meal.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+    async def stream():
+        yield head
+        for offset in range(0, size, 64 * 1024):
+            yield payload[offset:offset + 64 * 1024]
+        yield tail
+
+    return stream, len(head) + size + len(tail)
+
+
+async def upload_all(port: int, clients: int, size: int):
+    stream, length = multipart_body(size, jpeg_payload(size))
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+        "Content-Length": str(length),
+        "Authorization": "Bearer benchmark",
+    }
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        async def one():
+            start = time.perf_counter()
+            response = await client.post("/meals/upload-image/", content=stream(), headers=headers)
+            response.raise_for_status()
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(clients)))
+        return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    upload_dir = tempfile.mkdtemp(prefix="upload-bench-")
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["STORAGE_BACKEND"] = "local"
+    from personal_wellness_tracker_backend.main import app
+    from personal_wellness_tracker_backend.core import deps
+
+    app.dependency_overrides[deps.get_current_principal] = lambda: deps.Principal(uid="bench", email="bench@bench.local")
+    probe = LoopProbe()
+    app.router.on_startup.append(lambda: asyncio.get_running_loop().create_task(probe.run()))
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    size = int(args.size_mb * 1024 * 1024) - 1
+    baseline_rss = rss_bytes()
+    try:
+        latencies, elapsed = asyncio.run(upload_all(args.port, args.clients, size))
+    finally:
+        probe.running = False
+        server.should_exit = True
+        thread.join(timeout=10)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    lags = sorted(probe.lags)
+    latencies.sort()
+    print(f"{args.clients} concurrent uploads of {size / 1024 / 1024:.1f} MB in {elapsed:.2f}s "
+          f"({args.clients * size / elapsed / 1024 / 1024:.0f} MB/s)")
+    print(f"upload latency    p50 {statistics.median(latencies):8.1f} ms   p95 {latencies[int(len(latencies) * 0.95) - 1]:8.1f} ms")
+    print(f"server loop lag   p50 {statistics.median(lags):8.2f} ms   p99 {lags[int(len(lags) * 0.99) - 1]:8.2f} ms"
+          f"   max {lags[-1]:8.2f} ms")
+    print(f"RSS baseline {baseline_rss / 1024 / 1024:.0f} MB, peak {max(probe.rss) / 1024 / 1024:.0f} MB "
+          f"(ru_maxrss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
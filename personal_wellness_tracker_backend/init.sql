@@ -50,7 +50,8 @@ CREATE TABLE "users" (
   "updated_at" timestamp DEFAULT (now()),
   "health_problems" text[],
   "saved_days_count" integer DEFAULT 0,
-  "day_streak" integer DEFAULT 0,
+  "streak_start_date" date,
+  "streak_last_date" date,
   "last_updated" timestamp DEFAULT (now())
 );
 
@@ -92,6 +93,7 @@ CREATE TABLE "meals" (
   "fiber" double precision,
   "sugar" double precision,
   "has_nutrition_data" boolean DEFAULT false,
+  "nutrition_checked_at" timestamp,
   "image_url" varchar,
   "created_at" timestamp DEFAULT (now()),
   "updated_at" timestamp DEFAULT (now())
@@ -117,6 +119,33 @@ CREATE TABLE "tasks" (
   "updated_at" timestamp DEFAULT (now())
 );
 
+CREATE TABLE "user_daily_rollups" (
+  "user_id" varchar NOT NULL,
+  "date" date NOT NULL,
+  "calories" integer NOT NULL DEFAULT 0,
+  "protein" double precision NOT NULL DEFAULT 0,
+  "carbs" double precision NOT NULL DEFAULT 0,
+  "fat" double precision NOT NULL DEFAULT 0,
+  "fiber" double precision NOT NULL DEFAULT 0,
+  "sugar" double precision NOT NULL DEFAULT 0,
+  "meal_count" integer NOT NULL DEFAULT 0,
+  "breakfast_count" integer NOT NULL DEFAULT 0,
+  "lunch_count" integer NOT NULL DEFAULT 0,
+  "dinner_count" integer NOT NULL DEFAULT 0,
+  "snack_count" integer NOT NULL DEFAULT 0,
+  "task_totals" jsonb NOT NULL DEFAULT '{}',
+  "updated_at" timestamp DEFAULT (now()),
+  PRIMARY KEY ("user_id", "date")
+);
+
+CREATE TABLE "image_blobs" (
+  "hash" varchar(64) PRIMARY KEY,
+  "size" bigint,
+  "refcount" integer NOT NULL DEFAULT 0,
+  "created_at" timestamp DEFAULT (now()),
+  "updated_at" timestamp DEFAULT (now())
+);
+
 CREATE TABLE "achievements" (
   "id" varchar PRIMARY KEY,
   "user_id" varchar NOT NULL,
@@ -131,6 +160,33 @@ CREATE TABLE "achievements" (
   "updated_at" timestamp DEFAULT (now())
 );
 
+CREATE TABLE "achievement_days" (
+  "user_id" varchar NOT NULL,
+  "type" varchar NOT NULL,
+  "date" date NOT NULL,
+  "created_at" timestamp DEFAULT (now()),
+  PRIMARY KEY ("user_id", "type", "date")
+);
+
+CREATE TABLE "nutrition_database" (
+  "id" varchar PRIMARY KEY,
+  "food_name" varchar NOT NULL,
+  "food_name_en" varchar,
+  "search_name" varchar NOT NULL,
+  "calories" double precision,
+  "protein" double precision,
+  "carbs" double precision,
+  "fat" double precision,
+  "fiber" double precision,
+  "sugar" double precision,
+  "last_updated" timestamp DEFAULT (now())
+);
+
+CREATE TABLE "nutrition_deletions" (
+  "id" varchar PRIMARY KEY,
+  "deleted_at" timestamp NOT NULL DEFAULT (now())
+);
+
 CREATE TABLE "user_preferences" (
   "id" varchar PRIMARY KEY,
   "user_id" varchar NOT NULL,
@@ -171,6 +227,48 @@ CREATE INDEX ON "achievements" ("achieved");
 CREATE INDEX ON "meals" ("has_nutrition_data");
 CREATE UNIQUE INDEX ON "user_preferences" ("user_id");
 
+-- Keyset pagination of date-range queries: WHERE user_id = ? AND (date, id) > (?, ?)
+-- (meals page by the food log's date: food_logs is sought from the cursor's date
+-- and each log's meals are read in id order; EXPLAIN shows an incremental sort)
+CREATE INDEX IF NOT EXISTS "food_logs_user_date_id_idx" ON "food_logs" ("user_id", "date", "id");
+CREATE INDEX IF NOT EXISTS "daily_tasks_user_date_id_idx" ON "daily_tasks" ("user_id", "date", "id");
+CREATE INDEX IF NOT EXISTS "meals_food_log_id_id_idx" ON "meals" ("food_log_id", "id");
+
+-- Default achievements are seeded with INSERT ... ON CONFLICT (user_id, type) DO NOTHING;
+-- their ids come from gen_random_uuid(), built in from PostgreSQL 13 and in pgcrypto before
+DO $$ BEGIN
+  IF current_setting('server_version_num')::int < 130000 THEN
+    CREATE EXTENSION IF NOT EXISTS pgcrypto;
+  END IF;
+END $$;
+CREATE UNIQUE INDEX IF NOT EXISTS "achievements_user_id_type_idx" ON "achievements" ("user_id", "type");
+
+-- Nutrition search (nutrition.search): fuzzy word similarity and prefix matches on the normalized name
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS "nutrition_database_search_name_trgm_idx" ON "nutrition_database" USING gin ("search_name" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "nutrition_database_search_name_prefix_idx" ON "nutrition_database" ("search_name" text_pattern_ops);
+
+-- Meals still to be enriched from the catalog (enrichment.pending_meals), in keyset order
+CREATE INDEX IF NOT EXISTS "meals_needs_nutrition_idx" ON "meals" ("created_at", "id")
+  WHERE "has_nutrition_data" = false AND "nutrition_checked_at" IS NULL;
+
+-- Typeahead index sync (typeahead.TypeaheadIndex.sync): items written since the last poll
+CREATE INDEX IF NOT EXISTS "nutrition_database_last_updated_idx" ON "nutrition_database" ("last_updated");
+
+-- ... and items deleted since: a tombstone per deleted item, pruned by typeahead.build_snapshot
+CREATE OR REPLACE FUNCTION nutrition_record_deletion() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO "nutrition_deletions" ("id", "deleted_at") VALUES (OLD.id, now())
+  ON CONFLICT ("id") DO UPDATE SET "deleted_at" = EXCLUDED."deleted_at";
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+CREATE TRIGGER "nutrition_database_deleted" AFTER DELETE ON "nutrition_database"
+  FOR EACH ROW EXECUTE FUNCTION nutrition_record_deletion();
+CREATE INDEX IF NOT EXISTS "nutrition_deletions_deleted_at_idx" ON "nutrition_deletions" ("deleted_at");
+
+-- Garbage collection of unreferenced image blobs: WHERE refcount = 0 AND updated_at < ?
+CREATE INDEX IF NOT EXISTS "image_blobs_unreferenced_idx" ON "image_blobs" ("updated_at") WHERE "refcount" = 0;
+
 -- Add Foreign Keys
 ALTER TABLE "user_goals" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
 ALTER TABLE "food_logs" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
@@ -179,7 +277,9 @@ ALTER TABLE "meals" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
 ALTER TABLE "daily_tasks" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
 ALTER TABLE "tasks" ADD FOREIGN KEY ("daily_task_id") REFERENCES "daily_tasks" ("id");
 ALTER TABLE "achievements" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
+ALTER TABLE "achievement_days" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
 ALTER TABLE "user_preferences" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
+ALTER TABLE "user_daily_rollups" ADD FOREIGN KEY ("user_id") REFERENCES "users" ("uid");
 
 -- Insert sample data
 INSERT INTO "app_statistics" ("id", "total_users", "total_meals_logged", "total_days_tracked", "api_calls_this_month") 
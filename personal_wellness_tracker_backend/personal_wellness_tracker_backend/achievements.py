@@ -0,0 +1,275 @@
+"""
+Server-side achievement engine and the default achievement templates.
+
+crud emits write events (see core.events); the handlers below turn them
+into progress on the default achievements and apply it with a single
+UPDATE ... RETURNING per event, inside the writer's transaction. Names of
+achievements unlocked by a write are collected on the session and read
+back by the endpoint with pop_newly_achieved(). The app registers the
+handlers at startup with register_handlers().
+
+Deleting a meal or task takes back the progress it made on achievements
+still in progress; an unlocked achievement stays unlocked.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models
+from .core import events
+
+# Default achievement set of every user, seeded by seed_defaults()
+DEFAULT_ACHIEVEMENTS = [
+    {
+        "type": "first_record",
+        "name": "ผู้ริเริ่ม",
+        "description": "สำเร็จบันทึกครั้งแรก",
+        "target": 1
+    },
+    {
+        "type": "meal_logging",
+        "name": "นักวางแผน",
+        "description": "บันทึกอาหารครบ 10 วัน",
+        "target": 10
+    },
+    {
+        "type": "exercise_logging",
+        "name": "นักออกกำลังกาย",
+        "description": "บันทึกการออกกำลังกายครบ 10 วัน",
+        "target": 10
+    },
+    {
+        "type": "goal_achievement",
+        "name": "ผู้เชี่ยวชาญ",
+        "description": "บรรลุเป้าหมายสุขภาพ 3 เป้าหมาย",
+        "target": 3
+    },
+    {
+        "type": "meal_planning",
+        "name": "นักวางแผนมื้ออาหาร",
+        "description": "วางแผนมื้ออาหารครบ 5 มื้อ",
+        "target": 5
+    },
+    {
+        "type": "streak_days",
+        "name": "นักพัฒนา",
+        "description": "บันทึกกิจกรรมครบ 20 วัน",
+        "target": 20
+    }
+]
+
+# task_totals keys (see rollups) that count as exercise
+EXERCISE_TASK_TYPES = ("exercise", "activity")
+# Task types checked against the active UserGoal for goal_achievement
+GOAL_TASK_FIELDS = {
+    "water": "goal_water_intake",
+    "exercise": "goal_exercise_minutes",
+    "sleep": "goal_sleep_hours",
+}
+
+NEWLY_ACHIEVED_KEY = "newly_achieved"
+
+# goal_achievement counts days on which a goal was reached, each day once
+# (achievement_days); a day that no longer reaches a goal is taken back
+_COUNT_DAY_SQL = """
+INSERT INTO achievement_days (user_id, type, date) VALUES (:user_id, :type, :day)
+ON CONFLICT DO NOTHING
+"""
+_UNCOUNT_DAY_SQL = "DELETE FROM achievement_days WHERE user_id = :user_id AND type = :type AND date = :day"
+
+# Templates crossed with the user ids; relies on the (user_id, type) unique index
+_SEED_SQL = """
+INSERT INTO achievements (id, user_id, type, name, description, target, current, achieved, created_at, updated_at)
+SELECT CAST(gen_random_uuid() AS varchar), u.uid, t.type, t.name, t.description, t.target, 0, false, now(), now()
+FROM unnest(CAST(:user_ids AS varchar[])) AS u(uid)
+CROSS JOIN (VALUES {templates}) AS t(type, name, description, target)
+ON CONFLICT (user_id, type) DO NOTHING
+"""
+
+# Each progress row either adds `increment` or raises current to at least
+# `at_least` (streaks); achieved rows are never touched again.
+_PROGRESS_SQL = """
+UPDATE achievements a
+SET current = LEAST(GREATEST(COALESCE(a.current, 0) + p.increment, p.at_least), a.target),
+    achieved = GREATEST(COALESCE(a.current, 0) + p.increment, p.at_least) >= a.target,
+    achieved_at = CASE
+        WHEN GREATEST(COALESCE(a.current, 0) + p.increment, p.at_least) >= a.target THEN now()
+        ELSE a.achieved_at
+    END,
+    updated_at = now()
+FROM (VALUES {values}) AS p(type, increment, at_least)
+WHERE a.user_id = :user_id AND a.type = p.type AND a.achieved IS NOT TRUE
+RETURNING a.name, a.achieved
+"""
+
+def seed_defaults(db: Session, user_ids: List[str]) -> int:
+    """
+    Create the default achievements the given users do not have yet with a
+    single INSERT; returns the number of rows created. Runs in the caller's
+    transaction.
+    """
+    if not user_ids:
+        return 0
+    params, templates = {"user_ids": list(user_ids)}, []
+    for i, template in enumerate(DEFAULT_ACHIEVEMENTS):
+        templates.append(
+            f"(CAST(:type{i} AS varchar), CAST(:name{i} AS varchar), CAST(:description{i} AS text), CAST(:target{i} AS integer))"
+        )
+        params.update({f"{key}{i}": value for key, value in template.items()})
+    return db.execute(text(_SEED_SQL.format(templates=", ".join(templates))), params).rowcount
+
+def record_progress(db: Session, user_id: str, increments: Dict[str, int] = None,
+                    at_least: Dict[str, int] = None) -> List[str]:
+    """Apply progress to the user's achievements; returns names unlocked now"""
+    progress = {achievement_type: [count, 0] for achievement_type, count in (increments or {}).items() if count}
+    for achievement_type, value in (at_least or {}).items():
+        if value:
+            progress.setdefault(achievement_type, [0, 0])[1] = value
+    if not progress:
+        return []
+
+    params, values = {"user_id": user_id}, []
+    for i, (achievement_type, (increment, minimum)) in enumerate(progress.items()):
+        values.append(f"(CAST(:type{i} AS varchar), CAST(:inc{i} AS integer), CAST(:min{i} AS integer))")
+        params.update({f"type{i}": achievement_type, f"inc{i}": increment, f"min{i}": minimum})
+    rows = db.execute(text(_PROGRESS_SQL.format(values=", ".join(values))), params)
+
+    unlocked = [name for name, achieved in rows if achieved]
+    db.info.setdefault(NEWLY_ACHIEVED_KEY, []).extend(unlocked)
+    return unlocked
+
+def pop_newly_achieved(db) -> List[str]:
+    """Names unlocked by the writes of this session since the last call"""
+    return db.info.pop(NEWLY_ACHIEVED_KEY, [])
+
+def task_value(task) -> Optional[float]:
+    """Numeric value of a task; sleep falls back to task_quality or its duration in hours"""
+    if task is None:
+        return None
+    if task.value_number is not None:
+        return task.value_number
+    if task.task_type == "sleep":
+        try:
+            return float(task.task_quality)
+        except (TypeError, ValueError):
+            pass
+        if task.started_at and task.ended_at:
+            return (task.ended_at - task.started_at).total_seconds() / 3600
+    return None
+
+def _is_exercise(task_type: Optional[str]) -> bool:
+    return (task_type or "").split(":", 1)[0] in EXERCISE_TASK_TYPES
+
+def _exercise_count(task_totals: dict) -> int:
+    return sum(task_totals.get(key, {}).get("count", 0) for key in EXERCISE_TASK_TYPES)
+
+def _active_goal(db: Session, user_id: str) -> Optional[models.UserGoal]:
+    return db.query(models.UserGoal).filter(
+        models.UserGoal.user_id == user_id,
+        models.UserGoal.is_active == True
+    ).order_by(models.UserGoal.created_at.desc()).first()
+
+def _meets_goal(goal: models.UserGoal, task) -> bool:
+    target = getattr(goal, GOAL_TASK_FIELDS[task.task_type])
+    return bool(target) and (task_value(task) or 0) >= target
+
+def _goal_tasks(db: Session, user_id: str):
+    return db.query(models.DailyTask.date, models.Task).join(
+        models.DailyTask, models.Task.daily_task_id == models.DailyTask.id
+    ).filter(
+        models.DailyTask.user_id == user_id,
+        models.Task.task_type.in_(GOAL_TASK_FIELDS)
+    )
+
+def _goal_reached(db: Session, user_id: str, day) -> bool:
+    """Whether a task of the day meets its target in the user's active goal"""
+    goal = _active_goal(db, user_id)
+    if not goal:
+        return False
+    tasks = _goal_tasks(db, user_id).filter(models.DailyTask.date == day)
+    return any(_meets_goal(goal, task) for _, task in tasks)
+
+def _goal_day_change(db: Session, user_id: str, day) -> int:
+    """
+    1 when the day now reaches a goal and was not counted yet, -1 when a
+    counted day no longer does, else 0
+    """
+    params = {"user_id": user_id, "type": "goal_achievement", "day": day}
+    if _goal_reached(db, user_id, day):
+        return db.execute(text(_COUNT_DAY_SQL), params).rowcount
+    return -db.execute(text(_UNCOUNT_DAY_SQL), params).rowcount
+
+def on_meals_created(db: Session, user_id: str, meals: int, first_of_day: bool, **_):
+    increments = {"first_record": meals, "meal_planning": meals}
+    if first_of_day:
+        increments["meal_logging"] = 1
+    record_progress(db, user_id, increments)
+
+def on_meals_deleted(db: Session, user_id: str, meals: int, last_of_day: bool, **_):
+    increments = {"first_record": -meals, "meal_planning": -meals}
+    if last_of_day:
+        increments["meal_logging"] = -1
+    record_progress(db, user_id, increments)
+
+def on_tasks_written(db: Session, user_id: str, day, tasks: list, created: bool, task_totals: dict, **_):
+    """
+    tasks is a list of (task, previous) pairs for one day; previous is the
+    task before an update, or None when created=True
+    """
+    increments = {}
+    if created:
+        increments["first_record"] = len(tasks)
+        exercise_created = sum(1 for task, _ in tasks if _is_exercise(task.task_type))
+        if exercise_created and _exercise_count(task_totals) == exercise_created:
+            increments["exercise_logging"] = 1
+
+    if any(task.task_type in GOAL_TASK_FIELDS or (previous and previous.task_type in GOAL_TASK_FIELDS)
+           for task, previous in tasks):
+        increments["goal_achievement"] = _goal_day_change(db, user_id, day)
+
+    record_progress(db, user_id, increments)
+
+def on_tasks_deleted(db: Session, user_id: str, day, tasks: list, task_totals: dict, **_):
+    """tasks are the deleted tasks of one day; task_totals is the day after the delete"""
+    increments = {"first_record": -len(tasks)}
+    if any(_is_exercise(task.task_type) for task in tasks) and not _exercise_count(task_totals):
+        increments["exercise_logging"] = -1
+    if any(task.task_type in GOAL_TASK_FIELDS for task in tasks):
+        increments["goal_achievement"] = _goal_day_change(db, user_id, day)
+    record_progress(db, user_id, increments)
+
+def on_goal_changed(db: Session, user_id: str, **_):
+    """
+    A goal was created or updated: recount the days reaching the active
+    goal's targets, counting the days that reach them now and taking back
+    the ones that no longer do
+    """
+    goal = _active_goal(db, user_id)
+    reached = {day for day, task in _goal_tasks(db, user_id) if _meets_goal(goal, task)} if goal else set()
+    counted = set(db.execute(
+        text("SELECT date FROM achievement_days WHERE user_id = :user_id AND type = :type"),
+        {"user_id": user_id, "type": "goal_achievement"}
+    ).scalars())
+    added, removed = reached - counted, counted - reached
+    for sql, days in ((_COUNT_DAY_SQL, added), (_UNCOUNT_DAY_SQL, removed)):
+        if days:
+            db.execute(text(sql), [{"user_id": user_id, "type": "goal_achievement", "day": day} for day in days])
+    record_progress(db, user_id, {"goal_achievement": len(added) - len(removed)})
+
+def on_streak_updated(db: Session, user_id: str, streak: int, **_):
+    record_progress(db, user_id, at_least={"streak_days": streak})
+
+HANDLERS = {
+    "meals_created": on_meals_created,
+    "meals_deleted": on_meals_deleted,
+    "tasks_written": on_tasks_written,
+    "tasks_deleted": on_tasks_deleted,
+    "goal_changed": on_goal_changed,
+    "streak_updated": on_streak_updated,
+}
+
+def register_handlers():
+    """Subscribe the achievement handlers to the crud write events (idempotent)"""
+    for event, handler in HANDLERS.items():
+        events.subscribe(event)(handler)
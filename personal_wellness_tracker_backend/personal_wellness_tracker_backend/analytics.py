@@ -0,0 +1,171 @@
+"""
+Weekly/monthly health insights computed with NumPy.
+
+A user's meals and tasks for the requested range are aggregated per day in
+one query and scattered into dense day-indexed float arrays (NaN = nothing
+logged that day). Rolling averages, goal adherence and week-over-week
+deltas are then computed over whole arrays instead of per row.
+"""
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+METRICS = ("calories", "water", "exercise_minutes", "sleep_hours")
+WINDOWS = {"week": 7, "month": 30, "quarter": 90, "year": 365}
+ROLLING_DAYS = 7
+# Calories count as on target within ±10% of the goal; other metrics must reach it
+CALORIE_TOLERANCE = 0.10
+
+# One row per day with meals or tasks as (day offset from :date_from, metrics...)
+# with NaN for missing values, so rows convert to float arrays without
+# per-value None handling. Sleep hours come from value_number, a numeric
+# task_quality or started_at/ended_at like the app does.
+_DAILY_SQL = text(r"""
+WITH meal_days AS (
+    SELECT fl.date AS day, sum(m.calories) AS calories
+    FROM food_logs fl
+    JOIN meals m ON m.food_log_id = fl.id
+    WHERE fl.user_id = :user_id AND fl.date BETWEEN :date_from AND :date_to
+    GROUP BY fl.date
+), task_days AS (
+    SELECT dt.date AS day,
+           sum(t.value_number) FILTER (WHERE t.task_type = 'water') AS water,
+           sum(t.value_number) FILTER (WHERE t.task_type = 'exercise') AS exercise_minutes,
+           sum(COALESCE(
+               t.value_number,
+               CASE WHEN t.task_quality ~ '^[0-9]+(\.[0-9]+)?$' THEN CAST(t.task_quality AS double precision) END,
+               EXTRACT(EPOCH FROM t.ended_at - t.started_at) / 3600
+           )) FILTER (WHERE t.task_type = 'sleep') AS sleep_hours
+    FROM daily_tasks dt
+    JOIN tasks t ON t.daily_task_id = dt.id
+    WHERE dt.user_id = :user_id AND dt.date BETWEEN :date_from AND :date_to
+    GROUP BY dt.date
+)
+SELECT COALESCE(m.day, t.day) - CAST(:date_from AS date) AS day_index,
+       COALESCE(CAST(m.calories AS double precision), 'NaN'),
+       COALESCE(t.water, 'NaN'),
+       COALESCE(t.exercise_minutes, 'NaN'),
+       COALESCE(t.sleep_hours, 'NaN')
+FROM meal_days m
+FULL OUTER JOIN task_days t ON t.day = m.day
+""")
+
+def to_arrays(rows: Iterable[Sequence], date_from: date, date_to: date) -> Dict[str, np.ndarray]:
+    """
+    Scatter (day_index, calories, water, exercise_minutes, sleep_hours) rows
+    into one array per metric covering every day from date_from to date_to
+    """
+    n_days = (date_to - date_from).days + 1
+    arrays = {metric: np.full(n_days, np.nan) for metric in METRICS}
+    table = np.array(rows, dtype=float).reshape(-1, len(METRICS) + 1)
+    index = table[:, 0].astype(np.int64)
+    for column, metric in enumerate(METRICS, start=1):
+        arrays[metric][index] = table[:, column]
+    return arrays
+
+def load_daily_arrays(db: Session, user_id: str, date_from: date, date_to: date) -> Dict[str, np.ndarray]:
+    result = db.execute(_DAILY_SQL, {"user_id": user_id, "date_from": date_from, "date_to": date_to})
+    return to_arrays([tuple(row) for row in result], date_from, date_to)
+
+def goal_targets(goal: Optional[models.UserGoal]) -> Dict[str, Optional[float]]:
+    if goal is None:
+        return dict.fromkeys(METRICS)
+    return {
+        "calories": goal.goal_calorie_intake,
+        "water": goal.goal_water_intake,
+        "exercise_minutes": goal.goal_exercise_minutes,
+        "sleep_hours": goal.goal_sleep_hours,
+    }
+
+def rolling_mean(values: np.ndarray, days: int = ROLLING_DAYS) -> np.ndarray:
+    """Trailing mean over the last `days` days, skipping days without data"""
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - days, 0)
+    window_counts = counts[end] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, (sums[end] - sums[start]) / window_counts, np.nan)
+
+def adherence(values: np.ndarray, target: Optional[float], metric: str) -> Optional[float]:
+    """Share of logged days that met the target"""
+    logged = values[~np.isnan(values)]
+    if not target or logged.size == 0:
+        return None
+    if metric == "calories":
+        met = np.abs(logged - target) <= target * CALORIE_TOLERANCE
+    else:
+        met = logged >= target
+    return float(met.mean())
+
+def weekly_means(values: np.ndarray) -> np.ndarray:
+    """Mean per 7-day block aligned to the last day; leading days that do not fill a block are dropped"""
+    usable = len(values) - len(values) % 7
+    blocks = values[len(values) - usable:].reshape(-1, 7)
+    present = ~np.isnan(blocks)
+    counts = present.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, np.where(present, blocks, 0.0).sum(axis=1) / counts, np.nan)
+
+def _optional(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+def _optional_list(values: np.ndarray) -> List[Optional[float]]:
+    # NaN != NaN, so missing days become None without a per-element NumPy call
+    return [None if v != v else v for v in np.round(values, 2).tolist()]
+
+def summarize(arrays: Dict[str, np.ndarray], loaded_from: date, date_to: date,
+              window_days: int, targets: Dict[str, Optional[float]], window: str = None) -> schemas.Insights:
+    """
+    Build insights for the last `window_days` of arrays that start at
+    `loaded_from`. Days loaded before the window only feed the rolling
+    average and the first week-over-week comparison.
+    """
+    date_from = date_to - timedelta(days=window_days - 1)
+    offset = (date_from - loaded_from).days
+    n_weeks = len(next(iter(arrays.values()))) // 7
+    week_starts = [date_to - timedelta(days=7 * (n_weeks - i) - 1) for i in range(n_weeks)]
+
+    metrics = {}
+    for metric, values in arrays.items():
+        in_window = values[offset:]
+        weekly = weekly_means(values)
+        deltas = np.concatenate(([np.nan], np.diff(weekly)))
+        first_week = bisect_left(week_starts, date_from - timedelta(days=6))
+        metrics[metric] = schemas.MetricInsight(
+            target=targets.get(metric),
+            average=_optional(np.nanmean(in_window)) if np.any(~np.isnan(in_window)) else None,
+            days_logged=int(np.count_nonzero(~np.isnan(in_window))),
+            adherence=adherence(in_window, targets.get(metric), metric),
+            week_over_week=_optional(deltas[-1]) if len(deltas) else None,
+            rolling_7d=_optional_list(rolling_mean(values)[offset:]),
+            weekly=[
+                schemas.WeeklyInsight(week_start=start, average=mean, delta=delta)
+                for start, mean, delta in zip(
+                    week_starts[first_week:],
+                    _optional_list(weekly[first_week:]),
+                    _optional_list(deltas[first_week:])
+                )
+            ],
+        )
+    return schemas.Insights(window=window or f"{window_days}d", date_from=date_from, date_to=date_to, metrics=metrics)
+
+def get_insights(db: Session, user_id: str, window: str, today: Optional[date] = None) -> schemas.Insights:
+    """Insights for the window ending today, loaded with one query"""
+    window_days = WINDOWS[window]
+    date_to = today or date.today()
+    # One extra week for the rolling warm-up and the first week-over-week delta
+    loaded_from = date_to - timedelta(days=window_days + 6)
+    arrays = load_daily_arrays(db, user_id, loaded_from, date_to)
+    goal = db.query(models.UserGoal).filter(
+        models.UserGoal.user_id == user_id,
+        models.UserGoal.is_active == True
+    ).order_by(models.UserGoal.created_at.desc()).first()
+    return summarize(arrays, loaded_from, date_to, window_days, goal_targets(goal), window=window)
@@ -1,47 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 from fastapi import Body
 from typing import Annotated
-import uuid
 
-from ..database import get_db
+from ..database import DBSession, get_session, run_db, rollback
 from .. import models, schemas, crud
 from ..core import security, deps
 
 router = APIRouter()
 
 @router.post("/register", response_model=schemas.StandardResponse)
-def register_user(
+async def register_user(
     user_data: schemas.UserRegister,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[DBSession, Depends(get_session)]
 ):
     """
     Register a new user
     """
 
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+    existing_user = await run_db(db, crud.get_user_by_email, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
-    hashed_password = security.get_password_hash(user_data.password)
-    
-    user_id = str(uuid.uuid4())
-    db_user = models.User(
-        uid=user_id,
-        email=user_data.email,
-        password_hash=hashed_password,
-        username=user_data.username,
-        profile_completed=False
-    )
+    hashed_password = await security.get_password_hash_async(user_data.password)
     
     try:
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db_user = await run_db(
+            db,
+            crud.create_registered_user,
+            email=user_data.email,
+            password_hash=hashed_password,
+            username=user_data.username
+        )
         
         return schemas.StandardResponse(
             success=True,
@@ -53,30 +46,41 @@ def register_user(
             }
         )
     except Exception as e:
-        db.rollback()
+        await rollback(db)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to register user"
         )
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(
+async def login_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_session)
 ):
     """
     Login user and return access token
     """
 
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+    user = await run_db(db, crud.get_user_by_email, form_data.username)
     
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await security.verify_and_update_password_async(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Stored hash uses another scheme or cost - replace it transparently
+    if new_hash:
+        try:
+            await run_db(db, crud.update_user_fields, user, password_hash=new_hash)
+        except Exception as e:
+            await rollback(db)
+            print(f"WARN: Failed to rehash password on login: {e}")
+    
     # Create access token
     access_token = security.create_access_token(data={"sub": user.uid})
     refresh_token = security.create_refresh_token(data={"sub": user.uid})
@@ -116,7 +120,7 @@ def login_user(
 #     )
 
 @router.get("/me", response_model=schemas.User)
-def get_current_user_info(
+async def get_current_user_info(
     current_user: Annotated[models.User, Depends(deps.get_current_active_user)]
 ):
     """
@@ -125,9 +129,9 @@ def get_current_user_info(
     return current_user
 
 @router.post("/refresh", response_model=schemas.Token)
-def refresh_access_token(
+async def refresh_access_token(
     refresh_token: str,
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_session)
 ):
     """
     Refresh access token using refresh token
@@ -153,7 +157,7 @@ def refresh_access_token(
             )
         
 
-        user = db.query(models.User).filter(models.User.uid == user_id).first()
+        user = await run_db(db, crud.get_user, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -181,20 +185,17 @@ def refresh_access_token(
         )
 
 @router.put("/update-profile", response_model=schemas.StandardResponse)
-def update_profile(
+async def update_profile(
     update_data: schemas.UserUpdate, 
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_session)],
     current_user: Annotated[models.User, Depends(deps.get_current_active_user)]
 ):
     """
     Update current user's profile (e.g., username)
     """
     try:
-        if update_data.username:
-            current_user.username = update_data.username
-
-        db.commit()
-        db.refresh(current_user)
+        fields = {"username": update_data.username} if update_data.username else {}
+        await run_db(db, crud.update_user_fields, current_user, **fields)
 
         return schemas.StandardResponse(
             success=True,
@@ -206,33 +207,31 @@ def update_profile(
             }
         )
     except Exception as e:
-        db.rollback()
+        await rollback(db)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update profile: {e}"
         )
 
 @router.put("/change-password", response_model=schemas.StandardResponse)   
-def change_password(
+async def change_password(
     passwords: schemas.ChangePassword, 
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_session)],
     current_user: Annotated[models.User, Depends(deps.get_current_active_user)]
 ):
     """
     Change the password of the currently logged-in user
     """
-    if not security.verify_password(passwords.current_password, current_user.password_hash):
+    if not await security.verify_password_async(passwords.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
 
-    new_hashed = security.get_password_hash(passwords.new_password)
-    current_user.password_hash = new_hashed
+    new_hashed = await security.get_password_hash_async(passwords.new_password)
 
     try:
-        db.commit()
-        db.refresh(current_user)
+        await run_db(db, crud.update_user_fields, current_user, password_hash=new_hashed)
 
         return schemas.StandardResponse(
             success=True,
@@ -240,7 +239,7 @@ def change_password(
             data={"user_id": current_user.uid}
         )
     except Exception as e:
-        db.rollback()
+        await rollback(db)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to change password: {e}"
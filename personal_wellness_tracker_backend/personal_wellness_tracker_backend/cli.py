@@ -0,0 +1,304 @@
+"""
+Maintenance commands for the Personal Wellness Tracker backend.
+
+    poetry run python -m personal_wellness_tracker_backend.cli <command> [options]
+"""
+import argparse
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from . import achievements, enrichment, image_blobs, image_processing, images, models, nutrition_import, rollups, storage, typeahead
+from .core import config, security
+from .database import SessionLocal
+
+def calibrate_hashing(args):
+    """Pick the password hashing cost that meets a target verify latency"""
+    scheme = args.scheme or config.get_settings().PASSWORD_HASH_SCHEME
+    params, median_ms = security.calibrate_password_cost(scheme, args.target_ms)
+    print(f"Scheme {scheme}: median verify {median_ms:.1f} ms (target {args.target_ms:.0f} ms)")
+    print("Add to .env:")
+    print(f"PASSWORD_HASH_SCHEME={scheme}")
+    for key, value in params.items():
+        print(f"{key}={value}")
+
+def _for_each_user_batch(args, fn, label: str):
+    """
+    Call fn(db, user_ids) for batches of users in uid order, committing each
+    batch. Prints the last uid of every batch so an interrupted run can be
+    resumed with --after.
+    """
+    db = SessionLocal()
+    after, done, start = args.after or "", 0, time.perf_counter()
+    try:
+        while True:
+            user_ids = [uid for (uid,) in db.query(models.User.uid).filter(
+                models.User.uid > after
+            ).order_by(models.User.uid).limit(args.batch_size)]
+            if not user_ids:
+                break
+            fn(db, user_ids)
+            db.commit()
+            done += len(user_ids)
+            after = user_ids[-1]
+            # พิมพ์ uid ล่าสุดไว้ใช้กับ --after ถ้าต้องรันต่อ
+            elapsed = time.perf_counter() - start
+            print(f"{done} users {label}, last uid {after} ({done / elapsed:.0f} users/s)")
+    finally:
+        db.close()
+    print(f"Done: {done} users in {time.perf_counter() - start:.1f}s")
+
+def backfill_rollups(args):
+    """Rebuild user_daily_rollups from meals and tasks, one batch of users per transaction"""
+    _for_each_user_batch(args, rollups.backfill_users, "backfilled")
+
+def seed_achievements(args):
+    """Create missing default achievements for existing users, one batch per INSERT"""
+    _for_each_user_batch(args, achievements.seed_defaults, "seeded")
+
+def _sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _flat_images():
+    """
+    Files of the flat meals directory used before content-addressed storage:
+    (path, None) for untranscoded originals and (full JPEG path, stem) for
+    variant sets
+    """
+    for path in sorted(images.MEALS_DIR.iterdir()):
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        parts = path.name.split(".")
+        if images.variant_urls(f"/{path.name}") is None:
+            yield path, None
+        elif parts[-2:] == ["full", "jpg"]:
+            yield path, ".".join(parts[:-2])
+
+def _store_variant_set(stem: str, digest: str) -> dict:
+    """Store the variants of a flat stem as the blob of digest; returns {old url: new url}"""
+    backend = storage.get_storage()
+    moved = {}
+    for key in images.blob_keys(digest):
+        variant, fmt = key.rsplit(".", 2)[1:]
+        src = images.MEALS_DIR / images.variant_filename(stem, variant, fmt)
+        if src.exists():
+            backend.put_file(src, key, content_type=image_processing.CONTENT_TYPES[fmt],
+                             cache_control=storage.LONG_CACHE_CONTROL)
+        moved[f"/static/meals/{src.name}"] = images.blob_url(digest, variant, fmt)
+    return moved
+
+def migrate_images(args):
+    """Move flat meal images into the storage backend by content hash (transcoding originals) and repoint meals"""
+    pool = image_processing.get_image_pool()
+    db = SessionLocal()
+    done, failed, start = 0, 0, time.perf_counter()
+    entries = list(_flat_images())
+    try:
+        for i in range(0, len(entries), args.batch_size):
+            jobs, renamed, sizes = [], {}, {}
+            for path, stem in entries[i:i + args.batch_size]:
+                digest = _sha256_file(path)
+                sizes[digest] = path.stat().st_size
+                if stem is None:
+                    jobs.append((path, digest, pool.submit(image_processing.store_variants, str(path), digest)))
+                else:
+                    renamed.update(_store_variant_set(stem, digest))
+            transcoded = []
+            for path, digest, future in jobs:
+                try:
+                    future.result()
+                except (OSError, ValueError) as e:
+                    print(f"WARN: skipping {path.name}: {e}")
+                    failed += 1
+                    sizes.pop(digest, None)
+                    continue
+                renamed[f"/static/meals/{path.name}"] = images.blob_url(digest)
+                transcoded.append(path)
+
+            if renamed:
+                params, values = {}, []
+                for n, (old, new) in enumerate(renamed.items()):
+                    values.append(f"(CAST(:old{n} AS varchar), CAST(:new{n} AS varchar))")
+                    params.update({f"old{n}": old, f"new{n}": new})
+                db.execute(text(
+                    "UPDATE meals m SET image_url = v.new "
+                    f"FROM (VALUES {', '.join(values)}) AS v(old, new) WHERE m.image_url = v.old"
+                ), params)
+                for digest, size in sizes.items():
+                    image_blobs.register(db, digest, size)
+                image_blobs.recount(db, list(sizes))
+                db.commit()
+            if args.delete_originals:
+                for path in transcoded:
+                    os.unlink(path)
+            done += len(sizes)
+            elapsed = time.perf_counter() - start
+            print(f"{done}/{len(entries)} images migrated ({done / elapsed:.1f} files/s)")
+    finally:
+        db.close()
+        image_processing.shutdown_image_pool()
+    print(f"Done: {done} images, {failed} failed in {time.perf_counter() - start:.1f}s")
+
+def gc_images(args):
+    """Recount image references and delete blobs no meal has used for --grace-hours"""
+    db = SessionLocal()
+    collected, start = 0, time.perf_counter()
+    try:
+        if args.recount:
+            print(f"{image_blobs.recount(db)} refcounts corrected")
+            db.commit()
+        while True:
+            digests = image_blobs.collect_garbage(db, args.grace_hours, args.batch_size)
+            db.commit()
+            collected += len(digests)
+            if len(digests) < args.batch_size:
+                break
+            print(f"{collected} blobs collected")
+    finally:
+        db.close()
+    print(f"Done: {collected} blobs collected in {time.perf_counter() - start:.1f}s")
+
+def import_nutrition(args):
+    """Import nutrition items from a CSV or JSONL file (COPY into staging, batched upsert), then rebuild the typeahead snapshot"""
+    db = SessionLocal()
+
+    def progress(result):
+        print(f"{result.rows} rows, {result.inserted} inserted, {result.updated} updated, "
+              f"{result.rejected} rejected ({result.rows_per_second:.0f} rows/s)")
+
+    try:
+        with typeahead.bulk_write(db):
+            result = nutrition_import.import_file(db, args.file, args.format, batch_size=args.batch_size, progress=progress)
+    finally:
+        db.close()
+    for error in result.errors:
+        print(f"Rejected {error}")
+    print(f"Done: {result.rows} rows ({result.inserted} inserted, {result.updated} updated, "
+          f"{result.unchanged} unchanged, {result.rejected} rejected) in {result.seconds:.1f}s "
+          f"({result.rows_per_second:.0f} rows/s)")
+
+def build_typeahead(args):
+    """Rebuild the nutrition typeahead snapshot; running workers reload it at their next sync"""
+    path = args.path or config.get_settings().TYPEAHEAD_SNAPSHOT
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        items = typeahead.rebuild_snapshot(db, path)
+    finally:
+        db.close()
+    size = os.path.getsize(path)
+    per_100k = size * 100_000 // items if items else 0
+    print(f"Done: {items} items in {time.perf_counter() - start:.1f}s, "
+          f"{size / 1024 / 1024:.1f} MB ({per_100k / 1024 / 1024:.1f} MB per 100k items) -> {path}")
+
+def enrich_meals(args):
+    """Fill in missing meal macros from the nutrition catalog, in resumable batches"""
+    settings = config.get_settings()
+    db = SessionLocal()
+    index = None
+    if settings.TYPEAHEAD_SNAPSHOT and os.path.exists(settings.TYPEAHEAD_SNAPSHOT):
+        index = typeahead.TypeaheadIndex()
+        index.load(db, settings.TYPEAHEAD_SNAPSHOT)
+    matcher = enrichment.Matcher(db, index=index)
+    if args.recheck:
+        print(f"{enrichment.recheck_unmatched(db)} unmatched meals to check again")
+        db.commit()
+    after = None
+    if args.after:
+        created_at, meal_id = args.after.split(",", 1)
+        after = (datetime.fromisoformat(created_at), meal_id)
+    scanned, enriched, start = 0, 0, time.perf_counter()
+    try:
+        while True:
+            batch_start = time.perf_counter()
+            meals = enrichment.pending_meals(db, after, args.batch_size)
+            if not meals:
+                db.rollback()
+                if not args.follow:
+                    break
+                # ถึงท้ายข้อมูลแล้ว รอมื้ออาหารใหม่ แล้วอ่านต่อจาก token เดิม
+                time.sleep(args.poll_seconds)
+                if index:
+                    index.sync(db)
+                continue
+            enriched += enrichment.enrich(db, meals, matcher)
+            db.commit()
+            scanned += len(meals)
+            after = (meals[-1].created_at, meals[-1].id)
+            elapsed = time.perf_counter() - start
+            print(f"{scanned} meals scanned, {enriched} enriched, cache hit {matcher.hit_ratio:.0%}, "
+                  f"last {after[0].isoformat()},{after[1]} ({enriched / elapsed:.0f} meals/s)")
+            if args.max_rate:
+                # Spread the batches so the scan stays under --max-rate meals/s
+                time.sleep(max(0.0, len(meals) / args.max_rate - (time.perf_counter() - batch_start)))
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Done: {enriched} of {scanned} meals enriched in {elapsed:.1f}s "
+          f"({enriched / elapsed if elapsed else 0:.0f} meals/s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m personal_wellness_tracker_backend.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("calibrate-hashing", help=calibrate_hashing.__doc__)
+    cmd.add_argument("--scheme", choices=security.PASSWORD_SCHEMES)
+    cmd.add_argument("--target-ms", type=float, default=250.0)
+    cmd.set_defaults(func=calibrate_hashing)
+
+    cmd = commands.add_parser("backfill-rollups", help=backfill_rollups.__doc__)
+    cmd.add_argument("--batch-size", type=int, default=500)
+    cmd.add_argument("--after", help="resume after this user uid")
+    cmd.set_defaults(func=backfill_rollups)
+
+    cmd = commands.add_parser("seed-achievements", help=seed_achievements.__doc__)
+    cmd.add_argument("--batch-size", type=int, default=5000)
+    cmd.add_argument("--after", help="resume after this user uid")
+    cmd.set_defaults(func=seed_achievements)
+
+    cmd = commands.add_parser("migrate-images", help=migrate_images.__doc__)
+    cmd.add_argument("--batch-size", type=int, default=100)
+    cmd.add_argument("--delete-originals", action="store_true",
+                     help="remove each original once its meals point at the variants")
+    cmd.set_defaults(func=migrate_images)
+
+    cmd = commands.add_parser("gc-images", help=gc_images.__doc__)
+    cmd.add_argument("--grace-hours", type=float, default=24.0,
+                     help="keep unreferenced blobs this long (uploads not yet attached to a meal)")
+    cmd.add_argument("--batch-size", type=int, default=1000)
+    cmd.add_argument("--recount", action="store_true",
+                     help="first recompute refcounts from meals (after users or food logs were deleted)")
+    cmd.set_defaults(func=gc_images)
+
+    cmd = commands.add_parser("import-nutrition", help=import_nutrition.__doc__)
+    cmd.add_argument("file")
+    cmd.add_argument("--format", choices=nutrition_import.FORMATS, help="default: from the file name")
+    cmd.add_argument("--batch-size", type=int, default=config.get_settings().NUTRITION_IMPORT_BATCH_SIZE)
+    cmd.set_defaults(func=import_nutrition)
+
+    cmd = commands.add_parser("build-typeahead", help=build_typeahead.__doc__)
+    cmd.add_argument("--path", help="snapshot file (default TYPEAHEAD_SNAPSHOT)")
+    cmd.set_defaults(func=build_typeahead)
+
+    cmd = commands.add_parser("enrich-meals", help=enrich_meals.__doc__)
+    cmd.add_argument("--batch-size", type=int, default=500)
+    cmd.add_argument("--max-rate", type=float, default=0.0, help="meals scanned per second (0 = no limit)")
+    cmd.add_argument("--after", help="resume after this created_at,id (printed with every batch)")
+    cmd.add_argument("--follow", action="store_true", help="keep running and enrich new meals as they arrive")
+    cmd.add_argument("--recheck", action="store_true",
+                     help="first check again the unmatched meals checked before the catalog last changed")
+    cmd.add_argument("--poll-seconds", type=float, default=60.0)
+    cmd.set_defaults(func=enrich_meals)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
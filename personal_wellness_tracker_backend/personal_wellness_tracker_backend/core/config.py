@@ -1,11 +1,76 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
+import os
 
 class Settings(BaseSettings):
     SQLDB_URL: str
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 5 * 60
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 7 * 24 * 60
+    # Use the asyncpg AsyncSession path (False = blocking psycopg2 sessions in the threadpool)
+    DB_ASYNC: bool = True
+    # Connection pool (per engine, per uvicorn worker)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Shared secret of internal callers (monitoring, admin jobs), sent as
+    # X-Internal-Token; internal endpoints answer 404 while it is empty
+    INTERNAL_API_TOKEN: str = ""
+    # Authenticated principal cache (per worker)
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAXSIZE: int = 10_000
+    # Password hashing process pool (per worker) and admission limit
+    PASSWORD_HASH_WORKERS: int = max(1, (os.cpu_count() or 2) // 2)
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    # Password hashing scheme ("bcrypt" or "argon2") and cost; stored hashes
+    # are rehashed on login when they don't match these parameters
+    PASSWORD_HASH_SCHEME: str = "bcrypt"
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 64 * 1024
+    ARGON2_PARALLELISM: int = 2
+    # Uploaded files: root directory (served under /static), size cap and
+    # how much of an upload is buffered before each off-loop disk write
+    UPLOAD_DIR: str = "uploads"
+    MAX_UPLOAD_BYTES: int = 5 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # /static serving: read size when the body is streamed by the app, and
+    # the internal nginx location to hand file bodies to (X-Accel-Redirect)
+    STATIC_CHUNK_SIZE: int = 256 * 1024
+    STATIC_ACCEL_REDIRECT: str = ""
+    # Where meal images are stored: "local" (UPLOAD_DIR) or "s3" (any
+    # S3-compatible service, e.g. the MinIO container of docker-compose).
+    # S3_PUBLIC_URL is the base URL clients load objects from; presigned
+    # upload URLs are signed for S3_PRESIGN_ENDPOINT_URL when the API reaches
+    # the service under another host name than clients do
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = "wellness-uploads"
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_PRESIGN_ENDPOINT_URL: Optional[str] = None
+    S3_PUBLIC_URL: Optional[str] = None
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS: int = 600
+    # Image transcoding process pool (per worker), and the most pixels
+    # (width x height) an uploaded image may decode to; larger ones get a 413
+    IMAGE_WORKERS: int = max(1, (os.cpu_count() or 2) // 2)
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    # In-memory nutrition typeahead index (per worker): the snapshot file it
+    # maps (built from the database when missing; "" = search the database)
+    # and how often writes made through other workers are picked up
+    TYPEAHEAD_SNAPSHOT: str = "data/nutrition_typeahead.idx"
+    TYPEAHEAD_SYNC_SECONDS: float = 30.0
+    # Nutrition catalog import (cli import-nutrition, POST /nutrition/import):
+    # rows per COPY + upsert transaction and the upload size cap
+    NUTRITION_IMPORT_BATCH_SIZE: int = 10_000
+    NUTRITION_IMPORT_MAX_BYTES: int = 512 * 1024 * 1024
+    # Meal enrichment from the catalog (cli enrich-meals): besides an exact name,
+    # lowest trigram similarity (0-1, both ways, tone marks kept) accepted as a match
+    ENRICH_MIN_SIMILARITY: float = 0.8
 
     model_config = {
         "env_file": ".env",
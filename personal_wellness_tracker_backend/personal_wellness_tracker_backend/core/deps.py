@@ -1,28 +1,41 @@
-from fastapi import Depends, HTTPException, status
+from dataclasses import dataclass
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from jose import jwt, JWTError
-from typing import Annotated
-from .. import models
-from ..database import get_db
+from typing import Annotated, Optional
+import hmac
+from .. import models, crud
+from ..database import DBSession, get_session, run_db
 from . import config, security
+from .cache import principal_cache
 
 # OAuth2 scheme สำหรับ authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 settings = config.get_settings()
 
-def get_current_user(
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user as cached per worker (no ORM instance)"""
+    uid: str
+    email: str
+    username: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(uid=user.uid, email=user.email, username=user.username)
+
+async def get_current_user_id(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)],
-) -> models.User:
+) -> str:
     """
-    Get current user from JWT token
+    Get the user id from the JWT token alone (no database access)
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
         user_id: str = payload.get("sub")
@@ -36,16 +49,54 @@ def get_current_user(
         )
     except jwt.InvalidTokenError:
         raise credentials_exception
+    return user_id
+
+async def get_current_principal(
+    user_id: Annotated[str, Depends(get_current_user_id)],
+    db: Annotated[DBSession, Depends(get_session)],
+) -> Principal:
+    """
+    Get the current user from the principal cache, loading the user only
+    on a cache miss
+    """
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await run_db(db, crud.get_user, user_id)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        principal_cache.set(user_id, principal)
+    return principal
 
-    user = db.query(models.User).filter(models.User.uid == user_id).first()
+async def get_current_user(
+    user_id: Annotated[str, Depends(get_current_user_id)],
+    db: Annotated[DBSession, Depends(get_session)],
+) -> models.User:
+    """
+    Get current user from JWT token
+    """
+    user = await run_db(db, crud.get_user, user_id)
     if user is None:
         raise credentials_exception
+    principal_cache.set(user_id, Principal.from_user(user))
     return user
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: Annotated[models.User, Depends(get_current_user)]
 ) -> models.User:
     """
     Get current active user (สำหรับอนาคตอาจเพิ่มการตรวจสอบ active status)
     """
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def require_internal(
+    x_internal_token: Annotated[Optional[str], Header()] = None,
+) -> None:
+    """
+    Guard of internal endpoints: the caller must send INTERNAL_API_TOKEN in
+    X-Internal-Token (compared in constant time)
+    """
+    if not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token.encode(), settings.INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
@@ -0,0 +1,27 @@
+"""
+In-process event bus for write events emitted by crud.
+
+Handlers run synchronously inside the emitting crud call, in the same
+transaction, and get the session as their first argument. Each handler
+runs in a savepoint so a failing handler never fails the write itself.
+"""
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+_handlers: Dict[str, List[Callable]] = defaultdict(list)
+
+def subscribe(event: str):
+    """Decorator registering a handler for `event`; registering it again is a no-op"""
+    def register(handler: Callable):
+        if handler not in _handlers[event]:
+            _handlers[event].append(handler)
+        return handler
+    return register
+
+def emit(db, event: str, **payload):
+    for handler in _handlers.get(event, ()):
+        try:
+            with db.begin_nested():
+                handler(db, **payload)
+        except Exception as e:
+            print(f"WARN: {event} handler {handler.__name__} failed: {e}")
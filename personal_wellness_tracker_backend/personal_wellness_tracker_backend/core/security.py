@@ -1,6 +1,12 @@
+import asyncio
 import datetime
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
 from jose import jwt
-from typing import Optional
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from . import config
 
@@ -8,16 +14,134 @@ settings = config.get_settings()
 ALGORITHM = "HS256"
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_SCHEMES = ("bcrypt", "argon2")
+
+def build_pwd_context(
+    scheme: str = settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds: int = settings.BCRYPT_ROUNDS,
+    argon2_time_cost: int = settings.ARGON2_TIME_COST,
+    argon2_memory_cost: int = settings.ARGON2_MEMORY_COST,
+    argon2_parallelism: int = settings.ARGON2_PARALLELISM,
+) -> CryptContext:
+    """
+    CryptContext hashing with `scheme` at exactly the configured cost.
+    Hashes of the other scheme, or at any other cost, report needs_update
+    so they are upgraded (or downgraded) on the next successful login.
+    """
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+    schemes = [scheme] + [s for s in PASSWORD_SCHEMES if s != scheme]
+    return CryptContext(
+        schemes=schemes,
+        default=scheme,
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="id",
+        argon2__default_rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+pwd_context = build_pwd_context()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also return a new hash if the stored one is outdated"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+# Password hashing runs in a dedicated process pool so a burst of logins
+# cannot occupy the request threadpool or contend for the GIL.
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_in_flight = 0
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hash_pool
+
+async def _run_in_hash_pool(fn, *args):
+    """Admit the call only while fewer than PASSWORD_HASH_MAX_PENDING are queued or running"""
+    global _hash_in_flight
+    if _hash_in_flight >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _hash_in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_pool(), fn, *args)
+    finally:
+        _hash_in_flight -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool"""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password in the hashing pool"""
+    return await _run_in_hash_pool(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool"""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+def calibrate_password_cost(scheme: str, target_ms: float, samples: int = 5) -> Tuple[dict, float]:
+    """
+    Find the highest cost whose median verify time on this machine stays
+    within target_ms. bcrypt varies rounds; argon2 varies time_cost at the
+    configured memory_cost and parallelism.
+    Returns (settings to apply, measured median ms).
+    """
+    if scheme == "bcrypt":
+        candidates = [({"BCRYPT_ROUNDS": rounds}, build_pwd_context("bcrypt", bcrypt_rounds=rounds))
+                      for rounds in range(8, 17)]
+    elif scheme == "argon2":
+        candidates = [({"ARGON2_TIME_COST": cost}, build_pwd_context("argon2", argon2_time_cost=cost))
+                      for cost in range(1, 11)]
+    else:
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+
+    best = None
+    for params, context in candidates:
+        hashed = context.hash("calibration-password")
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            context.verify("calibration-password", hashed)
+            timings.append((time.perf_counter() - start) * 1000)
+        median_ms = statistics.median(timings)
+        if median_ms > target_ms:
+            break
+        best = (params, median_ms)
+
+    if best is None:
+        params, _ = candidates[0]
+        return params, median_ms
+    return best
+
 def create_access_token(data: dict, expires_delta: Optional[datetime.timedelta] = None) -> str:
     to_encode = data.copy()
     now = datetime.datetime.utcnow()
@@ -1,10 +1,16 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, desc, func, select, insert, update, exists, cast, tuple_, Integer
 from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime, date, timedelta
 import uuid
+import json
+import base64
 
-from . import models, schemas
+from . import models, schemas, rollups, achievements, image_blobs, nutrition, serializers, typeahead
+from .nutrition import normalize_name
+from .core.cache import invalidate_principal
+from .core import events
 
 # User CRUD operations
 def get_user(db: Session, user_id: str):
@@ -23,6 +29,30 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def create_registered_user(db: Session, email: str, password_hash: str, username: Optional[str] = None):
+    db_user = models.User(
+        uid=str(uuid.uuid4()),
+        email=email,
+        password_hash=password_hash,
+        username=username,
+        profile_completed=False
+    )
+    db.add(db_user)
+    db.flush()
+    achievements.seed_defaults(db, [db_user.uid])
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+def update_user_fields(db: Session, db_user: models.User, **fields):
+    for field, value in fields.items():
+        setattr(db_user, field, value)
+    db_user.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_user)
+    invalidate_principal(db_user.uid)
+    return db_user
+
 def update_user(db: Session, user_id: str, user_update: schemas.UserUpdate):
     db_user = db.query(models.User).filter(models.User.uid == user_id).first()
     if db_user:
@@ -33,6 +63,7 @@ def update_user(db: Session, user_id: str, user_update: schemas.UserUpdate):
         db_user.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_user)
+        invalidate_principal(user_id)
     return db_user
 
 def delete_user(db: Session, user_id: str):
@@ -40,6 +71,7 @@ def delete_user(db: Session, user_id: str):
     if db_user:
         db.delete(db_user)
         db.commit()
+        invalidate_principal(user_id)
     return db_user
 
 # User Goals CRUD operations
@@ -59,6 +91,8 @@ def create_user_goal(db: Session, goal: schemas.UserGoalCreate):
     print(f"DEBUG CRUD: Creating goal with data: {goal_data}")
     db_goal = models.UserGoal(**goal_data)
     db.add(db_goal)
+    db.flush()
+    events.emit(db, "goal_changed", user_id=db_goal.user_id, goal=db_goal)
     db.commit()
     db.refresh(db_goal)
     print(f"DEBUG CRUD: Goal created successfully with id: {db_goal.id}")
@@ -71,6 +105,8 @@ def update_user_goal(db: Session, goal_id: str, goal_update: schemas.UserGoalUpd
         for field, value in update_data.items():
             setattr(db_goal, field, value)
         db_goal.updated_at = datetime.utcnow()
+        db.flush()
+        events.emit(db, "goal_changed", user_id=db_goal.user_id, goal=db_goal)
         db.commit()
         db.refresh(db_goal)
     return db_goal
@@ -86,6 +122,12 @@ def get_food_logs(db: Session, user_id: str, skip: int = 0, limit: int = 100):
         models.FoodLog.user_id == user_id
     ).order_by(desc(models.FoodLog.date)).offset(skip).limit(limit).all()
 
+def get_food_log_rows(db: Session, user_id: str, skip: int = 0, limit: int = 100):
+    """get_food_logs as column rows for serializers.food_log"""
+    return db.execute(select(*serializers.food_log.columns).where(
+        models.FoodLog.user_id == user_id
+    ).order_by(desc(models.FoodLog.date)).offset(skip).limit(limit)).all()
+
 def create_food_log(db: Session, food_log: schemas.FoodLogCreate):
     food_log_data = food_log.dict()
     food_log_data['id'] = str(uuid.uuid4())
@@ -103,6 +145,43 @@ def update_food_log_meal_count(db: Session, food_log_id: str, meal_count: int):
         db.refresh(db_food_log)
     return db_food_log
 
+def _adjust_food_log_totals(db: Session, food_log_id: str, meals: int, calories: int):
+    """
+    Apply a delta to food_logs.meal_count/total_calories in SQL so that
+    concurrent writers never lose updates. Runs in the caller's transaction
+    and returns the food log's (user_id, date, meal_count) after the update.
+    """
+    return db.execute(
+        update(models.FoodLog)
+        .where(models.FoodLog.id == food_log_id)
+        .values(
+            meal_count=func.greatest(func.coalesce(models.FoodLog.meal_count, 0) + meals, 0),
+            total_calories=func.greatest(func.coalesce(models.FoodLog.total_calories, 0) + calories, 0),
+        )
+        .returning(models.FoodLog.user_id, models.FoodLog.date, models.FoodLog.meal_count)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+def _food_log_day(db: Session, food_log_id: str):
+    """(user_id, date) of a food log"""
+    return db.execute(
+        select(models.FoodLog.user_id, models.FoodLog.date).where(models.FoodLog.id == food_log_id)
+    ).first()
+
+def recalculate_food_log_stats(db: Session, food_log_id: str):
+    """Rebuild meal_count/total_calories of a food log from its meals"""
+    db_food_log = db.query(models.FoodLog).filter(models.FoodLog.id == food_log_id).first()
+    if db_food_log:
+        meal_count, total_calories = db.query(
+            func.count(models.Meal.id),
+            func.coalesce(func.sum(models.Meal.calories), 0)
+        ).filter(models.Meal.food_log_id == food_log_id).one()
+        db_food_log.meal_count = meal_count
+        db_food_log.total_calories = total_calories
+        db.commit()
+        db.refresh(db_food_log)
+    return db_food_log
+
 # Meal CRUD operations
 def get_meals_by_food_log(db: Session, food_log_id: str):
     return db.query(models.Meal).filter(models.Meal.food_log_id == food_log_id).all()
@@ -112,51 +191,129 @@ def get_meals_by_user(db: Session, user_id: str, skip: int = 0, limit: int = 100
         models.Meal.user_id == user_id
     ).order_by(desc(models.Meal.created_at)).offset(skip).limit(limit).all()
 
+def get_meal_rows_by_user(db: Session, user_id: str, skip: int = 0, limit: int = 100):
+    """get_meals_by_user as column rows for serializers.meal"""
+    return db.execute(select(*serializers.meal.columns).where(
+        models.Meal.user_id == user_id
+    ).order_by(desc(models.Meal.created_at)).offset(skip).limit(limit)).all()
+
 def get_meal(db: Session, meal_id: str):
     return db.query(models.Meal).filter(models.Meal.id == meal_id).first()
 
 def create_meal(db: Session, meal: schemas.MealCreate):
+    """Insert the meal and bump its food log counters in one transaction"""
     meal_data = meal.dict()
     meal_data['id'] = str(uuid.uuid4())
     db_meal = models.Meal(**meal_data)
     db.add(db_meal)
+    db.flush()
+    image_blobs.adjust_refs(db, added=[meal.image_url])
+    owner = _adjust_food_log_totals(db, meal.food_log_id, meals=1, calories=meal.calories or 0)
+    if owner:
+        rollups.apply_meal_delta(db, owner.user_id, owner.date, rollups.meal_delta(meal))
+        events.emit(db, "meals_created", user_id=owner.user_id, day=owner.date,
+                    meals=1, first_of_day=owner.meal_count == 1)
     db.commit()
-    db.refresh(db_meal)
-    
-    # Update meal count in food log
-    food_log = db.query(models.FoodLog).filter(models.FoodLog.id == meal.food_log_id).first()
-    if food_log:
-        food_log.meal_count += 1
-        db.commit()
-    
     return db_meal
 
+def create_meals_bulk(db: Session, user_id: str, meals: List[schemas.MealCreate]) -> List[schemas.BatchItemResult]:
+    """
+    Insert a batch of meals with one executemany and update each touched
+    food log once, all in a single transaction. Items whose food log does
+    not belong to user_id, or whose image was never uploaded, are reported
+    as failed and skipped.
+    """
+    food_log_ids = {meal.food_log_id for meal in meals}
+    owned_logs = set(db.scalars(
+        select(models.FoodLog.id).where(
+            models.FoodLog.id.in_(food_log_ids),
+            models.FoodLog.user_id == user_id
+        )
+    ))
+
+    unknown_images = image_blobs.unknown_urls(db, [meal.image_url for meal in meals])
+
+    rows, results = [], []
+    totals = defaultdict(lambda: [0, 0])
+    rollup_deltas = defaultdict(list)
+    for index, meal in enumerate(meals):
+        if meal.user_id != user_id or meal.food_log_id not in owned_logs:
+            results.append(schemas.BatchItemResult(index=index, success=False, error="Food log not found"))
+            continue
+        if meal.image_url in unknown_images:
+            results.append(schemas.BatchItemResult(index=index, success=False, error="Image not found"))
+            continue
+        row = meal.dict()
+        row['id'] = str(uuid.uuid4())
+        rows.append(row)
+        totals[meal.food_log_id][0] += 1
+        totals[meal.food_log_id][1] += meal.calories or 0
+        rollup_deltas[meal.food_log_id].append(rollups.meal_delta(meal))
+        results.append(schemas.BatchItemResult(index=index, success=True, id=row['id']))
+
+    if rows:
+        db.execute(insert(models.Meal), rows)
+        image_blobs.adjust_refs(db, added=[row['image_url'] for row in rows])
+        for food_log_id, (meal_count, calories) in totals.items():
+            owner = _adjust_food_log_totals(db, food_log_id, meals=meal_count, calories=calories)
+            if owner:
+                rollups.apply_meal_delta(
+                    db, owner.user_id, owner.date, rollups.merge_deltas(*rollup_deltas[food_log_id])
+                )
+                events.emit(db, "meals_created", user_id=owner.user_id, day=owner.date,
+                            meals=meal_count, first_of_day=owner.meal_count == meal_count)
+        db.commit()
+    return results
+
 def update_meal(db: Session, meal_id: str, meal_update: schemas.MealUpdate):
     db_meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
     if db_meal:
         update_data = meal_update.dict(exclude_unset=True)
+        calories_delta = (update_data.get('calories') or 0) - (db_meal.calories or 0) if 'calories' in update_data else 0
+        removed = rollups.meal_delta(db_meal, sign=-1)
+        if 'image_url' in update_data:
+            image_blobs.adjust_refs(db, added=[update_data['image_url']], removed=[db_meal.image_url])
+        if 'food_name' in update_data and update_data['food_name'] != db_meal.food_name:
+            # Another name may match the catalog: back into the enrichment scan
+            db_meal.nutrition_checked_at = None
         for field, value in update_data.items():
             setattr(db_meal, field, value)
         db_meal.updated_at = datetime.utcnow()
+        if calories_delta:
+            owner = _adjust_food_log_totals(db, db_meal.food_log_id, meals=0, calories=calories_delta)
+        else:
+            owner = _food_log_day(db, db_meal.food_log_id)
+        if owner:
+            rollups.apply_meal_delta(
+                db, owner.user_id, owner.date, rollups.merge_deltas(removed, rollups.meal_delta(db_meal))
+            )
         db.commit()
         db.refresh(db_meal)
     return db_meal
 
 def delete_meal(db: Session, meal_id: str):
+    """
+    Delete the meal, decrement its food log counters and drop its image
+    reference in one transaction (the image itself is left to gc-images)
+    """
     db_meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
     if db_meal:
-        food_log_id = db_meal.food_log_id
         db.delete(db_meal)
+        db.flush()
+        image_blobs.adjust_refs(db, removed=[db_meal.image_url])
+        owner = _adjust_food_log_totals(db, db_meal.food_log_id, meals=-1, calories=-(db_meal.calories or 0))
+        if owner:
+            rollups.apply_meal_delta(db, owner.user_id, owner.date, rollups.meal_delta(db_meal, sign=-1))
+            events.emit(db, "meals_deleted", user_id=owner.user_id, day=owner.date,
+                        meals=1, last_of_day=owner.meal_count == 0)
         db.commit()
-        
-        # Update meal count in food log
-        food_log = db.query(models.FoodLog).filter(models.FoodLog.id == food_log_id).first()
-        if food_log and food_log.meal_count > 0:
-            food_log.meal_count -= 1
-            db.commit()
     
     return db_meal
 
+def register_image_blob(db: Session, digest: str, size: int):
+    image_blobs.register(db, digest, size)
+    db.commit()
+
 # Daily Task CRUD operations
 def get_daily_task(db: Session, user_id: str, date: date):
     return db.query(models.DailyTask).filter(
@@ -184,17 +341,60 @@ def create_task(db: Session, task: schemas.TaskCreate):
     task_data['id'] = str(uuid.uuid4())
     db_task = models.Task(**task_data)
     db.add(db_task)
+    db.flush()
+    for (user_id, day), totals in rollups.refresh_task_totals(db, [db_task.daily_task_id]).items():
+        events.emit(db, "tasks_written", user_id=user_id, day=day, tasks=[(db_task, None)],
+                    created=True, task_totals=totals)
     db.commit()
     db.refresh(db_task)
     return db_task
 
+def create_tasks_bulk(db: Session, user_id: str, tasks: List[schemas.TaskCreate]) -> List[schemas.BatchItemResult]:
+    """
+    Insert a batch of tasks with one executemany in a single transaction.
+    Items whose daily task does not belong to user_id are reported as failed.
+    """
+    daily_task_ids = {task.daily_task_id for task in tasks}
+    owned_days = dict(db.execute(
+        select(models.DailyTask.id, models.DailyTask.date).where(
+            models.DailyTask.id.in_(daily_task_ids),
+            models.DailyTask.user_id == user_id
+        )
+    ).all())
+
+    rows, results = [], []
+    written = defaultdict(list)
+    for index, task in enumerate(tasks):
+        if task.daily_task_id not in owned_days:
+            results.append(schemas.BatchItemResult(index=index, success=False, error="Daily task not found"))
+            continue
+        row = task.dict()
+        row['id'] = str(uuid.uuid4())
+        rows.append(row)
+        written[owned_days[task.daily_task_id]].append((task, None))
+        results.append(schemas.BatchItemResult(index=index, success=True, id=row['id']))
+
+    if rows:
+        db.execute(insert(models.Task), rows)
+        totals = rollups.refresh_task_totals(db, [row['daily_task_id'] for row in rows])
+        for day, day_tasks in written.items():
+            events.emit(db, "tasks_written", user_id=user_id, day=day, tasks=day_tasks,
+                        created=True, task_totals=totals.get((user_id, day), {}))
+        db.commit()
+    return results
+
 def update_task(db: Session, task_id: str, task_update: schemas.TaskUpdate):
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if db_task:
         update_data = task_update.dict(exclude_unset=True)
+        previous = schemas.TaskBase.model_validate(db_task, from_attributes=True)
         for field, value in update_data.items():
             setattr(db_task, field, value)
         db_task.updated_at = datetime.utcnow()
+        db.flush()
+        for (user_id, day), totals in rollups.refresh_task_totals(db, [db_task.daily_task_id]).items():
+            events.emit(db, "tasks_written", user_id=user_id, day=day, tasks=[(db_task, previous)],
+                        created=False, task_totals=totals)
         db.commit()
         db.refresh(db_task)
     return db_task
@@ -203,15 +403,122 @@ def delete_task(db: Session, task_id: str):
     db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if db_task:
         db.delete(db_task)
+        db.flush()
+        for (user_id, day), totals in rollups.refresh_task_totals(db, [db_task.daily_task_id]).items():
+            events.emit(db, "tasks_deleted", user_id=user_id, day=day, tasks=[db_task], task_totals=totals)
         db.commit()
     return db_task
 
+# Date-range queries with keyset pagination on (date, id)
+def encode_cursor(day: date, row_id: str) -> str:
+    raw = json.dumps([day.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Return (date, id) from an opaque cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(day), str(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def _keyset_page(db: Session, query, date_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Apply `(date, id) > cursor` and fetch limit + 1 rows to detect a next
+    page. For a table with a (user_id, date, id) index (food_logs,
+    daily_tasks) this is an index seek, so the cost of a page does not
+    depend on how deep it is; see get_meals_range for the joined case.
+    """
+    if cursor:
+        query = query.where(tuple_(date_column, id_column) > tuple_(*decode_cursor(cursor)))
+    rows = db.scalars(query.order_by(date_column, id_column).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+def get_food_logs_range(db: Session, user_id: str, date_from: date, date_to: date,
+                        cursor: Optional[str] = None, limit: int = 50) -> schemas.FoodLogPage:
+    query = select(models.FoodLog).where(
+        models.FoodLog.user_id == user_id,
+        models.FoodLog.date.between(date_from, date_to)
+    )
+    items, has_more = _keyset_page(db, query, models.FoodLog.date, models.FoodLog.id, cursor, limit)
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if has_more else None
+    return schemas.FoodLogPage.model_validate({"items": items, "next_cursor": next_cursor}, from_attributes=True)
+
+def get_meals_range(db: Session, user_id: str, date_from: date, date_to: date,
+                    cursor: Optional[str] = None, limit: int = 50) -> schemas.MealPage:
+    """
+    Meals whose food log date falls in [date_from, date_to]. No index has
+    the (date, meal id) order across the join; instead the food logs are
+    walked through (user_id, date, id) from the cursor's date on, their
+    meals fetched by food_log_id and only the meals of one date at a time
+    sorted by id (nested loop + incremental sort), so a page still costs
+    O(page size) at any depth.
+    """
+    query = select(models.Meal).join(models.FoodLog, models.Meal.food_log_id == models.FoodLog.id).where(
+        models.FoodLog.user_id == user_id,
+        models.FoodLog.date.between(date_from, date_to)
+    ).add_columns(models.FoodLog.date)
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        # Implied by the row comparison, but only this bound can seek the food_logs index
+        query = query.where(
+            models.FoodLog.date >= after_date,
+            tuple_(models.FoodLog.date, models.Meal.id) > tuple_(after_date, after_id)
+        )
+    rows = db.execute(query.order_by(models.FoodLog.date, models.Meal.id).limit(limit + 1)).all()
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1][1], page[-1][0].id) if len(rows) > limit else None
+    return schemas.MealPage.model_validate({"items": [row[0] for row in page], "next_cursor": next_cursor}, from_attributes=True)
+
+def get_daily_tasks_range(db: Session, user_id: str, date_from: date, date_to: date,
+                          cursor: Optional[str] = None, limit: int = 50) -> schemas.DailyTaskPage:
+    """Daily tasks in [date_from, date_to] with their tasks embedded (one extra selectin query)"""
+    query = select(models.DailyTask).options(selectinload(models.DailyTask.tasks)).where(
+        models.DailyTask.user_id == user_id,
+        models.DailyTask.date.between(date_from, date_to)
+    )
+    items, has_more = _keyset_page(db, query, models.DailyTask.date, models.DailyTask.id, cursor, limit)
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if has_more else None
+    return schemas.DailyTaskPage.model_validate({"items": items, "next_cursor": next_cursor}, from_attributes=True)
+
+# Day dashboard
+def get_day_dashboard(db: Session, user_id: str, day: date) -> schemas.DayDashboard:
+    """
+    Load one day for the dashboard: food log + meals and daily task + tasks
+    each come from a single joined query, then goals and the stored streak.
+    """
+    food_log = db.query(models.FoodLog).options(joinedload(models.FoodLog.meals)).filter(
+        and_(models.FoodLog.user_id == user_id, models.FoodLog.date == day)
+    ).first()
+    daily_task = db.query(models.DailyTask).options(joinedload(models.DailyTask.tasks)).filter(
+        and_(models.DailyTask.user_id == user_id, models.DailyTask.date == day)
+    ).first()
+    goals = get_user_goals(db, user_id)
+    user = get_user(db, user_id)
+
+    return schemas.DayDashboard.model_validate({
+        "date": day,
+        "food_log": food_log,
+        "meals": sorted(food_log.meals, key=lambda meal: meal.created_at) if food_log else [],
+        "daily_task": daily_task,
+        "tasks": sorted(daily_task.tasks, key=lambda task: task.created_at) if daily_task else [],
+        "goals": goals,
+        "streak_count": current_streak(user) if user else 0,
+    }, from_attributes=True)
+
 # Achievement CRUD operations
 def get_user_achievements(db: Session, user_id: str):
     return db.query(models.Achievement).filter(
         models.Achievement.user_id == user_id
     ).order_by(models.Achievement.created_at).all()
 
+def get_user_achievement_rows(db: Session, user_id: str):
+    """get_user_achievements as column rows for serializers.achievement"""
+    return db.execute(select(*serializers.achievement.columns).where(
+        models.Achievement.user_id == user_id
+    ).order_by(models.Achievement.created_at)).all()
+
 def get_achievement_by_type(db: Session, user_id: str, achievement_type: str):
     return db.query(models.Achievement).filter(
         and_(
@@ -220,6 +527,12 @@ def get_achievement_by_type(db: Session, user_id: str, achievement_type: str):
         )
     ).first()
 
+def seed_user_achievements(db: Session, user_id: str) -> int:
+    """Create the user's missing default achievements; returns how many were created"""
+    created = achievements.seed_defaults(db, [user_id])
+    db.commit()
+    return created
+
 def get_achievement(db: Session, achievement_id: str):
     return db.query(models.Achievement).filter(models.Achievement.id == achievement_id).first()
 
@@ -251,10 +564,8 @@ def delete_achievement(db: Session, achievement_id: str):
     return db_achievement
 
 # Nutrition Database CRUD operations
-def get_nutrition_by_food_name(db: Session, food_name: str):
-    return db.query(models.NutritionDatabase).filter(
-        models.NutritionDatabase.food_name.ilike(f"%{food_name}%")
-    ).all()
+def get_nutrition_by_food_name(db: Session, food_name: str, limit: int = 20):
+    return nutrition.search(db, food_name, limit=limit)
 
 def get_nutrition_item(db: Session, nutrition_id: str):
     return db.query(models.NutritionDatabase).filter(models.NutritionDatabase.id == nutrition_id).first()
@@ -262,10 +573,12 @@ def get_nutrition_item(db: Session, nutrition_id: str):
 def create_nutrition_item(db: Session, nutrition: schemas.NutritionDatabaseCreate):
     nutrition_data = nutrition.dict()
     nutrition_data['id'] = str(uuid.uuid4())
+    nutrition_data['search_name'] = normalize_name(nutrition.food_name, nutrition.food_name_en)
     db_nutrition = models.NutritionDatabase(**nutrition_data)
     db.add(db_nutrition)
     db.commit()
     db.refresh(db_nutrition)
+    typeahead.index.upsert(db_nutrition)
     return db_nutrition
 
 def update_nutrition_item(db: Session, nutrition_id: str, nutrition_update: schemas.NutritionDatabaseUpdate):
@@ -274,9 +587,12 @@ def update_nutrition_item(db: Session, nutrition_id: str, nutrition_update: sche
         update_data = nutrition_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_nutrition, field, value)
-        db_nutrition.last_updated = datetime.utcnow()
+        db_nutrition.search_name = normalize_name(db_nutrition.food_name, db_nutrition.food_name_en)
+        # Database time, like the default: typeahead watermarks compare against it
+        db_nutrition.last_updated = func.now()
         db.commit()
         db.refresh(db_nutrition)
+        typeahead.index.upsert(db_nutrition)
     return db_nutrition
 
 # User Preferences CRUD operations
@@ -326,40 +642,118 @@ def update_app_statistics(db: Session, stats_update: schemas.AppStatisticsUpdate
     return db_stats
 
 # --- New: compute and persist user's day streak ---
-def compute_and_update_user_streak(db: Session, user_id: str) -> int:
+def _active_days_query(user_id: str):
     """
-    Recalculate consecutive-day streak ending today where a day counts
-    only if there is at least one Task for that day.
-    Persist result to users.day_streak and return the streak.
+    Days on which the user has at least one Task, numbered newest-first.
+    Consecutive days share the same island key (day + rn).
     """
-    today = date.today()
-    streak = 0
-    current_date = today
-
-    while True:
-        daily = db.query(models.DailyTask).filter(
-            models.DailyTask.user_id == user_id,
-            models.DailyTask.date == current_date
-        ).first()
+    has_task = exists().where(models.Task.daily_task_id == models.DailyTask.id)
+    rn = cast(func.row_number().over(order_by=desc(models.DailyTask.date)), Integer)
+    return select(
+        models.DailyTask.date.label("day"),
+        (models.DailyTask.date + rn).label("island"),
+    ).where(
+        models.DailyTask.user_id == user_id,
+        has_task,
+    ).subquery()
+
+def current_streak(user: models.User, today: Optional[date] = None) -> int:
+    """
+    Streak ending today, derived from the stored run without any query.
+    """
+    return user.streak_on(today or date.today())
 
-        if not daily:
-            break
+def _store_streak_run(db: Session, user: models.User, start: Optional[date], last: Optional[date]) -> int:
+    user.streak_start_date = start
+    user.streak_last_date = last
+    user.updated_at = datetime.utcnow()
+    events.emit(db, "streak_updated", user_id=user.uid, streak=(last - start).days + 1 if start and last else 0)
+    db.commit()
+    db.refresh(user)
+    return current_streak(user)
 
-        has_tasks = db.query(models.Task).filter(
-            models.Task.daily_task_id == daily.id
-        ).count() > 0
+def rebuild_user_streak(db: Session, user: models.User) -> int:
+    """
+    Full rebuild: find the user's most recent run of active days with a
+    single gaps-and-islands query and persist it.
+    """
+    days = _active_days_query(user.uid)
+    run = db.execute(
+        select(func.min(days.c.day), func.max(days.c.day))
+        .group_by(days.c.island)
+        .order_by(desc(func.max(days.c.day)))
+        .limit(1)
+    ).first()
+    start, last = run if run else (None, None)
+    return _store_streak_run(db, user, start, last)
 
-        if not has_tasks:
-            break
+def compute_and_update_user_streak(db: Session, user_id: str) -> int:
+    """
+    Recalculate consecutive-day streak ending today where a day counts
+    only if there is at least one Task for that day.
+    Persist the latest run to the user and return the streak.
+    """
+    user = db.query(models.User).filter(models.User.uid == user_id).first()
+    if not user:
+        return 0
+    return rebuild_user_streak(db, user)
 
-        streak += 1
-        current_date = current_date - timedelta(days=1)
+def update_streak_on_task_write(db: Session, daily_task_id: str, added: bool) -> int:
+    """
+    Maintain the stored streak run after a Task was created (added=True)
+    or deleted (added=False) under daily_task_id.
 
-    user = db.query(models.User).filter(models.User.uid == user_id).first()
-    if user:
-        user.day_streak = streak
-        user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(user)
+    Only a day switching between active/inactive can change the run; edges
+    of the run are moved in O(1). A full rebuild is needed only when the
+    write touches a day inside the run or may join it to an older run.
 
+    The user row is locked first, so concurrent writes of one user apply
+    one after another, each comparing the day with the run the previous
+    one stored.
+    """
+    daily = db.query(models.DailyTask).filter(models.DailyTask.id == daily_task_id).first()
+    if not daily:
+        return 0
+    user = db.query(models.User).filter(
+        models.User.uid == daily.user_id
+    ).populate_existing().with_for_update().first()
+    if not user:
+        return 0
+
+    remaining = db.query(func.count(models.Task.id)).filter(
+        models.Task.daily_task_id == daily_task_id
+    ).scalar()
+    streak = _move_streak_run(db, user, daily.date, remaining > 0, added)
+    db.commit()  # releases the lock when the run did not change
     return streak
+
+def _move_streak_run(db: Session, user: models.User, day: date, active: bool, added: bool) -> int:
+    """Streak after day became active (added) or inactive, given whether it has tasks now"""
+    start, last = user.streak_start_date, user.streak_last_date
+    one_day = timedelta(days=1)
+
+    if active != added:
+        # The day is still active (or no longer is) - nothing changed
+        return current_streak(user)
+    if start is None or last is None:
+        return rebuild_user_streak(db, user)
+
+    if added:
+        if start <= day <= last:
+            # Already counted, e.g. by a concurrent write to the same day
+            return current_streak(user)
+        if day == last + one_day:
+            return _store_streak_run(db, user, start, day)
+        if day > last + one_day:
+            return _store_streak_run(db, user, day, day)
+        if day < start - one_day:
+            return current_streak(user)
+    else:
+        if day < start or day > last:
+            return current_streak(user)
+        if start < last and day == last:
+            return _store_streak_run(db, user, start, last - one_day)
+        if start < last and day == start:
+            return _store_streak_run(db, user, start + one_day, last)
+
+    return rebuild_user_streak(db, user)
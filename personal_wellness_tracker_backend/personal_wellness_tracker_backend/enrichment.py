@@ -0,0 +1,190 @@
+"""
+Server-side nutrition enrichment of meals from the nutrition catalog.
+
+Meals with has_nutrition_data = false are read in keyset batches of
+(created_at, id), through the partial index meals_needs_nutrition_idx.
+Their food_name is matched against the catalog by a Matcher, and the
+matched meals of a batch are updated with one UPDATE ... FROM (VALUES ...).
+The update only fills macros the meal does not have, sets
+has_nutrition_data and adds the filled amounts to user_daily_rollups.
+Meals changed in between (another food_name, or data entered by the user)
+are left alone.
+
+Only confident matches fill in macros: the catalog search (on the lossy
+search_name) proposes candidates, and one is accepted if its name equals
+the meal's with tone marks kept, or is at least ENRICH_MIN_SIMILARITY
+similar both ways (a typo, not a prefix: "ข้าว" does not match
+"ข้าวผัด", nor "ขาว" "ข้าว"). Meals without a match get
+nutrition_checked_at and leave the scan; recheck_unmatched() puts back the
+ones checked before the catalog last changed.
+"""
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, false, func, or_, select, text, tuple_, update
+from sqlalchemy.orm import Session
+
+from . import models, nutrition, rollups, schemas
+from .core import config
+from .core.cache import TTLCache
+from .nutrition import normalize_name
+from .typeahead import similarity, trigrams
+
+settings = config.get_settings()
+
+# Matches per meal name; catalog edits are seen after MATCH_CACHE_TTL_SECONDS
+MATCH_CACHE_SIZE = 100_000
+MATCH_CACHE_TTL_SECONDS = 3600
+# Search results checked per name
+MATCH_CANDIDATES = 5
+_NO_MATCH = False
+
+_ENRICH_SQL = """
+WITH batch AS (
+    SELECT m.id, fl.user_id, fl.date, {filled}
+    FROM meals m
+    JOIN (VALUES {values}) AS v(id, food_name, {fields}) ON m.id = v.id
+    JOIN food_logs fl ON fl.id = m.food_log_id
+    WHERE m.has_nutrition_data = false AND m.food_name = v.food_name
+    FOR UPDATE OF m
+)
+UPDATE meals m SET {updates}, has_nutrition_data = true, updated_at = now()
+FROM batch
+WHERE m.id = batch.id
+RETURNING batch.user_id, batch.date, {returning}
+"""
+
+def match_name(name: Optional[str]) -> str:
+    """Name as compared for a match: NFC, casefolded, single spaces; tone marks kept"""
+    return " ".join(unicodedata.normalize("NFC", name or "").casefold().split())
+
+def name_similarity(a: str, b: str) -> float:
+    """Trigram word similarity of two match_name()s, the lower of both directions"""
+    return min(similarity(trigrams(a), b), similarity(trigrams(b), a))
+
+class Matcher:
+    """Catalog item matching a meal name, cached by match_name"""
+
+    def __init__(self, db: Session, min_similarity: float = settings.ENRICH_MIN_SIMILARITY, index=None):
+        self.db = db
+        self.min_similarity = min_similarity
+        # A loaded typeahead.TypeaheadIndex answers without a query per name
+        self.index = index
+        self.cache = TTLCache(MATCH_CACHE_SIZE, MATCH_CACHE_TTL_SECONDS)
+        self.hits = self.misses = 0
+
+    def match(self, food_name: Optional[str]) -> Optional[schemas.NutritionSearchResult]:
+        key = match_name(food_name)
+        if not key:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached or None
+        self.misses += 1
+        query = normalize_name(key)
+        results = (
+            self.index.search(query, limit=MATCH_CANDIDATES) if self.index
+            else nutrition.search(self.db, query, limit=MATCH_CANDIDATES)
+        )
+        best = self.accepted(key, results)
+        self.cache.set(key, best or _NO_MATCH)
+        return best
+
+    def accepted(self, key: str, results) -> Optional[schemas.NutritionSearchResult]:
+        """The exact match among results, else the most similar one above min_similarity"""
+        best, best_similarity = None, self.min_similarity
+        for item in results:
+            if all(getattr(item, field) is None for field in rollups.NUTRIENT_FIELDS):
+                continue
+            names = [match_name(name) for name in (item.food_name, item.food_name_en) if name]
+            if key in names:
+                return item
+            score = max(name_similarity(key, name) for name in names)
+            if score > best_similarity or (best is None and score == best_similarity):
+                best, best_similarity = item, score
+        return best
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+def pending_meals(db: Session, after: Optional[Tuple[datetime, str]], limit: int) -> List[tuple]:
+    """
+    (id, food_name, created_at) of meals without nutrition data and not
+    checked yet, in (created_at, id) order
+    """
+    meal = models.Meal
+    query = db.query(meal.id, meal.food_name, meal.created_at).filter(
+        meal.has_nutrition_data == false(), meal.nutrition_checked_at.is_(None)
+    )
+    if after:
+        query = query.filter(tuple_(meal.created_at, meal.id) > after)
+    return query.order_by(meal.created_at, meal.id).limit(limit).all()
+
+def recheck_unmatched(db: Session) -> int:
+    """
+    Put meals checked without a match before the catalog's last change back
+    in the scan (caller commits); returns how many
+    """
+    meal = models.Meal
+    changed = select(func.max(models.NutritionDatabase.last_updated)).scalar_subquery()
+    return db.execute(
+        update(meal)
+        .where(meal.has_nutrition_data == false(), meal.nutrition_checked_at < changed)
+        .values(nutrition_checked_at=None)
+    ).rowcount
+
+def enrich(db: Session, meals: List[tuple], matcher: Matcher) -> int:
+    """
+    Fill in the macros of the matched meals and mark the others as checked
+    (caller commits); returns how many were enriched
+    """
+    params, values, unmatched = {}, [], []
+    for n, (meal_id, food_name, _) in enumerate(meals):
+        item = matcher.match(food_name)
+        if item is None:
+            unmatched.append((meal_id, food_name))
+            continue
+        values.append(f"(:id{n}, :name{n}, {', '.join(f':{field}{n}' for field in rollups.NUTRIENT_FIELDS)})")
+        params.update({f"id{n}": meal_id, f"name{n}": food_name})
+        params.update({f"{field}{n}": getattr(item, field) for field in rollups.NUTRIENT_FIELDS})
+    if unmatched:
+        meal = models.Meal
+        # Only if unchanged since it was read: a renamed meal is matched again
+        named = [(meal_id, food_name) for meal_id, food_name in unmatched if food_name is not None]
+        unnamed = [meal_id for meal_id, food_name in unmatched if food_name is None]
+        db.execute(
+            update(meal)
+            .where(
+                or_(tuple_(meal.id, meal.food_name).in_(named), and_(meal.id.in_(unnamed), meal.food_name.is_(None))),
+                meal.has_nutrition_data == false(),
+            )
+            .values(nutrition_checked_at=func.now())
+        )
+    if not values:
+        return 0
+
+    fields = rollups.NUTRIENT_FIELDS
+    rows = db.execute(text(_ENRICH_SQL.format(
+        values=", ".join(values),
+        fields=", ".join(fields),
+        # The amounts this update adds: only where the meal has none
+        filled=", ".join(
+            f"CASE WHEN m.{field} IS NULL THEN v.{field}::double precision END AS {field}" for field in fields
+        ),
+        updates=", ".join(f"{field} = COALESCE(m.{field}, batch.{field})" for field in fields),
+        returning=", ".join(f"batch.{field}" for field in fields),
+    )), params).all()
+
+    deltas: Dict[Tuple[str, date], Dict[str, float]] = defaultdict(dict)
+    for user_id, day, *filled in rows:
+        delta = deltas[(user_id, day)]
+        for field, amount in zip(fields, filled):
+            if amount:
+                delta[field] = delta.get(field, 0) + amount
+    rollups.apply_meal_deltas(db, deltas)
+    return len(rows)
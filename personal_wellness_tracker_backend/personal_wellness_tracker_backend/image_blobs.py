@@ -0,0 +1,152 @@
+"""
+Reference counting and garbage collection of content-addressed meal images.
+
+Every stored upload is one image_blobs row keyed by its SHA-256 (see
+images.blob_url). refcount is the number of meals whose image_url points
+at one of its variants; crud keeps it up to date in the same transaction
+as each meal write. Rows start at 0 on upload and are only collected once
+they have been unreferenced for a grace period, so an uploaded image can
+still be attached to a meal created shortly after. Only uploads create
+rows: a meal pointing at a hash without a row (never uploaded, or
+collected) is rejected with UnknownImage.
+
+Collection deletes the row and then the stored variants while holding the
+row lock, and commits after. A meal write of the same hash waits for the
+lock and then finds no row (UnknownImage); an upload waits, re-creates the
+row and stores the variants again, as images.stored_size() reports them
+missing. The full JPEG is deleted first, so an interrupted collection
+never leaves a blob that looks complete with variants missing.
+
+Deleting users or food logs cascades to meals without going through crud,
+which can leave refcounts too high (never too low); recount() repairs them.
+"""
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import images, storage
+
+class UnknownImage(ValueError):
+    """A meal image_url points at a blob that was never uploaded or was collected"""
+
+# Insert or touch the row of a fresh upload; touching restarts the grace period
+_REGISTER_SQL = """
+INSERT INTO image_blobs (hash, size, refcount, created_at, updated_at)
+VALUES (:hash, :size, 0, now(), now())
+ON CONFLICT (hash) DO UPDATE SET updated_at = now()
+"""
+
+# Only existing rows: hashes not returned are unknown
+_ADD_REFS_SQL = """
+UPDATE image_blobs b
+SET refcount = b.refcount + d.count, updated_at = now()
+FROM (VALUES {values}) AS d(hash, count)
+WHERE b.hash = d.hash
+RETURNING b.hash
+"""
+
+_DROP_REFS_SQL = """
+UPDATE image_blobs b
+SET refcount = GREATEST(b.refcount - d.count, 0), updated_at = now()
+FROM (VALUES {values}) AS d(hash, count)
+WHERE b.hash = d.hash
+"""
+
+# Rows are locked until the caller commits, after the objects are deleted
+_COLLECT_SQL = """
+DELETE FROM image_blobs
+WHERE hash IN (
+    SELECT hash FROM image_blobs
+    WHERE refcount = 0 AND updated_at < now() - CAST(:grace_hours AS double precision) * interval '1 hour'
+    ORDER BY hash
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING hash
+"""
+
+_RECOUNT_SQL = """
+WITH refs AS (
+    SELECT substring(image_url from '/([0-9a-f]{{64}})\\.[a-z]+\\.[a-z]+$') AS hash, count(*) AS refs
+    FROM meals
+    WHERE image_url LIKE '/static/meals/%'
+    GROUP BY 1
+)
+UPDATE image_blobs b
+SET refcount = COALESCE(refs.refs, 0), updated_at = now()
+FROM image_blobs b2
+LEFT JOIN refs ON refs.hash = b2.hash
+WHERE b.hash = b2.hash AND b.refcount <> COALESCE(refs.refs, 0) {where}
+"""
+
+def register(db: Session, digest: str, size: int):
+    """Record an uploaded blob (refcount 0 until a meal points at it)"""
+    db.execute(text(_REGISTER_SQL), {"hash": digest, "size": size})
+
+def _counts(image_urls: Iterable[Optional[str]]) -> Counter:
+    return Counter(digest for digest in map(images.blob_hash, image_urls) if digest)
+
+def unknown_urls(db: Session, image_urls: Iterable[Optional[str]]) -> set:
+    """The content-addressed image_urls whose blob has no row"""
+    image_urls = set(image_urls)
+    digests = _counts(image_urls)
+    if not digests:
+        return set()
+    known = set(db.execute(
+        text("SELECT hash FROM image_blobs WHERE hash = ANY(CAST(:hashes AS varchar[]))"),
+        {"hashes": sorted(digests)}
+    ).scalars())
+    return {url for url in image_urls if images.blob_hash(url) in digests.keys() - known}
+
+def adjust_refs(db: Session, added: Iterable[Optional[str]] = (), removed: Iterable[Optional[str]] = ()):
+    """
+    Count references from meal image_urls that were added and removed in
+    this transaction; URLs that are not content-addressed are ignored.
+    Hashes are written in sorted order so concurrent writers lock rows in
+    the same order. Raises UnknownImage when an added hash has no row; the
+    caller rolls back.
+    """
+    delta = _counts(added)
+    delta.subtract(_counts(removed))
+    increments = sorted((digest, n) for digest, n in delta.items() if n > 0)
+    decrements = sorted((digest, -n) for digest, n in delta.items() if n < 0)
+
+    for sql, pairs, row in (
+        (_ADD_REFS_SQL, increments, "(CAST(:hash{i} AS varchar), CAST(:count{i} AS integer))"),
+        (_DROP_REFS_SQL, decrements, "(CAST(:hash{i} AS varchar), CAST(:count{i} AS integer))"),
+    ):
+        if not pairs:
+            continue
+        params, values = {}, []
+        for i, (digest, count) in enumerate(pairs):
+            values.append(row.format(i=i))
+            params.update({f"hash{i}": digest, f"count{i}": count})
+        rows = db.execute(text(sql.format(values=", ".join(values))), params)
+        if sql is _ADD_REFS_SQL:
+            missing = {digest for digest, _ in pairs} - set(rows.scalars())
+            if missing:
+                raise UnknownImage(", ".join(sorted(missing)))
+
+def recount(db: Session, digests: Optional[List[str]] = None) -> int:
+    """Reset refcounts from meals (all blobs, or only digests); returns rows fixed"""
+    params, where = {}, ""
+    if digests is not None:
+        params["hashes"] = list(digests)
+        where = "AND b.hash = ANY(CAST(:hashes AS varchar[]))"
+    return db.execute(text(_RECOUNT_SQL.format(where=where)), params).rowcount
+
+def collect_garbage(db: Session, grace_hours: float, limit: int) -> List[str]:
+    """
+    Delete up to `limit` blobs unreferenced for grace_hours, rows and
+    stored variants; the caller commits. Returns the collected hashes.
+    """
+    collected = [digest for (digest,) in db.execute(
+        text(_COLLECT_SQL), {"grace_hours": grace_hours, "limit": limit}
+    )]
+    backend = storage.get_storage()
+    # The full JPEG (last of blob_keys) first: it marks a blob as complete
+    backend.delete([images.blob_key(digest) for digest in collected])
+    backend.delete([key for digest in collected for key in images.blob_keys(digest)[:-1]])
+    return collected
@@ -0,0 +1,71 @@
+"""
+Serving of uploaded files under /static with cache headers.
+
+Content-addressed images (see images.blob_url) always show the same
+picture, so they are cached for a year. Their bytes are not guaranteed to
+stay identical (a blob collected and uploaded again is transcoded again),
+so they are not marked `immutable` and keep the mtime/size ETag of
+StaticFiles, which changes when the file is rewritten; If-Range and
+revalidation never mix two versions. Other files must be revalidated
+(`no-cache`), which is answered with 304.
+
+Byte ranges and If-Range are handled by starlette's FileResponse. File
+bodies are sent without passing through Python when possible:
+  - ASGI servers offering the `http.response.pathsend` extension send the
+    file themselves (FileResponse uses it automatically);
+  - with STATIC_ACCEL_REDIRECT set, the body is left to the reverse proxy
+    (nginx X-Accel-Redirect to an internal location over the same
+    directory), which serves it and its ranges with sendfile(2).
+Otherwise the file is streamed in STATIC_CHUNK_SIZE reads.
+"""
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from . import images, storage
+from .core import config
+
+settings = config.get_settings()
+
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+class ImageFileResponse(FileResponse):
+    chunk_size = settings.STATIC_CHUNK_SIZE
+
+class ImageFiles(StaticFiles):
+    """StaticFiles with long-lived caching of content-addressed images"""
+
+    def __init__(self, *, accel_redirect: Optional[str] = settings.STATIC_ACCEL_REDIRECT, **kwargs):
+        super().__init__(**kwargs)
+        self.accel_redirect = accel_redirect.rstrip("/") if accel_redirect else None
+
+    def lookup_path(self, path: str):
+        # Scratch files and uploads in progress (images.SCRATCH_DIR, ".upload-*") are not served
+        if any(part.startswith(".") for part in path.split(os.sep)):
+            return "", None
+        return super().lookup_path(path)
+
+    def cache_headers(self, relative_path: str) -> dict:
+        if images.blob_hash(f"/static/{relative_path}"):
+            return {"cache-control": storage.LONG_CACHE_CONTROL}
+        return {"cache-control": REVALIDATE_CACHE_CONTROL}
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        relative_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        response = ImageFileResponse(
+            full_path, status_code=status_code, headers=self.cache_headers(relative_path), stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if self.accel_redirect and status_code == 200:
+            headers = {
+                name: value for name, value in response.headers.items()
+                if name in ("etag", "cache-control", "last-modified", "content-type")
+            }
+            headers["x-accel-redirect"] = f"{self.accel_redirect}/{relative_path}"
+            return Response(status_code=200, headers=headers)
+        return response
@@ -0,0 +1,158 @@
+"""
+Meal image transcoding with Pillow in a dedicated process pool.
+
+Each image is decoded once (JPEGs at a reduced DCT scale when that is
+enough for the widest variant), rotated according to its EXIF orientation
+and saved without any metadata as WebP and JPEG at every width of
+images.IMAGE_VARIANTS. Variants are never upscaled. Images of more than
+IMAGE_MAX_PIXELS pixels are rejected before they are decoded.
+
+The workers also move image bytes to and from the storage backend, so
+with S3 storage the bytes of an image never pass through an API worker.
+"""
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from . import images, storage
+from .core import config
+
+settings = config.get_settings()
+
+JPEG_QUALITY = 82
+CONTENT_TYPES = {"jpg": "image/jpeg", "webp": "image/webp"}
+WEBP_QUALITY = 80
+
+# Pillow warns above this and only fails at twice it; the warning is raised as an error below
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+class ImageTooLarge(ValueError):
+    pass
+
+def _save(image: Image.Image, dest: Path, fmt: str):
+    """Write one variant next to dest and rename it into place"""
+    # Per-process name: concurrent uploads of the same bytes write the same variants
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+    if fmt == "jpg":
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A") if image.mode == "RGBA" else None)
+            image = background
+        image.save(tmp, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(tmp, format="WEBP", quality=WEBP_QUALITY, method=4)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, dest)
+
+def transcode(src: str, dest_dir: str, stem: str) -> List[str]:
+    """
+    Create all variants of the image at src in dest_dir; returns the file
+    names written. Runs in the worker processes; raises ImageTooLarge above
+    IMAGE_MAX_PIXELS, OSError or ValueError for files that are not images.
+    """
+    widest = max(images.IMAGE_VARIANTS.values())
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            opened = Image.open(src)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageTooLarge(str(e))
+    with opened:
+        scale = widest / min(opened.size)
+        if scale < 1:
+            opened.draft("RGB", (math.ceil(opened.width * scale), math.ceil(opened.height * scale)))
+        image = ImageOps.exif_transpose(opened)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    Path(dest_dir).mkdir(parents=True, exist_ok=True)
+    written = []
+    # Largest first, each variant resized from the previous one
+    for variant, width in sorted(images.IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for fmt in images.VARIANT_FORMATS:
+            name = images.variant_filename(stem, variant, fmt)
+            _save(image, Path(dest_dir) / name, fmt)
+            written.append(name)
+    return written
+
+def store_variants(src: str, digest: str) -> int:
+    """
+    Transcode src into a scratch directory and store the variants as the
+    blob of digest; returns the size of the stored full JPEG (the last key)
+    """
+    images.SCRATCH_DIR.mkdir(parents=True, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=images.SCRATCH_DIR, prefix=f"{digest[:16]}-")
+    try:
+        transcode(src, scratch, digest)
+        backend = storage.get_storage()
+        for key in images.blob_keys(digest):
+            name = key.rsplit("/", 1)[1]
+            size = (Path(scratch) / name).stat().st_size
+            backend.put_file(
+                Path(scratch) / name, key,
+                content_type=CONTENT_TYPES[name.rsplit(".", 1)[1]], cache_control=storage.LONG_CACHE_CONTROL,
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return size
+
+def fetch_object(key: str) -> Tuple[str, str, int, Optional[str]]:
+    """
+    Download a directly uploaded object to a scratch file; returns its
+    path, SHA-256, size and content type
+    """
+    images.SCRATCH_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=images.SCRATCH_DIR, prefix=".direct-", suffix=".part")
+    os.close(fd)
+    try:
+        content_type = storage.get_storage().download(key, Path(path))
+        digest, size = hashlib.sha256(), 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size, content_type
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _image_pool
+
+async def store_image(src: Path, digest: str) -> int:
+    """store_variants() in the image pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), store_variants, str(src), digest)
+
+async def fetch_upload(key: str) -> Tuple[Path, str, int, Optional[str]]:
+    """fetch_object() in the image pool"""
+    loop = asyncio.get_running_loop()
+    path, digest, size, content_type = await loop.run_in_executor(get_image_pool(), fetch_object, key)
+    return Path(path), digest, size, content_type
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
@@ -0,0 +1,262 @@
+"""
+Streaming upload of meal images and the naming of their variants.
+
+The multipart request body is parsed while it arrives, so an upload is
+rejected as soon as it passes the size cap instead of after the whole body
+was buffered. File bytes are written to a temporary file next to their
+final location with the blocking calls in the threadpool, then renamed
+into place atomically; readers never see a partial file.
+
+Uploads are hashed (SHA-256) while they stream and stored by content:
+the variants of an upload are stored under meals/ab/cd/{sha256}.{variant}.{format}
+in the storage backend, so the same photo uploaded twice is stored once
+(see image_blobs).
+"""
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+from . import storage
+from .core import config
+
+settings = config.get_settings()
+
+UPLOAD_ROOT = Path(settings.UPLOAD_DIR)
+MEALS_DIR = UPLOAD_ROOT / "meals"
+# Uploads in progress and transcoder output, on the same filesystem as
+# UPLOAD_ROOT so the local backend stores files with a rename
+SCRATCH_DIR = UPLOAD_ROOT / ".scratch"
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png", "image/jpg", "image/webp")
+# Storage key prefix of direct (presigned) uploads, per user; removed once transcoded
+DIRECT_UPLOAD_PREFIX = "incoming/"
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Every stored meal image is a set of variants (see image_processing):
+# {stem}.{variant}.{format}, with variant widths in pixels
+IMAGE_VARIANTS = {"thumb": 160, "list": 480, "full": 1280}
+VARIANT_FORMATS = ("webp", "jpg")
+# Content-addressed variant URL: /static/meals/ab/cd/{sha256}.{variant}.{format}
+_BLOB_URL = re.compile(r"^/static/meals/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.[a-z]+\.[a-z]+$")
+
+class UploadError(ValueError):
+    pass
+
+class UploadTooLarge(UploadError):
+    pass
+
+class UnsupportedFileType(UploadError):
+    pass
+
+@dataclass
+class ReceivedFile:
+    path: Path
+    size: int
+    filename: Optional[str]
+    content_type: Optional[str]
+    sha256: str
+
+class _FilePartCollector:
+    """python-multipart callbacks collecting the bytes of one file field"""
+
+    def __init__(self, field_name: str, max_bytes: int, allowed_types: Iterable[str]):
+        self.field_name = field_name.encode()
+        self.max_bytes = max_bytes
+        self.allowed_types = tuple(allowed_types)
+        self.pending = []
+        self.pending_size = 0
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.found = False
+        self.filename = None
+        self.content_type = None
+        self._in_file = False
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and options.get(b"name") == self.field_name
+        if self._in_file:
+            self.found = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace") or None
+            self.content_type = self._headers.get(b"content-type", b"").decode("latin-1") or None
+            if self.content_type not in self.allowed_types:
+                raise UnsupportedFileType(self.content_type)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                raise UploadTooLarge(self.max_bytes)
+            self.pending.append(data[start:end])
+            self.digest.update(self.pending[-1])
+            self.pending_size += end - start
+
+    def on_part_end(self):
+        self._in_file = False
+
+    def take_pending(self) -> bytes:
+        chunk = b"".join(self.pending)
+        self.pending, self.pending_size = [], 0
+        return chunk
+
+def _unlink_quietly(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _write_and_sync(out, chunk: bytes, sync: bool):
+    if chunk:
+        out.write(chunk)
+    if sync:
+        out.flush()
+        os.fsync(out.fileno())
+
+async def receive_file(request: Request, dest_dir: Path, field_name: str = "file",
+                       max_bytes: int = settings.MAX_UPLOAD_BYTES,
+                       allowed_types: Iterable[str] = ALLOWED_IMAGE_TYPES) -> ReceivedFile:
+    """
+    Stream the `field_name` file of a multipart request into a temporary
+    file in dest_dir. Raises UploadTooLarge / UnsupportedFileType /
+    UploadError; the temporary file is removed on any failure.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadTooLarge(max_bytes)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data body")
+
+    await run_in_threadpool(dest_dir.mkdir, parents=True, exist_ok=True)
+    fd, tmp_name = await run_in_threadpool(tempfile.mkstemp, dir=dest_dir, prefix=".upload-", suffix=".part")
+    tmp_path = Path(tmp_name)
+    collector = _FilePartCollector(field_name, max_bytes, allowed_types)
+    parser = multipart.MultipartParser(boundary, collector.callbacks())
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if collector.pending_size >= settings.UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(_write_and_sync, out, collector.take_pending(), False)
+            parser.finalize()
+            await run_in_threadpool(_write_and_sync, out, collector.take_pending(), True)
+        if not collector.found:
+            raise UploadError(f"Missing file field '{field_name}'")
+    except BaseException:
+        await run_in_threadpool(_unlink_quietly, tmp_path)
+        raise
+    return ReceivedFile(
+        tmp_path, collector.size, collector.filename, collector.content_type, collector.digest.hexdigest()
+    )
+
+async def discard(received: ReceivedFile):
+    await run_in_threadpool(_unlink_quietly, received.path)
+
+def variant_filename(stem: str, variant: str, fmt: str) -> str:
+    return f"{stem}.{variant}.{fmt}"
+
+def variant_urls(image_url: Optional[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    {variant: {format: client url}} for an image_url that points at a
+    stored variant; None for other URLs (e.g. images uploaded before variants)
+    """
+    if not image_url:
+        return None
+    base, _, name = image_url.rpartition("/")
+    parts = name.split(".")
+    if len(parts) < 3 or parts[-2] not in IMAGE_VARIANTS or parts[-1] not in VARIANT_FORMATS:
+        return None
+    stem = ".".join(parts[:-2])
+    return {
+        variant: {
+            fmt: storage.resolve_url(f"{base}/{variant_filename(stem, variant, fmt)}") for fmt in VARIANT_FORMATS
+        }
+        for variant in IMAGE_VARIANTS
+    }
+
+def direct_upload_key(uid: str) -> str:
+    """A new key for one direct upload: incoming/<uid>/<uuid>"""
+    return f"{DIRECT_UPLOAD_PREFIX}{uid}/{uuid.uuid4()}"
+
+def is_direct_upload_key(key: str, uid: str) -> bool:
+    """key is exactly a direct_upload_key of uid (no other prefix, path or suffix)"""
+    prefix = f"{DIRECT_UPLOAD_PREFIX}{uid}/"
+    name = key[len(prefix):]
+    if not key.startswith(prefix):
+        return False
+    try:
+        return str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
+
+def blob_key(digest: str, variant: str = "full", fmt: str = "jpg") -> str:
+    """Storage key of one variant, sharded by the first two bytes of the hash"""
+    return f"meals/{digest[:2]}/{digest[2:4]}/{variant_filename(digest, variant, fmt)}"
+
+def blob_keys(digest: str) -> List[str]:
+    """All variant keys of digest; the full JPEG (the reference image_url) is stored last"""
+    keys = [blob_key(digest, variant, fmt) for variant in IMAGE_VARIANTS for fmt in VARIANT_FORMATS]
+    keys.remove(blob_key(digest))
+    return keys + [blob_key(digest)]
+
+def blob_url(digest: str, variant: str = "full", fmt: str = "jpg") -> str:
+    """Stored reference of a variant (resolved for clients by storage.resolve_url)"""
+    return storage.STATIC_PREFIX + blob_key(digest, variant, fmt)
+
+def blob_hash(image_url: Optional[str]) -> Optional[str]:
+    """Content hash of a content-addressed image_url; None for other URLs"""
+    match = _BLOB_URL.match(image_url or "")
+    if not match or match.group(3)[:4] != match.group(1) + match.group(2):
+        return None
+    return match.group(3)
+
+async def stored_size(digest: str) -> Optional[int]:
+    """
+    Size of the stored full JPEG of digest, None until all its variants are
+    stored (an earlier upload of the same bytes); the full JPEG is written
+    last, so checking it is enough
+    """
+    return await run_in_threadpool(storage.get_storage().size, blob_key(digest))
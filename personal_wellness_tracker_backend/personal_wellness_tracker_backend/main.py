@@ -1,17 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date, datetime
-import uuid
-import os
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine, get_db
+from . import crud, models, schemas, rollups, analytics, achievements, images, image_blobs, image_processing, image_files, storage, nutrition, nutrition_import, serializers, typeahead
+from .database import engine, SessionLocal, DBSession, get_session, run_db, rollback, get_pool_metrics
 from .api import auth
-from .core import deps
+from .core import config, deps, security
+
+settings = config.get_settings()
 
 # Create database tables (optional - only if database is available)
 # Note: In Docker setup, tables are created via init.sql
@@ -87,23 +88,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Maximum number of items accepted by the batch endpoints
+MAX_BATCH_SIZE = 500
+
 # Create uploads directory if it doesn't exist
-upload_dir = Path("uploads")
-upload_dir.mkdir(exist_ok=True)
-(upload_dir / "meals").mkdir(exist_ok=True)
+images.MEALS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Mount static files for serving uploaded images
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+app.mount("/static", image_files.ImageFiles(directory=images.UPLOAD_ROOT), name="static")
+
+@app.on_event("startup")
+def register_event_handlers():
+    achievements.register_handlers()
+
+@app.on_event("startup")
+async def load_typeahead_index():
+    await typeahead.start()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    typeahead.stop()
+    security.shutdown_hash_pool()
+    image_processing.shutdown_image_pool()
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 
 @app.get("/", tags=["System"])
-def read_root():
+async def read_root():
     return {"message": "Personal Wellness Tracker API", "version": "1.0.0"}
 
 @app.get("/health", tags=["System"])
-def health_check():
+async def health_check():
     """Health check endpoint that doesn't require database"""
     return {
         "status": "healthy",
@@ -115,8 +131,18 @@ def health_check():
         }
     }
 
+@app.get("/health/db-pool", tags=["System"], dependencies=[Depends(deps.require_internal)])
+def db_pool_metrics():
+    """Connection pool usage and checkout wait times of this worker"""
+    return get_pool_metrics()
+
+@app.get("/health/typeahead", tags=["System"], dependencies=[Depends(deps.require_internal)])
+def typeahead_metrics():
+    """Items and memory of this worker's nutrition typeahead index"""
+    return typeahead.index.memory_report()
+
 @app.get("/test", tags=["System"])
-def test_endpoint():
+async def test_endpoint():
     """Test endpoint for API functionality"""
     return {
         "message": "Test endpoint working",
@@ -129,275 +155,404 @@ def test_endpoint():
 
 # User endpoints
 @app.post("/users/", response_model=schemas.User, tags=["Users"])
-def create_user(
+async def create_user(
     user: schemas.UserCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await run_db(db, crud.get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await run_db(db, crud.create_user, user=user)
 
 @app.get("/users/{user_id}", response_model=schemas.User, tags=["Users"])
-def read_user(
+async def read_user(
     user_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_user = crud.get_user(db, user_id=user_id)
+    db_user = await run_db(db, crud.get_user, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @app.get("/users/", response_model=List[schemas.User], tags=["Users"])
-def read_users(
+async def read_users(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    users = crud.get_users(db, skip=skip, limit=limit)
+    users = await run_db(db, crud.get_users, skip=skip, limit=limit)
     return users
 
 @app.put("/users/{user_id}", response_model=schemas.User, tags=["Users"])
-def update_user(
+async def update_user(
     user_id: str, 
     user_update: schemas.UserUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     # อัปเดตข้อมูลผู้ใช้
-    db_user = crud.update_user(db, user_id=user_id, user_update=user_update)
+    db_user = await run_db(db, crud.update_user, user_id=user_id, user_update=user_update)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     return db_user
 
 @app.delete("/users/{user_id}", tags=["Users"])
-def delete_user(
+async def delete_user(
     user_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_user = crud.delete_user(db, user_id=user_id)
+    db_user = await run_db(db, crud.delete_user, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
 # User Goals endpoints
 @app.post("/users/{user_id}/goals/", response_model=schemas.UserGoal, tags=["User Goals"])
-def create_user_goal(
+async def create_user_goal(
     user_id: str, 
     goal: schemas.UserGoalBase, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     print(f"DEBUG ENDPOINT: Received user_id: {user_id}")
     print(f"DEBUG ENDPOINT: Received goal data: {goal.dict()}")
     goal_data = schemas.UserGoalCreate(**goal.dict(), user_id=user_id)
     print(f"DEBUG ENDPOINT: Created goal_data: {goal_data.dict()}")
-    result = crud.create_user_goal(db=db, goal=goal_data)
+    result = await run_db(db, crud.create_user_goal, goal=goal_data)
     print(f"DEBUG ENDPOINT: Returning result: {result}")
     return result
 
 @app.get("/users/{user_id}/goals/", response_model=List[schemas.UserGoal], tags=["User Goals"])
-def read_user_goals(
+async def read_user_goals(
     user_id: str, 
     active_only: bool = True, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.get_user_goals(db, user_id=user_id, active_only=active_only)
+    return await run_db(db, crud.get_user_goals, user_id=user_id, active_only=active_only)
 
 @app.put("/goals/{goal_id}", response_model=schemas.UserGoal, tags=["User Goals"])
-def update_user_goal(
+async def update_user_goal(
     goal_id: str, 
     goal_update: schemas.UserGoalUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_goal = crud.update_user_goal(db, goal_id=goal_id, goal_update=goal_update)
+    db_goal = await run_db(db, crud.update_user_goal, goal_id=goal_id, goal_update=goal_update)
     if db_goal is None:
         raise HTTPException(status_code=404, detail="Goal not found")
     return db_goal
 
 # Food Log endpoints
 @app.post("/users/{user_id}/food-logs/", response_model=schemas.FoodLog, tags=["Food Logs"])
-def create_food_log(
+async def create_food_log(
     user_id: str, 
     food_log: schemas.FoodLogBase, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     # Check if food log already exists for this date
-    existing_log = crud.get_food_log(db, user_id=user_id, date=food_log.date)
+    existing_log = await run_db(db, crud.get_food_log, user_id=user_id, date=food_log.date)
     if existing_log:
         return existing_log
     
     food_log_data = schemas.FoodLogCreate(**food_log.dict(), user_id=user_id)
-    return crud.create_food_log(db=db, food_log=food_log_data)
+    return await run_db(db, crud.create_food_log, food_log=food_log_data)
 
 @app.get("/users/{user_id}/food-logs/", response_model=List[schemas.FoodLog], tags=["Food Logs"])
-def read_food_logs(
+async def read_food_logs(
     user_id: str, 
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.get_food_logs(db, user_id=user_id, skip=skip, limit=limit)
+    rows = await run_db(db, crud.get_food_log_rows, user_id=user_id, skip=skip, limit=limit)
+    return serializers.json_list(serializers.food_log, rows)
+
+async def _range_page(db: DBSession, fn, user_id: str, date_from: date, date_to: date, cursor: Optional[str], limit: int):
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        return await run_db(db, fn, user_id=user_id, date_from=date_from, date_to=date_to, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/users/{user_id}/food-logs/range", response_model=schemas.FoodLogPage, tags=["Food Logs"])
+async def read_food_logs_range(
+    user_id: str,
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """Food logs between from/to (inclusive), paged with next_cursor"""
+    return await _range_page(db, crud.get_food_logs_range, user_id, date_from, date_to, cursor, limit)
 
 @app.get("/users/{user_id}/food-logs/{log_date}", response_model=schemas.FoodLog, tags=["Food Logs"])
-def read_food_log_by_date(
+async def read_food_log_by_date(
     user_id: str, 
     log_date: date, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_food_log = crud.get_food_log(db, user_id=user_id, date=log_date)
+    db_food_log = await run_db(db, crud.get_food_log, user_id=user_id, date=log_date)
     if db_food_log is None:
         raise HTTPException(status_code=404, detail="Food log not found")
     return db_food_log
 
-@app.put("/food-logs/{food_log_id}/stats", response_model=schemas.FoodLog, tags=["Food Logs"])
-def update_food_log_stats(
+@app.put("/food-logs/{food_log_id}/stats", response_model=schemas.FoodLog, tags=["Food Logs"], deprecated=True)
+async def update_food_log_stats(
     food_log_id: str,
-    stats_data: dict,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
-):
-    """Update food log statistics (total calories and meal count)"""
-    print(f"DEBUG: Updating food log {food_log_id} with stats: {stats_data}")
-    
-    # ตรวจสอบว่า food log มีอยู่จริง
-    db_food_log = db.query(models.FoodLog).filter(models.FoodLog.id == food_log_id).first()
+    stats_data: Optional[dict] = None,
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """
+    Deprecated: meal_count/total_calories are maintained by the meal
+    endpoints. Client-sent values are ignored and the stats are rebuilt
+    from the food log's meals.
+    """
+    db_food_log = await run_db(db, crud.recalculate_food_log_stats, food_log_id=food_log_id)
     if not db_food_log:
         raise HTTPException(status_code=404, detail="Food log not found")
-    
-    # อัปเดต stats
-    if 'total_calories' in stats_data:
-        db_food_log.total_calories = stats_data['total_calories']
-    if 'meal_count' in stats_data:
-        db_food_log.meal_count = stats_data['meal_count']
-    
-    # บันทึกการเปลี่ยนแปลง
-    db.commit()
-    db.refresh(db_food_log)
-    
-    print(f"DEBUG: Successfully updated food log stats. Total calories: {db_food_log.total_calories}, Meal count: {db_food_log.meal_count}")
-    
     return db_food_log
 
+async def _write_meals(db: DBSession, fn, **kwargs):
+    """Run a meal write; an image_url of an image that is not stored is a 400"""
+    try:
+        return await run_db(db, fn, **kwargs)
+    except image_blobs.UnknownImage:
+        await rollback(db)
+        raise HTTPException(status_code=400, detail="Image not found; upload it again")
+
+def _write_result(schema, db_obj, db: DBSession):
+    """Response of a write endpoint, with the achievements the write unlocked"""
+    result = schema.model_validate(db_obj)
+    result.newly_achieved = achievements.pop_newly_achieved(db)
+    return result
+
 # Meal endpoints
-@app.post("/meals/", response_model=schemas.Meal, tags=["Meals"])
-def create_meal(
+@app.post("/meals/", response_model=schemas.MealWriteResult, tags=["Meals"])
+async def create_meal(
     meal: schemas.MealCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    db_meal = await _write_meals(db, crud.create_meal, meal=meal)
+    return _write_result(schemas.MealWriteResult, db_meal, db)
+
+def _batch_response(results: List[schemas.BatchItemResult], db: DBSession) -> schemas.BatchResponse:
+    created = sum(1 for result in results if result.success)
+    return schemas.BatchResponse(
+        success=created == len(results),
+        created=created,
+        failed=len(results) - created,
+        results=results,
+        newly_achieved=achievements.pop_newly_achieved(db)
+    )
+
+@app.post("/meals/batch", response_model=schemas.BatchResponse, tags=["Meals"])
+async def create_meals_batch(
+    meals: List[schemas.MealCreate],
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.create_meal(db=db, meal=meal)
+    """Create many meals at once (offline sync); one transaction, per-item results"""
+    if len(meals) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size must be at most {MAX_BATCH_SIZE}")
+    results = await _write_meals(db, crud.create_meals_bulk, user_id=current_user.uid, meals=meals)
+    return _batch_response(results, db)
 
 @app.get("/users/{user_id}/meals/", response_model=List[schemas.Meal], tags=["Meals"])
-def read_user_meals(
+async def read_user_meals(
     user_id: str, 
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    rows = await run_db(db, crud.get_meal_rows_by_user, user_id=user_id, skip=skip, limit=limit)
+    return serializers.json_list(serializers.meal, rows)
+
+@app.get("/users/{user_id}/meals/range", response_model=schemas.MealPage, tags=["Meals"])
+async def read_meals_range(
+    user_id: str,
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.get_meals_by_user(db, user_id=user_id, skip=skip, limit=limit)
+    """Meals of the food logs between from/to (inclusive), paged with next_cursor"""
+    return await _range_page(db, crud.get_meals_range, user_id, date_from, date_to, cursor, limit)
 
 @app.get("/food-logs/{food_log_id}/meals/", response_model=List[schemas.Meal], tags=["Meals"])
-def read_meals_by_food_log(
+async def read_meals_by_food_log(
     food_log_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.get_meals_by_food_log(db, food_log_id=food_log_id)
+    return await run_db(db, crud.get_meals_by_food_log, food_log_id=food_log_id)
 
 @app.put("/meals/{meal_id}", response_model=schemas.Meal, tags=["Meals"])
-def update_meal(
+async def update_meal(
     meal_id: str, 
     meal_update: schemas.MealUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_meal = crud.update_meal(db, meal_id=meal_id, meal_update=meal_update)
+    db_meal = await _write_meals(db, crud.update_meal, meal_id=meal_id, meal_update=meal_update)
     if db_meal is None:
         raise HTTPException(status_code=404, detail="Meal not found")
     return db_meal
 
 @app.delete("/meals/{meal_id}", tags=["Meals"])
-def delete_meal(
+async def delete_meal(
     meal_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_meal = crud.delete_meal(db, meal_id=meal_id)
+    db_meal = await run_db(db, crud.delete_meal, meal_id=meal_id)
     if db_meal is None:
         raise HTTPException(status_code=404, detail="Meal not found")
     return {"message": "Meal deleted successfully"}
 
 # Image upload endpoint for meals
-@app.post("/meals/upload-image/", response_model=schemas.ImageUploadResponse, tags=["Meals"])
+@app.post(
+    "/meals/upload-image/",
+    response_model=schemas.ImageUploadResponse,
+    tags=["Meals"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"],
+            }}},
+        }
+    },
+)
 async def upload_meal_image(
-    file: UploadFile = File(...),
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
-    """Upload รูปภาพอาหาร"""
-    
-    # ตรวจสอบประเภทไฟล์
-    allowed_types = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
-    if file.content_type not in allowed_types:
+    """Upload รูปภาพอาหาร (ไฟล์ถูกสตรีมลงดิสก์ทีละส่วน ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ)"""
+    try:
+        received = await images.receive_file(request, images.SCRATCH_DIR)
+    except images.UploadTooLarge:
         raise HTTPException(
             status_code=400, 
-            detail="Only JPEG, PNG, JPG, and WebP images are allowed"
+            detail=f"File size must be less than {settings.MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
         )
-    
-    # ตรวจสอบขนาดไฟล์ (จำกัดที่ 5MB)
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size > 5 * 1024 * 1024:  # 5MB
+    except images.UnsupportedFileType:
         raise HTTPException(
             status_code=400, 
-            detail="File size must be less than 5MB"
+            detail="Only JPEG, PNG, JPG, and WebP images are allowed"
         )
+    except images.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # สร้างชื่อไฟล์ใหม่
-    file_extension = file.filename.split(".")[-1] if file.filename else "jpg"
-    unique_filename = f"{current_user.uid}_{uuid.uuid4()}.{file_extension}"
-    
-    # สร้างโฟลเดอร์ถ้ายังไม่มี
-    upload_dir = Path("uploads/meals")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # บันทึกไฟล์
-    file_path = upload_dir / unique_filename
-    with open(file_path, "wb") as buffer:
-        buffer.write(content)
+    try:
+        return await _store_image(db, received.path, received.sha256, received.size)
+    finally:
+        await images.discard(received)
+
+async def _store_image(db: DBSession, path, digest: str, size: int):
+    """Store the variants of the uploaded file at path (kept for the caller to remove)"""
+    # เก็บตาม hash ของเนื้อไฟล์: อัปโหลดรูปเดิมซ้ำ (เช่น retry) ไม่สร้างไฟล์ใหม่
+    # register ก่อนตรวจไฟล์ เพื่อไม่ให้ gc-images ลบ blob นี้ระหว่างทาง
+    try:
+        await run_db(db, crud.register_image_blob, digest=digest, size=size)
+        stored_size = await images.stored_size(digest)
+        if stored_size is None:
+            # แปลงเป็น variants (ลบ EXIF) และเก็บลง storage ใน process pool; ไฟล์ต้นฉบับไม่ถูกเก็บ
+            stored_size = await image_processing.store_image(path, digest)
+    except image_processing.ImageTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image must be at most {settings.IMAGE_MAX_PIXELS // 1_000_000} megapixels"
+        )
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {e}")
     
-    # สร้าง URL สำหรับเข้าถึงรูปภาพ
-    image_url = f"/static/meals/{unique_filename}"
+    # สร้าง URL สำหรับเข้าถึงรูปภาพ (variant full.jpg เป็นค่าเริ่มต้น)
+    image_url = images.blob_url(digest)
     
+    # ขนาดและชนิดของไฟล์ที่เก็บจริง (full.jpg) ไม่ใช่ของไฟล์ที่อัปโหลด
     return schemas.ImageUploadResponse(
-        image_url=image_url,
-        file_size=file_size,
-        file_type=file.content_type,
-        uploaded_at=datetime.utcnow()
+        image_url=storage.resolve_url(image_url),
+        file_size=stored_size,
+        file_type=image_processing.CONTENT_TYPES["jpg"],
+        uploaded_at=datetime.utcnow(),
+        image_variants=images.variant_urls(image_url)
     )
 
+@app.post("/meals/upload-url", response_model=schemas.DirectUpload, tags=["Meals"])
+async def create_meal_image_upload_url(
+    upload: schemas.DirectUploadRequest,
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+):
+    """
+    URL สำหรับอัปโหลดรูปภาพตรงไปยัง object storage (form POST ของ url + fields
+    + file) แล้วเรียก /meals/upload-complete ด้วย key (ต้องใช้ STORAGE_BACKEND=s3)
+    """
+    if upload.content_type not in images.ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail="Only JPEG, PNG, JPG, and WebP images are allowed")
+    key = images.direct_upload_key(current_user.uid)
+    expires = settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS
+    try:
+        presigned = await run_in_threadpool(
+            storage.get_storage().presigned_upload, key, upload.content_type, settings.MAX_UPLOAD_BYTES, expires
+        )
+    except storage.DirectUploadUnsupported:
+        raise HTTPException(status_code=501, detail="Direct uploads require the S3 storage backend")
+    return schemas.DirectUpload(
+        url=presigned["url"], fields=presigned["fields"], key=key,
+        expires_in=expires, max_bytes=settings.MAX_UPLOAD_BYTES
+    )
+
+@app.post("/meals/upload-complete", response_model=schemas.ImageUploadResponse, tags=["Meals"])
+async def complete_meal_image_upload(
+    upload: schemas.DirectUploadComplete,
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+):
+    """แปลงรูปภาพที่อัปโหลดตรงไปยัง storage แล้ว (key จาก /meals/upload-url)"""
+    backend = storage.get_storage()
+    if not backend.direct_uploads:
+        raise HTTPException(status_code=501, detail="Direct uploads require the S3 storage backend")
+    if not images.is_direct_upload_key(upload.key, current_user.uid):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        path, digest, size, _ = await image_processing.fetch_upload(upload.key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        return await _store_image(db, path, digest, size)
+    finally:
+        await run_in_threadpool(path.unlink, missing_ok=True)
+        await run_in_threadpool(backend.delete, [upload.key])
+
 @app.get("/meals/{meal_id}/image", tags=["Meals"])
 async def get_meal_image(
     meal_id: str,
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+    db: DBSession = Depends(get_session)
 ):
     """ดึงรูปภาพอาหาร"""
     
-    meal = crud.get_meal(db, meal_id=meal_id)
+    meal = await run_db(db, crud.get_meal, meal_id=meal_id)
     
     if not meal or meal.user_id != current_user.uid:
         raise HTTPException(status_code=404, detail="Meal not found")
@@ -405,89 +560,160 @@ async def get_meal_image(
     if not meal.image_url:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    return {"image_url": meal.image_url}
+    return {"image_url": storage.resolve_url(meal.image_url)}
+
+# Day dashboard endpoint
+@app.get("/users/{user_id}/days/{day}", response_model=schemas.DayDashboard, tags=["Daily Tasks"])
+async def read_day_dashboard(
+    user_id: str,
+    day: date,
+    if_none_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """
+    Food log, meals, daily task, tasks, goals and streak of one day in a
+    single response. Send the returned ETag as If-None-Match to get a 304
+    when nothing changed.
+    """
+    dashboard = await run_db(db, crud.get_day_dashboard, user_id=user_id, day=day)
+    body = dashboard.model_dump_json().encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Trend endpoint (served from user_daily_rollups)
+@app.get("/users/{user_id}/trends", response_model=List[schemas.DailyRollup], tags=["Statistics"])
+async def read_trends(
+    user_id: str,
+    days: int = Query(30, ge=1, le=366),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """Daily nutrition and task totals of the last `days` days, oldest first"""
+    return await run_db(db, rollups.get_trends, user_id=user_id, days=days)
+
+# Insights endpoint
+@app.get("/users/{user_id}/insights", response_model=schemas.Insights, tags=["Statistics"])
+async def read_insights(
+    user_id: str,
+    window: Literal["week", "month", "quarter", "year"] = "week",
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """Rolling averages, goal adherence and week-over-week changes for calories, water, exercise and sleep"""
+    return await run_db(db, analytics.get_insights, user_id=user_id, window=window)
 
 # Daily Task endpoints
 @app.post("/users/{user_id}/daily-tasks/", response_model=schemas.DailyTask, tags=["Daily Tasks"])
-def create_daily_task(
+async def create_daily_task(
     user_id: str, 
     daily_task: schemas.DailyTaskBase, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     # Check if daily task already exists for this date
-    existing_task = crud.get_daily_task(db, user_id=user_id, date=daily_task.date)
+    existing_task = await run_db(db, crud.get_daily_task, user_id=user_id, date=daily_task.date)
     if existing_task:
         return existing_task
     
     daily_task_data = schemas.DailyTaskCreate(**daily_task.dict(), user_id=user_id)
-    return crud.create_daily_task(db=db, daily_task=daily_task_data)
+    return await run_db(db, crud.create_daily_task, daily_task=daily_task_data)
+
+@app.get("/users/{user_id}/daily-tasks/range", response_model=schemas.DailyTaskPage, tags=["Daily Tasks"])
+async def read_daily_tasks_range(
+    user_id: str,
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """Daily tasks between from/to (inclusive) with their tasks, paged with next_cursor"""
+    return await _range_page(db, crud.get_daily_tasks_range, user_id, date_from, date_to, cursor, limit)
 
 @app.get("/users/{user_id}/daily-tasks/{task_date}", response_model=schemas.DailyTask, tags=["Daily Tasks"])
-def read_daily_task_by_date(
+async def read_daily_task_by_date(
     user_id: str, 
     task_date: date, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_daily_task = crud.get_daily_task(db, user_id=user_id, date=task_date)
+    db_daily_task = await run_db(db, crud.get_daily_task, user_id=user_id, date=task_date)
     if db_daily_task is None:
         raise HTTPException(status_code=404, detail="Daily task not found")
     return db_daily_task
 
 # Task endpoints
-@app.post("/tasks/", response_model=schemas.Task, tags=["Tasks"])
-def create_task(
+@app.post("/tasks/", response_model=schemas.TaskWriteResult, tags=["Tasks"])
+async def create_task(
     task: schemas.TaskCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_task = crud.create_task(db=db, task=task)
+    db_task = await run_db(db, crud.create_task, task=task)
     # --- Added: update user's day streak after creating a task ---
     try:
-        crud.compute_and_update_user_streak(db, current_user.uid)
+        await run_db(db, crud.update_streak_on_task_write, db_task.daily_task_id, added=True)
     except Exception as e:
         print(f"WARN: Failed to update day streak after task create: {e}")
-    return db_task
+    return _write_result(schemas.TaskWriteResult, db_task, db)
+
+@app.post("/tasks/batch", response_model=schemas.BatchResponse, tags=["Tasks"])
+async def create_tasks_batch(
+    tasks: List[schemas.TaskCreate],
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """Create many tasks at once (offline sync); the streak is rebuilt once per batch"""
+    if len(tasks) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size must be at most {MAX_BATCH_SIZE}")
+    results = await run_db(db, crud.create_tasks_bulk, user_id=current_user.uid, tasks=tasks)
+    if any(result.success for result in results):
+        try:
+            await run_db(db, crud.compute_and_update_user_streak, current_user.uid)
+        except Exception as e:
+            print(f"WARN: Failed to update day streak after task batch: {e}")
+    return _batch_response(results, db)
 
 @app.get("/daily-tasks/{daily_task_id}/tasks/", response_model=List[schemas.Task], tags=["Tasks"])
-def read_tasks_by_daily_task(
+async def read_tasks_by_daily_task(
     daily_task_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.get_tasks_by_daily_task(db, daily_task_id=daily_task_id)
+    return await run_db(db, crud.get_tasks_by_daily_task, daily_task_id=daily_task_id)
 
-@app.put("/tasks/{task_id}", response_model=schemas.Task, tags=["Tasks"])
-def update_task(
+@app.put("/tasks/{task_id}", response_model=schemas.TaskWriteResult, tags=["Tasks"])
+async def update_task(
     task_id: str, 
     task_update: schemas.TaskUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_task = crud.update_task(db, task_id=task_id, task_update=task_update)
+    db_task = await run_db(db, crud.update_task, task_id=task_id, task_update=task_update)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    # --- Added: update user's day streak after updating a task ---
-    try:
-        crud.compute_and_update_user_streak(db, current_user.uid)
-    except Exception as e:
-        print(f"WARN: Failed to update day streak after task update: {e}")
-    return db_task
+    # A task cannot move to another day, so updates never change the streak
+    return _write_result(schemas.TaskWriteResult, db_task, db)
 
 @app.delete("/tasks/{task_id}", tags=["Tasks"])
-def delete_task(
+async def delete_task(
     task_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_task = crud.get_task(db, task_id=task_id)
+    db_task = await run_db(db, crud.get_task, task_id=task_id)
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    crud.delete_task(db, task_id=task_id)
+    daily_task_id = db_task.daily_task_id
+    await run_db(db, crud.delete_task, task_id=task_id)
     # --- Added: update user's day streak after deleting a task ---
     try:
-        crud.compute_and_update_user_streak(db, current_user.uid)
+        await run_db(db, crud.update_streak_on_task_write, daily_task_id, added=False)
     except Exception as e:
         print(f"WARN: Failed to update day streak after task delete: {e}")
     return {"message": "Task deleted successfully"}
@@ -495,70 +721,17 @@ def delete_task(
 # Achievement endpoints
 @app.post("/api/achievements/initialize", response_model=schemas.StandardResponse)
 async def initialize_user_achievements(
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+    db: DBSession = Depends(get_session)
 ):
-    """Initialize default achievements for a user"""
-    # Check if user already has achievements
-    existing_achievements = crud.get_user_achievements(db, current_user.uid)
-    if existing_achievements:
+    """Initialize default achievements for a user (new users get them at registration)"""
+    created = await run_db(db, crud.seed_user_achievements, current_user.uid)
+    if not created:
         return schemas.StandardResponse(
             success=True,
             message="Achievements already initialized"
         )
     
-    # Default achievements to create
-    default_achievements = [
-        {
-            "type": "first_record",
-            "name": "ผู้ริเริ่ม",
-            "description": "สำเร็จบันทึกครั้งแรก",
-            "target": 1
-        },
-        {
-            "type": "meal_logging",
-            "name": "นักวางแผน",
-            "description": "บันทึกอาหารครบ 10 วัน",
-            "target": 10
-        },
-        {
-            "type": "exercise_logging",
-            "name": "นักออกกำลังกาย",
-            "description": "บันทึกการออกกำลังกายครบ 10 วัน",
-            "target": 10
-        },
-        {
-            "type": "goal_achievement",
-            "name": "ผู้เชี่ยวชาญ",
-            "description": "บรรลุเป้าหมายสุขภาพ 3 เป้าหมาย",
-            "target": 3
-        },
-        {
-            "type": "meal_planning",
-            "name": "นักวางแผนมื้ออาหาร",
-            "description": "วางแผนมื้ออาหารครบ 5 มื้อ",
-            "target": 5
-        },
-        {
-            "type": "streak_days",
-            "name": "นักพัฒนา",
-            "description": "บันทึกกิจกรรมครบ 20 วัน",
-            "target": 20
-        }
-    ]
-    
-    # Create achievements
-    for achievement_data in default_achievements:
-        achievement_create = schemas.AchievementCreate(
-            user_id=current_user.uid,
-            type=achievement_data["type"],
-            name=achievement_data["name"],
-            description=achievement_data["description"],
-            target=achievement_data["target"],
-            current=0
-        )
-        crud.create_achievement(db, achievement_create)
-    
     return schemas.StandardResponse(
         success=True,
         message="Achievements initialized successfully"
@@ -566,192 +739,206 @@ async def initialize_user_achievements(
 
 @app.get("/api/achievements", response_model=schemas.StandardResponse)
 async def get_user_achievements(
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+    db: DBSession = Depends(get_session)
 ):
     """Get all achievements for the current user"""
-    achievements = crud.get_user_achievements(db, current_user.uid)
-    return schemas.StandardResponse(
-        success=True,
-        message="Achievements retrieved successfully",
-        data=[{
-            "id": achievement.id,
-            "user_id": achievement.user_id,
-            "type": achievement.type,
-            "name": achievement.name,
-            "description": achievement.description,
-            "target": achievement.target,
-            "current": achievement.current,
-            "achieved": achievement.achieved,
-            "achieved_at": achievement.achieved_at.isoformat() if achievement.achieved_at else None,
-            "created_at": achievement.created_at.isoformat(),
-            "updated_at": achievement.updated_at.isoformat()
-        } for achievement in achievements]
-    )
-
-@app.put("/api/achievements/update-progress", response_model=schemas.StandardResponse)
+    rows = await run_db(db, crud.get_user_achievement_rows, current_user.uid)
+    return serializers.json_response({
+        "success": True,
+        "message": "Achievements retrieved successfully",
+        "data": [serializers.achievement(row) for row in rows]
+    })
+
+@app.put("/api/achievements/update-progress", response_model=schemas.StandardResponse, deprecated=True)
 async def update_achievement_progress(
     request: dict,
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """Update achievement progress"""
-    achievement_type = request.get("achievement_type")
-    progress = request.get("progress", 1)
-    
-    # Get user's achievement of this type
-    achievements = crud.get_user_achievements(db, current_user.uid)
-    target_achievement = None
-    
-    for achievement in achievements:
-        if achievement.type == achievement_type and not achievement.achieved:
-            target_achievement = achievement
-            break
-    
-    if not target_achievement:
-        return schemas.StandardResponse(
-            success=False,
-            message="Achievement not found or already completed"
-        )
-    
-    # Update progress
-    new_current = target_achievement.current + progress
-    newly_achieved = []
-    
-    # Check if achievement is completed
-    achieved = new_current >= target_achievement.target
-    achieved_at = datetime.utcnow() if achieved and not target_achievement.achieved else target_achievement.achieved_at
-    
-    if achieved and not target_achievement.achieved:
-        newly_achieved.append(target_achievement.name)
-    
-    # Update achievement
-    achievement_update = schemas.AchievementUpdate(
-        current=new_current,
-        achieved=achieved,
-        achieved_at=achieved_at
-    )
-    
-    crud.update_achievement(db, target_achievement.id, achievement_update)
-    
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+    db: DBSession = Depends(get_session)
+):
+    """
+    Deprecated: achievement progress is evaluated by the server on meal and
+    task writes, whose responses carry newly_achieved. Client-sent progress
+    is ignored.
+    """
     return schemas.StandardResponse(
         success=True,
-        message="Achievement progress updated",
-        data={"newly_achieved": newly_achieved}
+        message="Achievement progress is tracked by the server",
+        data={"newly_achieved": []}
     )
 
 # Nutrition Database endpoints
 @app.post("/nutrition/", response_model=schemas.NutritionDatabase, tags=["Nutrition Database"])
-def create_nutrition_item(
+async def create_nutrition_item(
     nutrition: schemas.NutritionDatabaseCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.create_nutrition_item(db=db, nutrition=nutrition)
+    return await run_db(db, crud.create_nutrition_item, nutrition=nutrition)
 
-@app.get("/nutrition/search/", response_model=List[schemas.NutritionDatabase], tags=["Nutrition Database"])
-def search_nutrition(
+@app.get("/nutrition/search/", response_model=List[schemas.NutritionSearchResult], tags=["Nutrition Database"])
+async def search_nutrition(
     food_name: str = Query(..., description="Food name to search"), 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
-):
-    return crud.get_nutrition_by_food_name(db, food_name=food_name)
+    limit: int = Query(20, ge=1, le=nutrition.MAX_RESULTS),
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
+):
+    """ค้นหาอาหาร (ไทย/อังกฤษ) แบบ prefix และ fuzzy เรียงตามความใกล้เคียง; ใช้ index ในหน่วยความจำเมื่อโหลดแล้ว"""
+    if typeahead.index.ready:
+        return await run_in_threadpool(typeahead.index.search, food_name, limit=limit)
+    return await run_db(db, crud.get_nutrition_by_food_name, food_name=food_name, limit=limit)
+
+@app.post(
+    "/nutrition/import",
+    response_model=schemas.NutritionImportResult,
+    tags=["Nutrition Database"],
+    dependencies=[Depends(deps.require_internal)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"],
+            }}},
+        }
+    },
+)
+async def import_nutrition_items(
+    request: Request,
+    fmt: Optional[Literal["csv", "jsonl"]] = Query(None, alias="format", description="Default: from the file name"),
+):
+    """
+    นำเข้าข้อมูลโภชนาการจำนวนมากจากไฟล์ CSV/JSONL (COPY ทีละ batch แล้ว upsert;
+    แถวที่มี id หรือชื่อซ้ำกับที่มีอยู่จะถูกอัปเดต) ดู nutrition_import
+    เฉพาะบริการภายใน (X-Internal-Token) เพราะเขียนทับแคตตาล็อกทั้งหมด
+    """
+    try:
+        received = await images.receive_file(
+            request, images.SCRATCH_DIR,
+            max_bytes=settings.NUTRITION_IMPORT_MAX_BYTES, allowed_types=nutrition_import.ALLOWED_TYPES,
+        )
+    except images.UploadTooLarge:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File size must be less than {settings.NUTRITION_IMPORT_MAX_BYTES // (1024 * 1024)}MB"
+        )
+    except images.UnsupportedFileType:
+        raise HTTPException(status_code=400, detail="Only CSV and JSONL files are allowed")
+    except images.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            _import_executor, _import_nutrition_file,
+            received.path, fmt or nutrition_import.format_of(received.filename),
+        )
+    except nutrition_import.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await images.discard(received)
+    return schemas.NutritionImportResult.model_validate(result)
+
+# Imports run for minutes: one at a time per worker, on a thread of their own rather than the request threadpool
+_import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nutrition-import")
+
+def _import_nutrition_file(path, fmt: str):
+    # COPY ต้องใช้ connection ของ psycopg2 จึงใช้ session แบบ sync ใน thread แยก
+    db = SessionLocal()
+    try:
+        with typeahead.bulk_write(db):
+            return nutrition_import.import_file(db, path, fmt)
+    finally:
+        db.close()
 
 @app.put("/nutrition/{nutrition_id}", response_model=schemas.NutritionDatabase, tags=["Nutrition Database"])
-def update_nutrition_item(
+async def update_nutrition_item(
     nutrition_id: str, 
     nutrition_update: schemas.NutritionDatabaseUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_nutrition = crud.update_nutrition_item(db, nutrition_id=nutrition_id, nutrition_update=nutrition_update)
+    db_nutrition = await run_db(db, crud.update_nutrition_item, nutrition_id=nutrition_id, nutrition_update=nutrition_update)
     if db_nutrition is None:
         raise HTTPException(status_code=404, detail="Nutrition item not found")
     return db_nutrition
 
 # User Preferences endpoints
 @app.post("/users/{user_id}/preferences/", response_model=schemas.UserPreference, tags=["User Preferences"])
-def create_user_preferences(
+async def create_user_preferences(
     user_id: str, 
     preferences: schemas.UserPreferenceBase, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    existing_preferences = crud.get_user_preferences(db, user_id=user_id)
+    existing_preferences = await run_db(db, crud.get_user_preferences, user_id=user_id)
     if existing_preferences:
         raise HTTPException(status_code=400, detail="User preferences already exist")
     
     preferences_data = schemas.UserPreferenceCreate(**preferences.dict(), user_id=user_id)
-    return crud.create_user_preferences(db=db, preferences=preferences_data)
+    return await run_db(db, crud.create_user_preferences, preferences=preferences_data)
 
 @app.get("/users/{user_id}/preferences/", response_model=schemas.UserPreference, tags=["User Preferences"])
-def read_user_preferences(
+async def read_user_preferences(
     user_id: str, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_preferences = crud.get_user_preferences(db, user_id=user_id)
+    db_preferences = await run_db(db, crud.get_user_preferences, user_id=user_id)
     if db_preferences is None:
         raise HTTPException(status_code=404, detail="User preferences not found")
     return db_preferences
 
 @app.put("/users/{user_id}/preferences/", response_model=schemas.UserPreference, tags=["User Preferences"])
-def update_user_preferences(
+async def update_user_preferences(
     user_id: str, 
     preferences_update: schemas.UserPreferenceUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_preferences = crud.update_user_preferences(db, user_id=user_id, preferences_update=preferences_update)
+    db_preferences = await run_db(db, crud.update_user_preferences, user_id=user_id, preferences_update=preferences_update)
     if db_preferences is None:
         raise HTTPException(status_code=404, detail="User preferences not found")
     return db_preferences
 
 # App Statistics endpoints
 @app.get("/statistics/", response_model=schemas.AppStatistics, tags=["App Statistics"])
-def read_app_statistics(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+async def read_app_statistics(
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    db_stats = crud.get_app_statistics(db)
+    db_stats = await run_db(db, crud.get_app_statistics)
     if db_stats is None:
         raise HTTPException(status_code=404, detail="App statistics not found")
     return db_stats
 
 @app.put("/statistics/", response_model=schemas.AppStatistics, tags=["App Statistics"])
-def update_app_statistics(
+async def update_app_statistics(
     stats_update: schemas.AppStatisticsUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    return crud.update_app_statistics(db=db, stats_update=stats_update)
+    return await run_db(db, crud.update_app_statistics, stats_update=stats_update)
 
 # Missing Auth endpoints
 @app.get("/auth/me", response_model=schemas.User, tags=["Authentication"])
-def read_current_user(current_user: models.User = Depends(deps.get_current_active_user)):
+async def read_current_user(current_user: models.User = Depends(deps.get_current_active_user)):
     """Get current user information"""
     return current_user
 
 # Missing Stats endpoints  
 @app.get("/stats/streak", tags=["Statistics"])
-def get_user_streak(
-    db: Session = Depends(get_db),
+async def get_user_streak(
     current_user: models.User = Depends(deps.get_current_active_user)
 ):
-    """Get user's streak count (recalculate to ensure up-to-date)"""
-    try:
-        streak = crud.compute_and_update_user_streak(db, current_user.uid)
-    except Exception as e:
-        print(f"WARN: Failed to compute streak in /stats/streak: {e}")
-        # fallback to stored value if available
-        streak = current_user.day_streak or 0
-    return {"streak_count": streak}
+    """Get user's streak count from the stored streak run (read only; task writes keep the run current)"""
+    return {"streak_count": crud.current_streak(current_user)}
 
 @app.get("/tasks/{date}", tags=["Tasks"])
-def get_tasks_by_date(
+async def get_tasks_by_date(
     date: str,
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: DBSession = Depends(get_session), 
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     """Get daily tasks by date"""
     return {
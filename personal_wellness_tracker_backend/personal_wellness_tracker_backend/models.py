@@ -1,7 +1,9 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Date, Text, ForeignKey, Enum, ARRAY
+from sqlalchemy import Column, String, Integer, BigInteger, Float, Boolean, DateTime, Date, Text, ForeignKey, Enum, ARRAY, UniqueConstraint, Index, DDL, event, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import date
 import enum
 
 Base = declarative_base()
@@ -44,7 +46,7 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     username = Column(String)
     age = Column(Integer)
-    gender = Column(Enum(GenderEnum))
+    gender = Column(Enum(GenderEnum, name="gender"))
     weight = Column(Float)
     height = Column(Float)
     profile_completed = Column(Boolean, default=False)
@@ -52,7 +54,10 @@ class User(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     health_problems = Column(ARRAY(String))
     saved_days_count = Column(Integer, default=0)
-    day_streak = Column(Integer, default=0)
+    # Latest run of consecutive days with a task (crud.update_streak_on_task_write);
+    # both NULL when the user has no task at all
+    streak_start_date = Column(Date)
+    streak_last_date = Column(Date)
     last_updated = Column(DateTime, default=func.now())
     
     # Relationships
@@ -63,6 +68,18 @@ class User(Base):
     achievements = relationship("Achievement", back_populates="user")
     preferences = relationship("UserPreference", back_populates="user", uselist=False)
 
+    def streak_on(self, day: date) -> int:
+        """Length of the stored run up to day; 0 when day is not in the run"""
+        start, last = self.streak_start_date, self.streak_last_date
+        if start is None or last is None or not (start <= day <= last):
+            return 0
+        return (day - start).days + 1
+
+    @property
+    def day_streak(self) -> int:
+        """Streak ending today, derived from the stored run so it is never stale"""
+        return self.streak_on(date.today())
+
 class UserGoal(Base):
     __tablename__ = "user_goals"
     
@@ -85,6 +102,10 @@ class UserGoal(Base):
 
 class FoodLog(Base):
     __tablename__ = "food_logs"
+    __table_args__ = (
+        # Keyset pagination of date ranges (see crud.get_food_logs_range)
+        Index("food_logs_user_date_id_idx", "user_id", "date", "id"),
+    )
     
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.uid"), nullable=False)
@@ -98,13 +119,22 @@ class FoodLog(Base):
 
 class Meal(Base):
     __tablename__ = "meals"
+    # Fetch created_at/updated_at with INSERT ... RETURNING instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Keyset scan of meals still to be enriched (see enrichment.pending_meals)
+        Index("meals_needs_nutrition_idx", "created_at", "id",
+              postgresql_where=text("has_nutrition_data = false AND nutrition_checked_at IS NULL")),
+        # Each food log's meals in id order (see crud.get_meals_range)
+        Index("meals_food_log_id_id_idx", "food_log_id", "id"),
+    )
     
     id = Column(String, primary_key=True)
     food_log_id = Column(String, ForeignKey("food_logs.id"), nullable=False)
     user_id = Column(String, ForeignKey("users.uid"), nullable=False)
     food_name = Column(String)
     description = Column(Text)
-    meal_type = Column(Enum(MealTypeEnum))
+    meal_type = Column(Enum(MealTypeEnum, name="meal_type"))
     calories = Column(Integer, default=0)
     protein = Column(Float)
     carbs = Column(Float)
@@ -112,6 +142,8 @@ class Meal(Base):
     fiber = Column(Float)
     sugar = Column(Float)
     has_nutrition_data = Column(Boolean, default=False)
+    # Set when enrichment found no catalog match for food_name
+    nutrition_checked_at = Column(DateTime)
     image_url = Column(String)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -122,6 +154,10 @@ class Meal(Base):
 
 class DailyTask(Base):
     __tablename__ = "daily_tasks"
+    __table_args__ = (
+        # Keyset pagination of date ranges (see crud.get_daily_tasks_range)
+        Index("daily_tasks_user_date_id_idx", "user_id", "date", "id"),
+    )
     
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.uid"), nullable=False)
@@ -149,8 +185,41 @@ class Task(Base):
     # Relationships
     daily_task = relationship("DailyTask", back_populates="tasks")
 
+class UserDailyRollup(Base):
+    """Per-user, per-day totals maintained by the meal and task write paths"""
+    __tablename__ = "user_daily_rollups"
+
+    user_id = Column(String, ForeignKey("users.uid"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    calories = Column(Integer, nullable=False, server_default="0")
+    protein = Column(Float, nullable=False, server_default="0")
+    carbs = Column(Float, nullable=False, server_default="0")
+    fat = Column(Float, nullable=False, server_default="0")
+    fiber = Column(Float, nullable=False, server_default="0")
+    sugar = Column(Float, nullable=False, server_default="0")
+    meal_count = Column(Integer, nullable=False, server_default="0")
+    breakfast_count = Column(Integer, nullable=False, server_default="0")
+    lunch_count = Column(Integer, nullable=False, server_default="0")
+    dinner_count = Column(Integer, nullable=False, server_default="0")
+    snack_count = Column(Integer, nullable=False, server_default="0")
+    # {task_type: {"count": n, "completed": n, "value_sum": x}}; "activity:<id>" types are grouped as "activity"
+    task_totals = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ImageBlob(Base):
+    """Content-addressed meal image; refcount = meals whose image_url points at it (see image_blobs)"""
+    __tablename__ = "image_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    size = Column(BigInteger)
+    refcount = Column(Integer, nullable=False, server_default="0")
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 class Achievement(Base):
     __tablename__ = "achievements"
+    # One achievement per type and user; default achievements are seeded with ON CONFLICT DO NOTHING
+    __table_args__ = (UniqueConstraint("user_id", "type", name="achievements_user_id_type_idx"),)
     
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.uid"), nullable=False)
@@ -167,12 +236,71 @@ class Achievement(Base):
     # Relationships
     user = relationship("User", back_populates="achievements")
 
+class AchievementDay(Base):
+    """Days already counted towards a per-day achievement (goal_achievement)"""
+    __tablename__ = "achievement_days"
+
+    user_id = Column(String, ForeignKey("users.uid"), primary_key=True)
+    type = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    created_at = Column(DateTime, default=func.now())
+
+class NutritionDatabase(Base):
+    """Food catalog; search_name is the normalized Thai/English name (see nutrition.normalize_name)"""
+    __tablename__ = "nutrition_database"
+    __table_args__ = (
+        Index("nutrition_database_search_name_trgm_idx", "search_name",
+              postgresql_using="gin", postgresql_ops={"search_name": "gin_trgm_ops"}),
+        Index("nutrition_database_search_name_prefix_idx", "search_name",
+              postgresql_ops={"search_name": "text_pattern_ops"}),
+        Index("nutrition_database_last_updated_idx", "last_updated"),
+    )
+
+    id = Column(String, primary_key=True)
+    food_name = Column(String, nullable=False)
+    food_name_en = Column(String)
+    search_name = Column(String, nullable=False)
+    calories = Column(Float)
+    protein = Column(Float)
+    carbs = Column(Float)
+    fat = Column(Float)
+    fiber = Column(Float)
+    sugar = Column(Float)
+    last_updated = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# gin_trgm_ops needs the extension before create_all() builds the index
+event.listen(NutritionDatabase.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+class NutritionDeletion(Base):
+    """Catalog items deleted, written by a trigger on nutrition_database; typeahead sync hides them"""
+    __tablename__ = "nutrition_deletions"
+    __table_args__ = (
+        Index("nutrition_deletions_deleted_at_idx", "deleted_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    deleted_at = Column(DateTime, nullable=False, default=func.now())
+
+# Same function and trigger as init.sql
+event.listen(NutritionDatabase.__table__, "after_create", DDL("""
+CREATE OR REPLACE FUNCTION nutrition_record_deletion() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO nutrition_deletions (id, deleted_at) VALUES (OLD.id, now())
+  ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""))
+event.listen(NutritionDatabase.__table__, "after_create", DDL(
+    "CREATE TRIGGER nutrition_database_deleted AFTER DELETE ON nutrition_database "
+    "FOR EACH ROW EXECUTE FUNCTION nutrition_record_deletion()"
+))
+
 class UserPreference(Base):
     __tablename__ = "user_preferences"
     
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.uid"), nullable=False, unique=True)
-    theme = Column(Enum(ThemeEnum), default=ThemeEnum.system)
+    theme = Column(Enum(ThemeEnum, name="theme"), default=ThemeEnum.system)
     notifications_enabled = Column(Boolean, default=True)
     reminder_times = Column(Text)
     created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,65 @@
+"""
+Food catalog search over nutrition_database.
+
+Every item has a search_name: its Thai and English names normalized the
+same way as queries (NFKC, case folded, Thai tone marks dropped,
+punctuation collapsed to single spaces). Search matches it by prefix
+(btree text_pattern_ops index) or by pg_trgm word similarity (GIN
+gin_trgm_ops index) and ranks exact > prefix > fuzzy, then by similarity.
+
+pg_trgm only makes trigrams from characters the database locale treats as
+letters; the postgres image's default en_US.utf8 covers Thai.
+"""
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import case, func, literal, or_, text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# Below this word similarity a fuzzy match is not returned
+WORD_SIMILARITY_THRESHOLD = 0.4
+MAX_RESULTS = 50
+
+# Tone marks, mai taikhu, thanthakhat and yamakkan: often omitted or typed in another order
+_THAI_MARKS = dict.fromkeys(range(0x0E47, 0x0E4D), None)
+_THAI_MARKS[0x0E4E] = None
+# NFKC splits sara am into nikhahit + sara aa
+_SARA_AM_DECOMPOSED = "ํา"
+
+def normalize_name(*names: Optional[str]) -> str:
+    """Search form of one or more names (e.g. Thai and English), space separated"""
+    text = unicodedata.normalize("NFKC", " ".join(name for name in names if name)).casefold()
+    text = text.translate(_THAI_MARKS).replace(_SARA_AM_DECOMPOSED, "ำ")
+    # Punctuation, symbols and control characters separate words; Thai vowel signs (Mn) are kept
+    text = "".join(" " if unicodedata.category(ch)[0] in "PSZC" else ch for ch in text)
+    return " ".join(text.split())
+
+def search(db: Session, query: str, limit: int = 20) -> List[schemas.NutritionSearchResult]:
+    """Catalog items matching query, best first"""
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+    item = models.NutritionDatabase
+    prefix = f"{normalized}%"
+    score = case(
+        (item.search_name == normalized, 3),
+        (item.search_name.like(prefix), 2),
+        else_=1,
+    ) + func.word_similarity(normalized, item.search_name)
+
+    db.execute(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+        {"threshold": str(WORD_SIMILARITY_THRESHOLD)},
+    )
+    rows = db.query(item, score.label("score")).filter(
+        or_(item.search_name.like(prefix), literal(normalized).op("<%")(item.search_name))
+    ).order_by(score.desc(), func.length(item.search_name), item.id).limit(min(limit, MAX_RESULTS))
+
+    return [
+        schemas.NutritionSearchResult.model_validate(row, from_attributes=True).model_copy(
+            update={"score": round(float(row_score), 4)}
+        )
+        for row, row_score in rows
+    ]
@@ -0,0 +1,216 @@
+"""
+Bulk import of the nutrition catalog from CSV or JSONL files.
+
+The file is parsed as a stream. Rows go in batches of
+NUTRITION_IMPORT_BATCH_SIZE: each batch is written with COPY into a
+temporary staging table, then upserted into nutrition_database with one
+INSERT ... ON CONFLICT and committed, so memory stays bounded by one batch
+whatever the file size. A failed import keeps the batches committed before it.
+
+Columns (CSV header or JSON keys): food_name (required), food_name_en,
+calories, protein, carbs, fat, fiber, sugar and id. Rows without an id get
+a uuid5 of their names (NFC, not the lossy search_name, which maps
+different foods to the same string), so importing the same file again
+updates the items instead of duplicating them. Within a file the last row of an id
+wins. Invalid rows are skipped and counted.
+"""
+import csv
+import io
+import json
+import math
+import time
+import unicodedata
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .core import config
+from .nutrition import normalize_name
+
+settings = config.get_settings()
+
+FORMATS = ("csv", "jsonl")
+# Content types browsers and HTTP clients send for .csv and .jsonl files
+ALLOWED_TYPES = (
+    "text/csv", "application/csv", "application/vnd.ms-excel", "text/plain",
+    "application/jsonl", "application/x-ndjson", "application/json", "application/octet-stream",
+)
+NUMERIC_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "sugar")
+# Ids of rows without one: item_id(food_name, food_name_en)
+NAMESPACE = uuid.UUID("5f0e4c57-3b64-4a53-9a8e-1f4e2c8d7b10")
+MAX_ERRORS = 20
+
+_COLUMNS = ("line", "id", "food_name", "food_name_en", "search_name") + NUMERIC_FIELDS
+_ITEM_COLUMNS = ", ".join(_COLUMNS[1:])
+_STAGING_DDL = text("""
+CREATE TEMP TABLE IF NOT EXISTS nutrition_import (
+  line bigint, id varchar, food_name varchar, food_name_en varchar, search_name varchar,
+  calories double precision, protein double precision, carbs double precision,
+  fat double precision, fiber double precision, sugar double precision, legacy_id varchar
+) ON COMMIT DELETE ROWS
+""")
+_COPY = f"COPY nutrition_import ({', '.join(_COLUMNS)}, legacy_id) FROM STDIN WITH (FORMAT csv)"
+# Earlier imports keyed rows without an id by uuid5(NAMESPACE, search_name): drop the item
+# imported that way under the same names, so the upsert re-keys it instead of duplicating it
+_DROP_LEGACY = text("""
+DELETE FROM nutrition_database d USING nutrition_import s
+WHERE d.id = s.legacy_id AND d.id <> s.id
+  AND d.food_name = s.food_name AND d.food_name_en IS NOT DISTINCT FROM s.food_name_en
+""")
+# Rows whose values did not change keep their last_updated (and stay out of typeahead syncs)
+_UPSERT = text(f"""
+WITH upserted AS (
+  INSERT INTO nutrition_database ({_ITEM_COLUMNS})
+  SELECT DISTINCT ON (id) {_ITEM_COLUMNS} FROM nutrition_import ORDER BY id, line DESC
+  ON CONFLICT (id) DO UPDATE SET
+    {", ".join(f"{column} = EXCLUDED.{column}" for column in _COLUMNS[2:])},
+    last_updated = now()
+  WHERE ({", ".join(f"nutrition_database.{column}" for column in _COLUMNS[2:])})
+    IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in _COLUMNS[2:])})
+  RETURNING xmax = 0 AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+""")
+
+class ImportFormatError(ValueError):
+    pass
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def unchanged(self) -> int:
+        return self.rows - self.rejected - self.inserted - self.updated
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+def format_of(filename: Optional[str]) -> str:
+    """Format from a file name; CSV unless it ends in .jsonl or .ndjson"""
+    return "jsonl" if (filename or "").lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+def read_rows(stream: io.TextIOBase, fmt: str) -> Iterator[tuple]:
+    """(line number, dict or error message) for every record of the file"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or "food_name" not in (name.strip().lower() for name in reader.fieldnames):
+            raise ImportFormatError("CSV header must include a food_name column")
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_num, f"invalid JSON: {e}"
+                continue
+            yield line_num, record if isinstance(record, dict) else "not a JSON object"
+    else:
+        raise ImportFormatError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+
+def item_id(food_name: str, food_name_en: Optional[str]) -> str:
+    """uuid5 of the NFC names: only the same Thai and English names give the same id"""
+    names = "\x1f".join(unicodedata.normalize("NFC", name or "") for name in (food_name, food_name_en))
+    return str(uuid.uuid5(NAMESPACE, names))
+
+def staging_row(line: int, record: dict) -> list:
+    """Columns of one staging row; ValueError with the reason for invalid records"""
+    food_name = str(record.get("food_name") or "").strip()
+    if not food_name:
+        raise ValueError("food_name is empty")
+    food_name_en = str(record.get("food_name_en") or "").strip() or None
+    search_name = normalize_name(food_name, food_name_en)
+    row_id = str(record.get("id") or "").strip()
+    legacy_id = None if row_id else str(uuid.uuid5(NAMESPACE, search_name))
+    row_id = row_id or item_id(food_name, food_name_en)
+    values = []
+    for name in NUMERIC_FIELDS:
+        value = record.get(name)
+        if value is None or value == "":
+            values.append(None)
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} is not a number: {value!r}")
+        if not math.isfinite(number) or number < 0:
+            raise ValueError(f"{name} must be a non-negative number")
+        values.append(number)
+    return [line, row_id, food_name, food_name_en, search_name, *values, legacy_id]
+
+def _copy_batch(db: Session, buffer: io.StringIO) -> tuple:
+    # Each batch may run on another pooled connection: the staging table is per connection
+    db.execute(_STAGING_DDL)
+    buffer.seek(0)
+    with db.connection().connection.cursor() as cursor:
+        cursor.copy_expert(_COPY, buffer)
+    db.execute(_DROP_LEGACY)
+    inserted, updated = db.execute(_UPSERT).one()
+    db.commit()
+    buffer.seek(0)
+    buffer.truncate()
+    return inserted, updated
+
+def import_stream(db: Session, stream: io.TextIOBase, fmt: str,
+                  batch_size: int = settings.NUTRITION_IMPORT_BATCH_SIZE,
+                  progress: Optional[Callable[[ImportResult], None]] = None) -> ImportResult:
+    """Import every record of a text stream, committing one batch at a time"""
+    result, start = ImportResult(), time.perf_counter()
+    buffer, pending = io.StringIO(), 0
+    writer = csv.writer(buffer)
+
+    def flush():
+        inserted, updated = _copy_batch(db, buffer)
+        result.inserted += inserted
+        result.updated += updated
+        result.seconds = time.perf_counter() - start
+        if progress:
+            progress(result)
+
+    try:
+        for line, record in read_rows(stream, fmt):
+            result.rows += 1
+            if isinstance(record, str):
+                result.reject(line, record)
+                continue
+            try:
+                writer.writerow(staging_row(line, record))
+            except ValueError as e:
+                result.reject(line, str(e))
+                continue
+            pending += 1
+            if pending >= batch_size:
+                flush()
+                pending = 0
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"File is not UTF-8 text (after row {result.rows}): {e}")
+    except csv.Error as e:
+        raise ImportFormatError(f"Invalid CSV (after row {result.rows}): {e}")
+    if pending:
+        flush()
+    result.seconds = time.perf_counter() - start
+    return result
+
+def import_file(db: Session, path: Path, fmt: Optional[str] = None, **kwargs) -> ImportResult:
+    """import_stream of a UTF-8 file (a BOM is skipped); the format defaults to format_of(path)"""
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        return import_stream(db, stream, fmt or format_of(str(path)), **kwargs)
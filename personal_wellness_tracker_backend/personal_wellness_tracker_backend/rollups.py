@@ -0,0 +1,186 @@
+"""
+Per-user daily rollups (user_daily_rollups).
+
+Meal writes apply a delta to the day's row with an upsert; totals never
+go below zero, so removing a meal from a day without a row (or with a
+drifted one) leaves zeros instead of negative totals. Task writes
+rebuild the day's task_totals from its tasks in one statement. Both run
+inside the caller's transaction. backfill_users rebuilds rows from the
+source tables for existing data.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Integer, bindparam, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+NUTRIENT_FIELDS = ("protein", "carbs", "fat", "fiber", "sugar")
+MEAL_TYPE_COUNTS = {meal_type.value: f"{meal_type.value}_count" for meal_type in models.MealTypeEnum}
+
+# task_totals of each selected daily task's day; days without tasks get '{}'
+_TASK_TOTALS_SQL = """
+INSERT INTO user_daily_rollups (user_id, date, task_totals)
+SELECT dt.user_id, dt.date, COALESCE((
+    SELECT jsonb_object_agg(task_key, totals) FROM (
+        SELECT split_part(COALESCE(t.task_type, 'other'), ':', 1) AS task_key,
+               jsonb_build_object(
+                   'count', count(*),
+                   'completed', count(*) FILTER (WHERE t.completed),
+                   'value_sum', COALESCE(sum(t.value_number), 0)
+               ) AS totals
+        FROM tasks t
+        WHERE t.daily_task_id = dt.id
+        GROUP BY 1
+    ) per_type
+), '{{}}'::jsonb)
+FROM daily_tasks dt
+WHERE {where}
+ON CONFLICT (user_id, date) DO UPDATE
+SET task_totals = excluded.task_totals, updated_at = now()
+{returning}
+"""
+
+_MEAL_BACKFILL_SQL = """
+INSERT INTO user_daily_rollups (
+    user_id, date, calories, protein, carbs, fat, fiber, sugar,
+    meal_count, breakfast_count, lunch_count, dinner_count, snack_count
+)
+SELECT fl.user_id, fl.date,
+       COALESCE(sum(m.calories), 0), COALESCE(sum(m.protein), 0), COALESCE(sum(m.carbs), 0),
+       COALESCE(sum(m.fat), 0), COALESCE(sum(m.fiber), 0), COALESCE(sum(m.sugar), 0),
+       count(*),
+       count(*) FILTER (WHERE m.meal_type::text = 'breakfast'),
+       count(*) FILTER (WHERE m.meal_type::text = 'lunch'),
+       count(*) FILTER (WHERE m.meal_type::text = 'dinner'),
+       count(*) FILTER (WHERE m.meal_type::text = 'snack')
+FROM food_logs fl
+JOIN meals m ON m.food_log_id = fl.id
+WHERE fl.user_id IN :user_ids
+GROUP BY fl.user_id, fl.date
+ON CONFLICT (user_id, date) DO UPDATE SET
+    calories = excluded.calories, protein = excluded.protein, carbs = excluded.carbs,
+    fat = excluded.fat, fiber = excluded.fiber, sugar = excluded.sugar,
+    meal_count = excluded.meal_count, breakfast_count = excluded.breakfast_count,
+    lunch_count = excluded.lunch_count, dinner_count = excluded.dinner_count,
+    snack_count = excluded.snack_count, updated_at = now()
+"""
+
+def meal_delta(meal, sign: int = 1) -> Dict[str, float]:
+    """Rollup columns contributed by one meal (sign=-1 to remove it)"""
+    delta = {"calories": sign * (meal.calories or 0), "meal_count": sign}
+    for field in NUTRIENT_FIELDS:
+        delta[field] = sign * (getattr(meal, field) or 0)
+    meal_type = getattr(meal.meal_type, "value", meal.meal_type)
+    if meal_type in MEAL_TYPE_COUNTS:
+        delta[MEAL_TYPE_COUNTS[meal_type]] = sign
+    return delta
+
+def merge_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+    merged = defaultdict(float)
+    for delta in deltas:
+        for column, value in delta.items():
+            merged[column] += value
+    return {column: value for column, value in merged.items() if value}
+
+def _rounded(delta: Dict[str, float]) -> Dict[str, float]:
+    """Integer columns (calories, counts) get whole numbers; merged deltas are floats"""
+    table = models.UserDailyRollup.__table__
+    return {
+        column: round(value) if isinstance(table.c[column].type, Integer) else value
+        for column, value in delta.items()
+    }
+
+def apply_meal_delta(db: Session, user_id: str, day: date, delta: Dict[str, float]):
+    """
+    Add `delta` to the (user_id, day) rollup row, creating it if needed;
+    each total is clamped at zero
+    """
+    delta = {column: value for column, value in _rounded(delta).items() if value}
+    if not delta:
+        return
+    table = models.UserDailyRollup.__table__
+    stmt = pg_insert(table).values(
+        user_id=user_id, date=day, **{column: max(value, 0) for column, value in delta.items()}
+    )
+    # The raw delta, not excluded: the inserted values are already clamped
+    updates = {column: func.greatest(table.c[column] + value, 0) for column, value in delta.items()}
+    updates["updated_at"] = func.now()
+    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.date], set_=updates))
+
+def apply_meal_deltas(db: Session, deltas: Dict[Tuple[str, date], Dict[str, float]]):
+    """
+    apply_meal_delta for many (user_id, day) rows, in key order: one
+    statement for the deltas that only add, one each for the rest
+    """
+    deltas = {key: _rounded(delta) for key, delta in sorted(deltas.items()) if delta}
+    for (user_id, day), delta in list(deltas.items()):
+        if any(value < 0 for value in delta.values()):
+            apply_meal_delta(db, user_id, day, deltas.pop((user_id, day)))
+    if not deltas:
+        return
+    columns = sorted(set().union(*deltas.values()))
+    table = models.UserDailyRollup.__table__
+    stmt = pg_insert(table).values([
+        {"user_id": user_id, "date": day, **{column: delta.get(column, 0) for column in columns}}
+        for (user_id, day), delta in deltas.items()
+    ])
+    updates = {column: table.c[column] + stmt.excluded[column] for column in columns}
+    updates["updated_at"] = func.now()
+    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.date], set_=updates))
+
+def refresh_task_totals(db: Session, daily_task_ids: Iterable[str]) -> Dict[Tuple[str, date], dict]:
+    """
+    Rebuild task_totals for the days of the given daily tasks; returns the
+    new totals keyed by (user_id, date)
+    """
+    daily_task_ids = list(set(daily_task_ids))
+    if not daily_task_ids:
+        return {}
+    stmt = text(_TASK_TOTALS_SQL.format(
+        where="dt.id IN :ids",
+        returning="RETURNING user_id, date, task_totals"
+    )).bindparams(bindparam("ids", expanding=True))
+    return {(user_id, day): totals for user_id, day, totals in db.execute(stmt, {"ids": daily_task_ids})}
+
+def backfill_users(db: Session, user_ids: List[str]):
+    """Rebuild every rollup row of the given users from meals and tasks"""
+    if not user_ids:
+        return
+    db.query(models.UserDailyRollup).filter(
+        models.UserDailyRollup.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    db.execute(
+        text(_MEAL_BACKFILL_SQL).bindparams(bindparam("user_ids", expanding=True)),
+        {"user_ids": user_ids}
+    )
+    db.execute(
+        text(_TASK_TOTALS_SQL.format(where="dt.user_id IN :ids", returning="")).bindparams(bindparam("ids", expanding=True)),
+        {"ids": user_ids}
+    )
+
+def get_trends(db: Session, user_id: str, days: int, until: date = None) -> List[schemas.DailyRollup]:
+    """
+    The last `days` days up to `until` (default today) from one primary-key
+    range scan; days without activity are returned as zero rows.
+    """
+    until = until or date.today()
+    start = until - timedelta(days=days - 1)
+    rows = db.query(models.UserDailyRollup).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.date.between(start, until)
+    ).order_by(models.UserDailyRollup.date).all()
+
+    by_day = {row.date: row for row in rows}
+    trend = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        trend.append(
+            schemas.DailyRollup.model_validate(row, from_attributes=True) if row
+            else schemas.DailyRollup(date=day)
+        )
+    return trend
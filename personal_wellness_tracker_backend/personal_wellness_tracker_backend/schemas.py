@@ -1,8 +1,11 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Any
+from pydantic import BaseModel, Field, computed_field, field_serializer, field_validator
+from typing import Optional, List, Any, Dict
 from datetime import datetime, date
 from enum import Enum
 
+from .images import variant_urls
+from .storage import canonical_url, resolve_url
+
 # Enums for Pydantic
 class GenderEnum(str, Enum):
     male = "male"
@@ -115,6 +118,12 @@ class MealBase(BaseModel):
     has_nutrition_data: Optional[bool] = False
     image_url: Optional[str] = None
 
+    @field_validator("image_url")
+    @classmethod
+    def store_image_reference(cls, value: Optional[str]) -> Optional[str]:
+        """Accept the client URL of a stored image and keep its storage reference"""
+        return canonical_url(value)
+
 class MealCreate(MealBase):
     food_log_id: str
     user_id: str
@@ -129,15 +138,43 @@ class Meal(MealBase):
     created_at: datetime
     updated_at: datetime
 
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, Dict[str, str]]]:
+        """URLs of the thumb/list/full image variants per format (webp, jpg)"""
+        return variant_urls(self.image_url)
+
+    @field_serializer("image_url")
+    def image_client_url(self, value: Optional[str]) -> Optional[str]:
+        return resolve_url(value)
+
     class Config:
         from_attributes = True
 
+class MealWriteResult(Meal):
+    newly_achieved: List[str] = []  # achievement names unlocked by this write
+
 # Schema สำหรับการอัปโหลดรูปภาพ
 class ImageUploadResponse(BaseModel):
     image_url: str
     file_size: int
-    file_type: str
+    file_type: Optional[str] = None
     uploaded_at: datetime
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
+
+# Direct upload ไปยัง object storage (presigned POST)
+class DirectUploadRequest(BaseModel):
+    content_type: str
+
+class DirectUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]  # ส่งเป็น form fields ก่อน field "file"
+    key: str
+    expires_in: int
+    max_bytes: int
+
+class DirectUploadComplete(BaseModel):
+    key: str
 
 # Schema สำหรับ meal พร้อมข้อมูลโภชนาการ (ถ้าต้องการ)
 class MealWithNutrition(Meal):
@@ -193,6 +230,75 @@ class Task(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskWriteResult(Task):
+    newly_achieved: List[str] = []  # achievement names unlocked by this write
+
+class DailyTaskWithTasks(DailyTask):
+    tasks: List[Task] = []
+
+# Keyset-paginated range pages; pass next_cursor back as ?cursor= for the next page
+class FoodLogPage(BaseModel):
+    items: List[FoodLog]
+    next_cursor: Optional[str] = None
+
+class MealPage(BaseModel):
+    items: List[Meal]
+    next_cursor: Optional[str] = None
+
+class DailyTaskPage(BaseModel):
+    items: List[DailyTaskWithTasks]
+    next_cursor: Optional[str] = None
+
+# Day dashboard (everything the app needs to render one day)
+class DayDashboard(BaseModel):
+    date: date
+    food_log: Optional[FoodLog] = None
+    meals: List[Meal] = []
+    daily_task: Optional[DailyTask] = None
+    tasks: List[Task] = []
+    goals: List[UserGoal] = []
+    streak_count: int = 0
+
+# Daily rollups (trend charts)
+class DailyRollup(BaseModel):
+    date: date
+    calories: int = 0
+    protein: float = 0
+    carbs: float = 0
+    fat: float = 0
+    fiber: float = 0
+    sugar: float = 0
+    meal_count: int = 0
+    breakfast_count: int = 0
+    lunch_count: int = 0
+    dinner_count: int = 0
+    snack_count: int = 0
+    task_totals: Dict[str, Dict[str, float]] = {}
+
+    class Config:
+        from_attributes = True
+
+# Insights (weekly/monthly summaries)
+class WeeklyInsight(BaseModel):
+    week_start: date
+    average: Optional[float] = None
+    delta: Optional[float] = None  # change vs. the previous week's average
+
+class MetricInsight(BaseModel):
+    target: Optional[float] = None
+    average: Optional[float] = None
+    days_logged: int = 0
+    adherence: Optional[float] = None  # share of logged days meeting the goal target
+    week_over_week: Optional[float] = None
+    rolling_7d: List[Optional[float]] = []  # one value per day of the window
+    weekly: List[WeeklyInsight] = []
+
+class Insights(BaseModel):
+    window: str
+    date_from: date
+    date_to: date
+    metrics: Dict[str, MetricInsight]
+
 # Achievement schemas
 class AchievementBase(BaseModel):
     type: Optional[str] = None
@@ -223,6 +329,7 @@ class Achievement(AchievementBase):
 # Nutrition Database schemas
 class NutritionDatabaseBase(BaseModel):
     food_name: str
+    food_name_en: Optional[str] = None
     calories: Optional[float] = None
     protein: Optional[float] = None
     carbs: Optional[float] = None
@@ -235,6 +342,7 @@ class NutritionDatabaseCreate(NutritionDatabaseBase):
 
 class NutritionDatabaseUpdate(BaseModel):
     food_name: Optional[str] = None
+    food_name_en: Optional[str] = None
     calories: Optional[float] = None
     protein: Optional[float] = None
     carbs: Optional[float] = None
@@ -249,6 +357,22 @@ class NutritionDatabase(NutritionDatabaseBase):
     class Config:
         from_attributes = True
 
+class NutritionSearchResult(NutritionDatabase):
+    score: float = 0.0  # 3 = exact, 2 = prefix, 1 = fuzzy; plus word similarity (0-1)
+
+class NutritionImportResult(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int  # same values as stored, or repeated later in the file
+    rejected: int
+    errors: List[str] = []  # first rejected rows
+    seconds: float
+    rows_per_second: float
+
+    class Config:
+        from_attributes = True
+
 # User Preferences schemas
 class UserPreferenceBase(BaseModel):
     theme: ThemeEnum = ThemeEnum.system
@@ -295,6 +419,19 @@ class StandardResponse(BaseModel):
     message: str
     data: Optional[Any] = None
 
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    success: bool
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+    newly_achieved: List[str] = []
+
 class PaginatedResponse(BaseModel):
     success: bool
     message: str
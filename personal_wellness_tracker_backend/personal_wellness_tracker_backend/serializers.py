@@ -0,0 +1,61 @@
+"""
+Fast JSON responses for list endpoints.
+
+The ORM path loads every row into a mapped object, validates it into its
+response_model with from_attributes, dumps the model to a dict and encodes
+that with json. Here the endpoint selects only the columns of the schema,
+a serializer built once per schema turns each row tuple into a dict, and
+orjson encodes the list. The JSON is the same as the response_model output
+(same keys in the same order, image URLs resolved), so the schemas stay the
+documented response models. The serializers trust the database: they do
+not validate anything.
+"""
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import orjson
+from fastapi import Response
+
+from . import models, schemas
+from .images import variant_urls
+from .storage import resolve_url
+
+class RowSerializer:
+    """Dicts in the JSON shape of a schema from rows of its columns"""
+
+    def __init__(self, schema, model, convert: Optional[Dict[str, Callable]] = None,
+                 computed: Optional[Dict[str, tuple]] = None):
+        self.fields = tuple(schema.model_fields)
+        # Select these, in this order, for rows the serializer accepts
+        self.columns = tuple(getattr(model, field) for field in self.fields)
+        self.convert = tuple((self.fields.index(field), field, fn) for field, fn in (convert or {}).items())
+        # Computed fields come last, like in model_dump: {field: (source field, fn)}
+        self.computed = tuple(
+            (field, self.fields.index(source), fn) for field, (source, fn) in (computed or {}).items()
+        )
+
+    def __call__(self, row: Sequence) -> dict:
+        item = dict(zip(self.fields, row))
+        for index, field, fn in self.convert:
+            item[field] = fn(row[index])
+        for field, index, fn in self.computed:
+            item[field] = fn(row[index])
+        return item
+
+meal = RowSerializer(
+    schemas.Meal, models.Meal,
+    convert={"image_url": resolve_url},
+    computed={"image_variants": ("image_url", variant_urls)},
+)
+food_log = RowSerializer(schemas.FoodLog, models.FoodLog)
+achievement = RowSerializer(schemas.Achievement, models.Achievement)
+
+def json_response(content) -> Response:
+    """
+    Response with content already encoded; FastAPI skips response_model
+    validation for it. orjson writes naive datetimes like isoformat() and
+    enums as their value, as the response models do.
+    """
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
+def json_list(serializer: RowSerializer, rows: Iterable[Sequence]) -> Response:
+    return json_response([serializer(row) for row in rows])
@@ -0,0 +1,221 @@
+"""
+Object storage of uploaded files behind one small interface.
+
+Files are addressed by keys such as "meals/ab/cd/<sha256>.full.jpg". The
+database keeps the backend-independent reference "/static/<key>" (see
+images.blob_url); resolve_url() turns it into the URL clients load from
+the configured backend, canonical_url() maps such a URL back.
+
+  - LocalStorage keeps files under UPLOAD_DIR, served by the app at /static.
+  - S3Storage keeps them in a bucket of any S3-compatible service (AWS S3,
+    MinIO, ...) and can hand out presigned POST URLs, so clients upload
+    image bytes straight to the bucket instead of through the API.
+
+All methods are blocking; call them from the threadpool or a worker
+process. boto3 is only needed for STORAGE_BACKEND=s3.
+"""
+import abc
+import mimetypes
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ModuleNotFoundError:
+    boto3 = None
+
+from .core import config
+
+settings = config.get_settings()
+
+STATIC_PREFIX = "/static/"
+# For content-addressed objects: the key always names the same image, but
+# not byte-identical variants (a blob re-stored after collection is
+# transcoded again), so no `immutable` and ETags come from the stored bytes
+LONG_CACHE_CONTROL = "public, max-age=31536000"
+
+class DirectUploadUnsupported(Exception):
+    pass
+
+class StorageBackend(abc.ABC):
+    # Whether clients can upload straight to the backend (presigned_upload)
+    direct_uploads = False
+
+    @abc.abstractmethod
+    def url(self, key: str) -> str:
+        """URL clients load the object from"""
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        """Size of the object in bytes; None if it does not exist"""
+
+    @abc.abstractmethod
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None,
+                 cache_control: Optional[str] = None):
+        """Store the local file at path under key; the local file is consumed"""
+
+    @abc.abstractmethod
+    def download(self, key: str, dest: Path) -> Optional[str]:
+        """Copy the object to a local file; returns its content type. FileNotFoundError if missing"""
+
+    @abc.abstractmethod
+    def delete(self, keys: Iterable[str]):
+        pass
+
+    def presigned_upload(self, key: str, content_type: str, max_bytes: int, expires: int) -> dict:
+        """{"url": ..., "fields": {...}} for a browser form POST of one file to key"""
+        raise DirectUploadUnsupported(type(self).__name__)
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path, base_url: str = STATIC_PREFIX.rstrip("/")):
+        self.root = Path(root)
+        self.base_url = base_url
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None,
+                 cache_control: Optional[str] = None):
+        dest = self.path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(path, 0o644)
+        # Same filesystem (scratch files live under the root): atomic rename
+        os.replace(path, dest)
+
+    def download(self, key: str, dest: Path) -> Optional[str]:
+        shutil.copyfile(self.path(key), dest)
+        return mimetypes.guess_type(key)[0]
+
+    def delete(self, keys: Iterable[str]):
+        for key in keys:
+            try:
+                self.path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+class S3Storage(StorageBackend):
+    direct_uploads = True
+    # delete_objects limit
+    DELETE_BATCH = 1000
+    MISSING_CODES = ("404", "NoSuchKey", "NotFound")
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, public_url: Optional[str] = None,
+                 presign_endpoint_url: Optional[str] = None, region: str = "us-east-1",
+                 access_key_id: Optional[str] = None, secret_access_key: Optional[str] = None):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (poetry install --extras s3)")
+        self.bucket = bucket
+        if not public_url:
+            public_url = f"{endpoint_url}/{bucket}" if endpoint_url else f"https://{bucket}.s3.{region}.amazonaws.com"
+        self.public_url = public_url.rstrip("/")
+        session = boto3.session.Session(
+            aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key, region_name=region
+        )
+        # Path-style addressing works with MinIO and other S3-compatible services
+        boto_config = BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"})
+        self.client = session.client("s3", endpoint_url=endpoint_url, config=boto_config)
+        self.presign_client = session.client(
+            "s3", endpoint_url=presign_endpoint_url, config=boto_config
+        ) if presign_endpoint_url else self.client
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in self.MISSING_CODES:
+                return None
+            raise
+        return response["ContentLength"]
+
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None,
+                 cache_control: Optional[str] = None):
+        extra = {}
+        if content_type:
+            extra["ContentType"] = content_type
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        self.client.upload_file(str(path), self.bucket, key, ExtraArgs=extra)
+        os.unlink(path)
+
+    def download(self, key: str, dest: Path) -> Optional[str]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in self.MISSING_CODES:
+                raise FileNotFoundError(key)
+            raise
+        with open(dest, "wb") as out:
+            for chunk in response["Body"].iter_chunks(1024 * 1024):
+                out.write(chunk)
+        return response.get("ContentType")
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        for i in range(0, len(keys), self.DELETE_BATCH):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                "Objects": [{"Key": key} for key in keys[i:i + self.DELETE_BATCH]], "Quiet": True
+            })
+
+    def presigned_upload(self, key: str, content_type: str, max_bytes: int, expires: int) -> dict:
+        return self.presign_client.generate_presigned_post(
+            self.bucket, key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+            ExpiresIn=expires,
+        )
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            public_url=settings.S3_PUBLIC_URL,
+            presign_endpoint_url=settings.S3_PRESIGN_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+    if settings.STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}")
+    return LocalStorage(Path(settings.UPLOAD_DIR))
+
+def resolve_url(reference: Optional[str]) -> Optional[str]:
+    """Client URL of a stored "/static/<key>" reference; other values unchanged"""
+    if reference and reference.startswith(STATIC_PREFIX):
+        return get_storage().url(reference[len(STATIC_PREFIX):])
+    return reference
+
+def canonical_url(url: Optional[str]) -> Optional[str]:
+    """Inverse of resolve_url for URLs of the configured backend"""
+    base = get_storage().url("")
+    if url and url.startswith(base) and not url.startswith(STATIC_PREFIX):
+        return STATIC_PREFIX + url[len(base):]
+    return url
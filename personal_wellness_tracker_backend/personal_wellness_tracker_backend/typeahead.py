@@ -0,0 +1,612 @@
+"""
+In-process typeahead index over the nutrition catalog.
+
+Food-name autocomplete sends a search per keystroke; once loaded, this
+index answers /nutrition/search/ from memory without touching the
+database, ranked like nutrition.search (3 = exact, 2 = prefix, 1 = word
+prefix or fuzzy, plus trigram similarity).
+
+The catalog is written to a snapshot file that every worker memory-maps,
+so the page cache holds one copy however many workers run:
+  - records: the item fields, search_name first;
+  - name order: records sorted by search_name, so all names starting with
+    the query are one bisected range;
+  - word starts: (record, byte offset) of every later word of every
+    search_name, sorted by the text from there on;
+  - trigrams: sorted trigram keys with posting lists of records, for fuzzy
+    matches (typos, or the middle of a Thai name without word breaks).
+The snapshot uses native byte order; build it on the machine that serves it.
+
+Items created, updated or deleted after the snapshot live in a small
+overlay that shadows their snapshot record. crud puts every write into it,
+and each worker polls last_updated and nutrition_deletions (filled by a
+trigger on every DELETE) every TYPEAHEAD_SYNC_SECONDS for changes made
+elsewhere. All timestamps are database time (now()). `cli build-typeahead`
+rebuilds the snapshot, and so does a worker whose overlay would outgrow
+MAX_OVERLAY_ITEMS; builds take a file lock next to the snapshot, so
+workers that need one at the same time build it once. Workers reload the
+snapshot when the file changes.
+
+Writers replace the overlay with an updated copy instead of changing it,
+so searches read the current (snapshot, overlay) pair without a lock.
+"""
+import asyncio
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    # No build lock (Windows): workers may build a missing snapshot at the same time
+    fcntl = None
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+
+from . import models, nutrition, schemas
+from .core import config
+from .database import SessionLocal
+
+settings = config.get_settings()
+
+# Candidates read per stage (names, later words, fuzzy) beyond the requested results
+EXTRA_CANDIDATES = 12
+# Posting list entries counted for a fuzzy search; longer (common) trigrams are skipped
+FUZZY_BUDGET = 10_000
+# Rows written shortly before a snapshot or poll may carry an older last_updated
+SYNC_OVERLAP = timedelta(minutes=5)
+# More changed items than this (e.g. after a bulk import): rebuild the snapshot instead of growing the overlay
+MAX_OVERLAY_ITEMS = 10_000
+
+_EPOCH = datetime(1970, 1, 1)
+_MAGIC = b"NUTRTA01"
+_HEADER = struct.Struct("=8sIIIQQd")
+_RECORD = struct.Struct("=4H7d")
+_LENGTH = struct.Struct("=H")
+
+class Item(NamedTuple):
+    id: str
+    food_name: str
+    food_name_en: Optional[str]
+    search_name: str
+    calories: Optional[float]
+    protein: Optional[float]
+    carbs: Optional[float]
+    fat: Optional[float]
+    fiber: Optional[float]
+    sugar: Optional[float]
+    last_updated: datetime
+
+    @classmethod
+    def from_row(cls, row) -> "Item":
+        return cls(*(getattr(row, field) for field in cls._fields))
+
+def _padded(search_name: str) -> str:
+    return "".join(f"  {word} " for word in search_name.split())
+
+def trigrams(search_name: str) -> set:
+    """pg_trgm-style trigrams: of each word padded with two spaces before and one after"""
+    padded = _padded(search_name)
+    return {padded[i:i + 3] for i in range(len(padded) - 2) if padded[i + 2] != " " or padded[i + 1] != " "}
+
+def similarity(query_grams: set, search_name: str) -> float:
+    """Share of the query's trigrams found in search_name"""
+    # A padded trigram only occurs in the padded words as a trigram of one of them
+    padded = _padded(search_name)
+    return sum(gram in padded for gram in query_grams) / len(query_grams)
+
+def _gram_key(gram: str) -> int:
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+def _word_starts(name):
+    """Offsets of the words after the first; name is str or bytes, single spaces"""
+    space = " " if isinstance(name, str) else b" "
+    offset = name.find(space)
+    while offset != -1:
+        yield offset + 1
+        offset = name.find(space, offset + 1)
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _sections(records: int, records_bytes: int, words: int, grams: int, postings: int):
+    return [
+        ("record_starts", "Q", records + 1), ("records", "B", records_bytes), ("name_order", "I", records),
+        ("word_records", "I", words), ("word_offsets", "I", words),
+        ("gram_keys", "Q", grams), ("gram_starts", "Q", grams + 1), ("postings", "I", postings),
+    ]
+
+def _timestamp(value: Optional[datetime]) -> float:
+    return (value or _EPOCH).replace(tzinfo=timezone.utc).timestamp()
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+def write_snapshot(path, items: Iterable[Item]) -> int:
+    """Write the snapshot of items to path, replacing it atomically; returns the number of items"""
+    record_starts, records = array("Q", [0]), bytearray()
+    names, grams, watermark = [], defaultdict(lambda: array("I")), 0.0
+    for record, item in enumerate(items):
+        strings = [item.search_name.encode(), item.id.encode(), item.food_name.encode(),
+                   (item.food_name_en or "").encode()]
+        if any(len(s) > 0xFFFF for s in strings):
+            raise ValueError(f"Nutrition item {item.id} has a name longer than 65535 bytes")
+        floats = [math.nan if value is None else value for value in item[4:10]]
+        timestamp = _timestamp(item.last_updated)
+        records += _RECORD.pack(*map(len, strings), *floats, timestamp)
+        for s in strings:
+            records += s
+        record_starts.append(len(records))
+        names.append(strings[0])
+        for gram in trigrams(item.search_name):
+            grams[_gram_key(gram)].append(record)
+        watermark = max(watermark, timestamp)
+
+    name_order = array("I", sorted(range(len(names)), key=names.__getitem__))
+    words = [(record, offset) for record, name in enumerate(names) for offset in _word_starts(name)]
+    words.sort(key=lambda word: names[word[0]][word[1]:])
+    gram_keys = array("Q", sorted(grams))
+    gram_starts, postings = array("Q", [0]), array("I")
+    for key in gram_keys:
+        # Lists longer than a fuzzy search may read are left out
+        if len(grams[key]) <= FUZZY_BUDGET:
+            postings.extend(grams[key])
+        gram_starts.append(len(postings))
+
+    data = {
+        "record_starts": record_starts, "records": records, "name_order": name_order,
+        "word_records": array("I", (record for record, _ in words)),
+        "word_offsets": array("I", (offset for _, offset in words)),
+        "gram_keys": gram_keys, "gram_starts": gram_starts, "postings": postings,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f".{path.name}.{os.getpid()}.part")
+    with open(partial, "wb") as out:
+        out.write(_HEADER.pack(_MAGIC, len(names), len(words), len(gram_keys), len(records), len(postings), watermark))
+        for name, _, _ in _sections(len(names), len(records), len(words), len(gram_keys), len(postings)):
+            out.write(b"\0" * (_align(out.tell()) - out.tell()))
+            out.write(data[name])
+    os.replace(partial, path)
+    return len(names)
+
+class Snapshot:
+    """Read-only view of a snapshot file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, records, words, grams, records_bytes, postings, watermark = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a nutrition typeahead snapshot, rebuild it")
+        self.size = len(self._map)
+        self.watermark = _datetime(watermark)
+        view, offset = memoryview(self._map), _HEADER.size
+        for name, typecode, count in _sections(records, records_bytes, words, grams, postings):
+            offset = _align(offset)
+            nbytes = count * array(typecode).itemsize
+            if name == "records":
+                self._records = offset
+            else:
+                setattr(self, name, view[offset:offset + nbytes].cast(typecode))
+            offset += nbytes
+
+    def __len__(self):
+        return len(self.name_order)
+
+    def _name(self, record: int) -> bytes:
+        start = self._records + self.record_starts[record] + _RECORD.size
+        return self._map[start:start + _LENGTH.unpack_from(self._map, start - _RECORD.size)[0]]
+
+    def _word(self, word: int) -> bytes:
+        return self._name(self.word_records[word])[self.word_offsets[word]:]
+
+    def head(self, record: int) -> tuple:
+        """(id, search_name) of a record"""
+        start = self._records + self.record_starts[record]
+        search_len, id_len = _LENGTH.unpack_from(self._map, start)[0], _LENGTH.unpack_from(self._map, start + 2)[0]
+        start += _RECORD.size
+        return self._map[start + search_len:start + search_len + id_len].decode(), \
+            self._map[start:start + search_len].decode()
+
+    def item(self, record: int) -> Item:
+        start = self._records + self.record_starts[record]
+        search_len, id_len, name_len, name_en_len, *floats, timestamp = _RECORD.unpack_from(self._map, start)
+        start += _RECORD.size
+        strings = []
+        for length in (search_len, id_len, name_len, name_en_len):
+            strings.append(self._map[start:start + length].decode())
+            start += length
+        search_name, item_id, food_name, food_name_en = strings
+        return Item(item_id, food_name, food_name_en or None, search_name,
+                    *(None if value != value else value for value in floats), _datetime(timestamp))
+
+    def name_prefix(self, prefix: bytes, cap: int):
+        order = self.name_order
+        i = bisect_left(order, prefix, key=self._name)
+        while i < len(order) and cap and self._name(order[i]).startswith(prefix):
+            yield order[i]
+            i, cap = i + 1, cap - 1
+
+    def word_prefix(self, prefix: bytes, cap: int):
+        i = bisect_left(range(len(self.word_records)), prefix, key=self._word)
+        while i < len(self.word_records) and cap and self._word(i).startswith(prefix):
+            yield self.word_records[i]
+            i, cap = i + 1, cap - 1
+
+    def posting_list(self, gram: str):
+        """Records containing the trigram; empty for trigrams too common to be listed"""
+        key = _gram_key(gram)
+        i = bisect_left(self.gram_keys, key)
+        if i < len(self.gram_keys) and self.gram_keys[i] == key:
+            return self.postings[self.gram_starts[i]:self.gram_starts[i + 1]]
+        return ()
+
+class Overlay:
+    """Items written and ids deleted since the snapshot, with the same lookups"""
+
+    def __init__(self):
+        self.items: Dict[str, Item] = {}
+        self.deleted = set()
+        self.names: List[tuple] = []
+        self.words: List[tuple] = []
+        self.grams = defaultdict(set)
+
+    def __len__(self):
+        return len(self.items) + len(self.deleted)
+
+    def copy(self) -> "Overlay":
+        other = Overlay()
+        other.items, other.deleted = dict(self.items), set(self.deleted)
+        other.names, other.words = list(self.names), list(self.words)
+        other.grams = defaultdict(set, {gram: set(ids) for gram, ids in self.grams.items()})
+        return other
+
+    def _drop(self, previous: Item):
+        self.names.pop(bisect_left(self.names, (previous.search_name, previous.id)))
+        for offset in _word_starts(previous.search_name):
+            self.words.pop(bisect_left(self.words, (previous.search_name[offset:], previous.id)))
+        for gram in trigrams(previous.search_name):
+            self.grams[gram].discard(previous.id)
+        del self.items[previous.id]
+
+    def put(self, item: Item):
+        previous = self.items.get(item.id)
+        # A poll may read a row before a newer write of it was put here
+        if previous and (previous == item or previous.last_updated > item.last_updated):
+            return
+        if previous:
+            self._drop(previous)
+        self.deleted.discard(item.id)
+        self.items[item.id] = item
+        insort(self.names, (item.search_name, item.id))
+        for offset in _word_starts(item.search_name):
+            insort(self.words, (item.search_name[offset:], item.id))
+        for gram in trigrams(item.search_name):
+            self.grams[gram].add(item.id)
+
+    def remove(self, item_id: str):
+        """Hide a deleted item, whether it is in the snapshot or the overlay"""
+        if item_id in self.items:
+            self._drop(self.items[item_id])
+        self.deleted.add(item_id)
+
+    @staticmethod
+    def _prefix(entries: List[tuple], prefix: str, cap: int):
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and cap and entries[i][0].startswith(prefix):
+            yield entries[i][1]
+            i, cap = i + 1, cap - 1
+
+    def name_prefix(self, prefix: str, cap: int):
+        return self._prefix(self.names, prefix, cap)
+
+    def word_prefix(self, prefix: str, cap: int):
+        return self._prefix(self.words, prefix, cap)
+
+    def approx_bytes(self) -> int:
+        size = sum(sys.getsizeof(value) for item in self.items.values() for value in item)
+        size += sum(sys.getsizeof(entry) + sys.getsizeof(entry[0]) for entry in self.names + self.words)
+        size += sum(sys.getsizeof(ids) for ids in self.grams.values())
+        return size + sys.getsizeof(self.items) + sys.getsizeof(self.grams)
+
+class TypeaheadIndex:
+    def __init__(self):
+        # (snapshot, overlay), replaced as a whole; writers serialize on _lock
+        self._state = (None, Overlay())
+        self.path: Optional[Path] = None
+        self.watermark = _EPOCH
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        return self._state[0]
+
+    @property
+    def overlay(self) -> Overlay:
+        return self._state[1]
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def load(self, db, path):
+        """Map the snapshot at path and catch up with changes made after it was built"""
+        snapshot = Snapshot(path)
+        changes = _changes_since(db, snapshot.watermark - SYNC_OVERLAP)
+        if len(changes[0]) + len(changes[1]) > MAX_OVERLAY_ITEMS:
+            ensure_snapshot(db, path, stale_mtime=snapshot.mtime)
+            snapshot = Snapshot(path)
+            changes = _changes_since(db, snapshot.watermark - SYNC_OVERLAP)
+        overlay, watermark = _applied(Overlay(), snapshot.watermark, *changes)
+        with self._lock:
+            self._state, self.path, self.watermark = (snapshot, overlay), Path(path), watermark
+
+    def upsert(self, row):
+        """Add or replace a catalog item after its write was committed"""
+        item = Item.from_row(row)
+        with self._lock:
+            overlay = self.overlay.copy()
+            overlay.put(item)
+            self._state = (self.snapshot, overlay)
+
+    def sync(self, db):
+        """Reload a rebuilt snapshot, or pick up changes made through other workers"""
+        if os.stat(self.path).st_mtime_ns != self.snapshot.mtime:
+            self.load(db, self.path)
+            return
+        rows, deletions = _changes_since(db, self.watermark - SYNC_OVERLAP)
+        if len(self.overlay) + len(rows) + len(deletions) > MAX_OVERLAY_ITEMS:
+            built = ensure_snapshot(db, self.path, stale_mtime=self.snapshot.mtime, wait=False)
+            if not built and _mtime(self.path) == self.snapshot.mtime:
+                return  # Built elsewhere (e.g. after an import): reload it at a later sync
+            self.load(db, self.path)
+            return
+        if not rows and not deletions:
+            return
+        with self._lock:
+            overlay, self.watermark = _applied(self.overlay.copy(), self.watermark, rows, deletions)
+            self._state = (self.snapshot, overlay)
+
+    def search(self, query: str, limit: int = 20) -> List[schemas.NutritionSearchResult]:
+        """
+        Same ranking as nutrition.search over a bounded set of candidates per
+        stage. Blocking (snapshot pages may be read from disk): call it from
+        the threadpool.
+        """
+        normalized = nutrition.normalize_name(query)
+        if not normalized:
+            return []
+        limit = min(limit, nutrition.MAX_RESULTS)
+        cap = limit + EXTRA_CANDIDATES
+        prefix = normalized.encode()
+        # id -> (rank, matched by prefix, search_name, snapshot record or overlay Item)
+        found: Dict[str, tuple] = {}
+        snapshot, overlay = self._state
+
+        def add_records(records, rank: int, prefix_match: bool = True):
+            for record in records:
+                item_id, search_name = snapshot.head(record)
+                if item_id not in found and item_id not in overlay.items and item_id not in overlay.deleted:
+                    found[item_id] = (3 if search_name == normalized else rank, prefix_match, search_name, record)
+
+        def add_items(ids, rank: int, prefix_match: bool = True):
+            for item_id in ids:
+                item = overlay.items[item_id]
+                if item_id not in found:
+                    found[item_id] = (3 if item.search_name == normalized else rank, prefix_match,
+                                      item.search_name, item)
+
+        add_records(snapshot.name_prefix(prefix, cap), 2)
+        add_items(overlay.name_prefix(normalized, cap), 2)
+        # Later-word and fuzzy matches score at most 2: only needed while prefix matches are short
+        if len(found) < limit:
+            add_records(snapshot.word_prefix(prefix, cap), 1)
+            add_items(overlay.word_prefix(normalized, cap), 1)
+        query_grams = trigrams(normalized)
+        if len(found) < limit:
+            add_records(_fuzzy(snapshot, query_grams, cap), 1, prefix_match=False)
+            ids = Counter(i for gram in query_grams for i in overlay.grams.get(gram, ()))
+            add_items((i for i, _ in ids.most_common(cap)), 1, prefix_match=False)
+
+        results = []
+        for item_id, (rank, prefix_match, search_name, source) in found.items():
+            score = similarity(query_grams, search_name)
+            if prefix_match or score >= nutrition.WORD_SIMILARITY_THRESHOLD:
+                results.append((-(rank + score), len(search_name), item_id, source))
+        results.sort(key=lambda result: result[:3])
+        return [
+            schemas.NutritionSearchResult(
+                **(source if isinstance(source, Item) else snapshot.item(source))._asdict(),
+                score=round(-score, 4),
+            )
+            for score, _, _, source in results[:limit]
+        ]
+
+    def memory_report(self) -> dict:
+        """Snapshot bytes are file-backed pages shared by all workers; the overlay is per-worker heap"""
+        snapshot, overlay = self._state
+        snapshot_items = len(snapshot) if snapshot else 0
+        snapshot_bytes = snapshot.size if snapshot else 0
+        overlay_bytes = overlay.approx_bytes()
+        items = snapshot_items + len(overlay)
+        return {
+            "pid": os.getpid(),
+            "ready": self.ready,
+            "items": items,
+            "snapshot_items": snapshot_items,
+            "overlay_items": len(overlay),
+            "snapshot_bytes": snapshot_bytes,
+            "overlay_bytes": overlay_bytes,
+            "bytes_per_100k_items": round((snapshot_bytes + overlay_bytes) * 100_000 / items) if items else 0,
+        }
+
+def _fuzzy(snapshot: Snapshot, query_grams: set, cap: int):
+    """Snapshot records sharing the most trigrams with the query, rarest trigrams first"""
+    lists = sorted((snapshot.posting_list(gram) for gram in query_grams), key=len)
+    counts, budget = Counter(), FUZZY_BUDGET
+    for postings in lists:
+        if len(postings) > budget:
+            break
+        counts.update(postings)
+        budget -= len(postings)
+    return (record for record, _ in counts.most_common(cap))
+
+def _changes_since(db, since: datetime):
+    """
+    (rows written, tombstones of rows deleted) since `since`, oldest first;
+    at most MAX_OVERLAY_ITEMS + 1 of each
+    """
+    item, deletion = models.NutritionDatabase, models.NutritionDeletion
+    rows = db.query(item).filter(item.last_updated >= since).order_by(item.last_updated).limit(
+        MAX_OVERLAY_ITEMS + 1
+    ).all()
+    deletions = db.query(deletion).filter(deletion.deleted_at >= since).order_by(deletion.deleted_at).limit(
+        MAX_OVERLAY_ITEMS + 1
+    ).all()
+    return rows, deletions
+
+def _applied(overlay: Overlay, watermark: datetime, rows, deletions):
+    """
+    Put changes into overlay and return it with the new watermark.
+    Tombstones go first: a row written after its tombstone was inserted
+    again and stays.
+    """
+    for tombstone in deletions:
+        overlay.remove(tombstone.id)
+        watermark = max(watermark, tombstone.deleted_at)
+    for row in rows:
+        overlay.put(Item.from_row(row))
+        watermark = max(watermark, row.last_updated or _EPOCH)
+    return overlay, watermark
+
+@contextmanager
+def _build_lock(path, wait: bool = True):
+    """
+    Exclusive lock on a file next to the snapshot, held while one process
+    builds it. Yields False when wait is off and another process holds it.
+    """
+    if fcntl is None:
+        yield True
+        return
+    lock_path = Path(path).with_name(f".{Path(path).name}.lock")
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _mtime(path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def build_snapshot(db, path) -> int:
+    """
+    Write a snapshot of the whole catalog, streamed from the database.
+    Tombstones from before the snapshot's overlap are pruned: the rows are
+    not in it, and workers only poll from its watermark once they load it.
+    """
+    columns = [getattr(models.NutritionDatabase, field) for field in Item._fields]
+    rows = db.execute(select(*columns).execution_options(yield_per=10_000))
+    count = write_snapshot(path, (Item(*row) for row in rows))
+    cutoff = Snapshot(path).watermark - SYNC_OVERLAP
+    db.execute(delete(models.NutritionDeletion).where(models.NutritionDeletion.deleted_at < cutoff))
+    db.commit()
+    return count
+
+def rebuild_snapshot(db, path) -> int:
+    """Build the snapshot under the build lock; workers reload it on their next sync"""
+    with _build_lock(path):
+        return build_snapshot(db, path)
+
+def ensure_snapshot(db, path, stale_mtime: Optional[int] = None, wait: bool = True) -> bool:
+    """
+    Build the snapshot if it is missing, or still the file with mtime
+    stale_mtime. Processes that wait on the lock find it built and skip;
+    without wait, a build in progress elsewhere is skipped too.
+    """
+    with _build_lock(path, wait) as locked:
+        if not locked or (_mtime(path) is not None and _mtime(path) != stale_mtime):
+            return False
+        build_snapshot(db, path)
+        return True
+
+@contextmanager
+def bulk_write(db):
+    """
+    Around a bulk catalog write (nutrition_import): holds the build lock so
+    workers whose overlay overflows wait instead of building from a partial
+    catalog, then rebuilds the snapshot once and reloads this process's
+    index. Nothing is rebuilt if the write fails.
+    """
+    path = settings.TYPEAHEAD_SNAPSHOT
+    if not path:
+        yield
+        return
+    with _build_lock(path):
+        yield
+        build_snapshot(db, path)
+    if index.ready:
+        index.sync(db)
+
+index = TypeaheadIndex()
+_sync_task: Optional[asyncio.Task] = None
+
+def open_index(path):
+    db = SessionLocal()
+    try:
+        if not os.path.exists(path) and ensure_snapshot(db, path):
+            print(f"WARN: nutrition typeahead snapshot {path} not found, built it")
+        index.load(db, path)
+    finally:
+        db.close()
+
+def _sync():
+    db = SessionLocal()
+    try:
+        index.sync(db)
+    finally:
+        db.close()
+
+async def _sync_forever():
+    while True:
+        await asyncio.sleep(settings.TYPEAHEAD_SYNC_SECONDS)
+        try:
+            await run_in_threadpool(_sync)
+        except Exception as e:
+            print(f"WARN: nutrition typeahead sync failed: {e}")
+
+async def start():
+    """Load the index of this worker (searches use the database until then) and keep it in sync"""
+    global _sync_task
+    if not settings.TYPEAHEAD_SNAPSHOT:
+        return
+    try:
+        await run_in_threadpool(open_index, settings.TYPEAHEAD_SNAPSHOT)
+    except Exception as e:
+        print(f"WARN: nutrition typeahead index not loaded, searching the database: {e}")
+        return
+    _sync_task = asyncio.create_task(_sync_forever())
+
+def stop():
+    if _sync_task:
+        _sync_task.cancel()
@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+from personal_wellness_tracker_backend import achievements, crud, models, schemas
+
+DAYS = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+
+
+@pytest.fixture
+def water_days(db, user):
+    """Water tasks of 1, 2 and 3 litres on three days, before the user has any goal"""
+    achievements.register_handlers()
+    achievements.seed_defaults(db, [user.uid])
+    for n, day in enumerate(DAYS, start=1):
+        db.add(models.DailyTask(id=f"daily-{n}", user_id=user.uid, date=day))
+        db.add(models.Task(id=f"task-{n}", daily_task_id=f"daily-{n}", task_type="water", value_number=n))
+    db.flush()
+
+
+def goal_progress(db, user):
+    achievement = db.query(models.Achievement).filter_by(user_id=user.uid, type="goal_achievement").one()
+    db.refresh(achievement)
+    return achievement.current
+
+
+def test_new_goal_counts_the_days_already_reaching_it(db, user, water_days):
+    crud.create_user_goal(db, schemas.UserGoalCreate(user_id=user.uid, goal_water_intake=2))
+    assert goal_progress(db, user) == 2
+
+
+def test_raising_a_goal_takes_back_days_below_it(db, user, water_days):
+    goal = crud.create_user_goal(db, schemas.UserGoalCreate(user_id=user.uid, goal_water_intake=2))
+    assert goal_progress(db, user) == 2
+    crud.update_user_goal(db, goal.id, schemas.UserGoalUpdate(goal_water_intake=3))
+    assert goal_progress(db, user) == 1
+    crud.update_user_goal(db, goal.id, schemas.UserGoalUpdate(is_active=False))
+    assert goal_progress(db, user) == 0
@@ -0,0 +1,112 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from personal_wellness_tracker_backend import crud, enrichment, models, schemas
+
+
+def catalog_item(food_name, food_name_en=None, **nutrients):
+    return schemas.NutritionSearchResult(
+        id=f"item-{food_name}", food_name=food_name, food_name_en=food_name_en,
+        last_updated=datetime(2024, 1, 1), **({"protein": 5.0} | nutrients),
+    )
+
+
+class FakeIndex:
+    """Stands in for a loaded typeahead index: returns the given items for every query"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def search(self, query, limit=20):
+        self.queries.append(query)
+        return self.results[:limit]
+
+
+@pytest.mark.parametrize("a, b, accepted", [
+    ("ข้าวผัดกระเพราไก่", "ข้าวผัดกะเพราไก่", True),  # typo
+    ("ข้าว", "ข้าวผัด", False),  # prefix
+    ("ขาว", "ข้าว", False),  # only a tone mark apart
+    ("pad thai", "pad thai with shrimp", False),
+])
+def test_name_similarity_accepts_typos_not_prefixes(a, b, accepted):
+    similarity = enrichment.name_similarity(enrichment.match_name(a), enrichment.match_name(b))
+    assert (similarity >= enrichment.settings.ENRICH_MIN_SIMILARITY) is accepted
+    assert similarity == enrichment.name_similarity(enrichment.match_name(b), enrichment.match_name(a))
+
+
+def test_match_name_keeps_tone_marks():
+    assert enrichment.match_name("  Pad   THAI ") == "pad thai"
+    assert enrichment.match_name("ข้าว") != enrichment.match_name("ขาว")
+
+
+def test_exact_name_wins_over_better_ranked_results():
+    index = FakeIndex(catalog_item("ข้าวผัด"), catalog_item("ขาว"), catalog_item("ข้าว"))
+    match = enrichment.Matcher(None, index=index).match("ข้าว")
+    assert match.food_name == "ข้าว"
+
+
+def test_english_name_matches_too():
+    index = FakeIndex(catalog_item("ผัดไทย", "Pad Thai"))
+    assert enrichment.Matcher(None, index=index).match("pad thai").food_name == "ผัดไทย"
+
+
+@pytest.mark.parametrize("results", [
+    [],
+    [catalog_item("ข้าวผัด")],  # prefix hit
+    [catalog_item("ข้าว")],  # same search_name, another food
+    [catalog_item("ขาว", protein=None)],  # exact, but no nutrients to fill in
+])
+def test_no_match_below_threshold(results):
+    assert enrichment.Matcher(None, index=FakeIndex(*results)).match("ขาว") is None
+
+
+def test_most_similar_result_above_threshold_is_chosen():
+    index = FakeIndex(catalog_item("ข้าวผัดกะเพราหมู"), catalog_item("ข้าวผัดกะเพราไก่"))
+    match = enrichment.Matcher(None, index=index).match("ข้าวผัดกระเพราไก่")
+    assert match.food_name == "ข้าวผัดกะเพราไก่"
+
+
+def test_matches_and_misses_are_cached_per_name():
+    index = FakeIndex()
+    matcher = enrichment.Matcher(None, index=index)
+    for name in ("ขาว", " ขาว", "ขาว"):
+        assert matcher.match(name) is None
+    assert index.queries == ["ขาว"]
+    assert (matcher.hits, matcher.misses) == (2, 1)
+
+
+@pytest.fixture
+def meals(db, user):
+    db.execute(text("DELETE FROM nutrition_database"))
+    db.add(models.NutritionDatabase(id="rice", food_name="ข้าว", search_name="ขาว", protein=5.0, last_updated=datetime(2024, 1, 1)))
+    db.add(models.FoodLog(id="log", user_id=user.uid, date=date(2024, 1, 1)))
+    for n, name in enumerate(["ข้าว", "ขาว", None]):
+        db.add(models.Meal(id=f"meal-{n}", food_log_id="log", user_id=user.uid, food_name=name,
+                           created_at=datetime(2024, 1, 1, 12, n)))
+    db.flush()
+
+
+def pending(db):
+    """This test's meals among the pending ones (the database may hold others)"""
+    return [meal for meal in enrichment.pending_meals(db, None, 10_000) if meal.id.startswith("meal-")]
+
+
+def test_unmatched_meals_leave_the_scan_until_the_catalog_changes(db, meals):
+    batch = pending(db)
+    assert [meal.id for meal in batch] == ["meal-0", "meal-1", "meal-2"]
+    assert enrichment.enrich(db, batch, enrichment.Matcher(db)) == 1
+    assert db.get(models.Meal, "meal-0").protein == 5.0
+    assert pending(db) == []
+
+    db.execute(text("UPDATE nutrition_database SET last_updated = now() + interval '1 minute'"))
+    enrichment.recheck_unmatched(db)
+    assert [meal.id for meal in pending(db)] == ["meal-1", "meal-2"]
+
+
+def test_renamed_meal_is_matched_again(db, meals):
+    enrichment.enrich(db, pending(db), enrichment.Matcher(db))
+    crud.update_meal(db, "meal-1", schemas.MealUpdate(food_name="ข้าว"))
+    assert [meal.id for meal in pending(db)] == ["meal-1"]
@@ -0,0 +1,84 @@
+import hashlib
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from personal_wellness_tracker_backend import image_blobs, images, models, storage
+
+DIGEST = hashlib.sha256(b"meal photo").hexdigest()
+OTHER = hashlib.sha256(b"other photo").hexdigest()
+
+
+def refcount(db, digest):
+    return db.execute(text("SELECT refcount FROM image_blobs WHERE hash = :hash"), {"hash": digest}).scalar()
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    backend = storage.LocalStorage(tmp_path)
+    monkeypatch.setattr(storage, "get_storage", lambda: backend)
+    return backend
+
+
+def store(backend, digest):
+    for key in images.blob_keys(digest):
+        backend.path(key).parent.mkdir(parents=True, exist_ok=True)
+        backend.path(key).write_bytes(b"x")
+
+
+def test_blob_hash_only_accepts_content_addressed_urls():
+    assert images.blob_hash(images.blob_url(DIGEST, "list", "webp")) == DIGEST
+    assert images.blob_hash(f"/static/meals/00/00/{DIGEST}.full.jpg") is None  # wrong shard
+    assert images.blob_hash("https://example.com/a.jpg") is None
+    assert images.blob_hash(None) is None
+
+
+def test_refs_are_counted_per_meal_url(db):
+    image_blobs.register(db, DIGEST, 100)
+    image_blobs.register(db, OTHER, 100)
+    image_blobs.adjust_refs(db, added=[images.blob_url(DIGEST), images.blob_url(DIGEST, "thumb", "webp"),
+                                       images.blob_url(OTHER), None, "https://example.com/a.jpg"])
+    assert (refcount(db, DIGEST), refcount(db, OTHER)) == (2, 1)
+
+    # Moving a meal from one image to the other in a single write
+    image_blobs.adjust_refs(db, added=[images.blob_url(OTHER)], removed=[images.blob_url(DIGEST)])
+    assert (refcount(db, DIGEST), refcount(db, OTHER)) == (1, 2)
+
+
+def test_dropping_refs_never_goes_below_zero(db):
+    image_blobs.register(db, DIGEST, 100)
+    image_blobs.adjust_refs(db, removed=[images.blob_url(DIGEST)] * 3)
+    assert refcount(db, DIGEST) == 0
+
+
+def test_unknown_blob_is_rejected(db):
+    with pytest.raises(image_blobs.UnknownImage, match=DIGEST):
+        image_blobs.adjust_refs(db, added=[images.blob_url(DIGEST)])
+    assert image_blobs.unknown_urls(db, [images.blob_url(DIGEST), "https://example.com/a.jpg"]) == {
+        images.blob_url(DIGEST)
+    }
+
+
+def test_recount_repairs_counts_from_meals(db, user):
+    image_blobs.register(db, DIGEST, 100)
+    db.add(models.FoodLog(id="log", user_id=user.uid, date=date(2024, 1, 1)))
+    db.add(models.Meal(id="meal", food_log_id="log", user_id=user.uid, image_url=images.blob_url(DIGEST)))
+    db.flush()
+    db.execute(text("UPDATE image_blobs SET refcount = 5 WHERE hash = :hash"), {"hash": DIGEST})
+    assert image_blobs.recount(db, [DIGEST]) == 1
+    assert refcount(db, DIGEST) == 1
+
+
+def test_gc_collects_only_unreferenced_blobs_past_the_grace_period(db, local_storage):
+    for digest in (DIGEST, OTHER):
+        image_blobs.register(db, digest, 100)
+        store(local_storage, digest)
+    image_blobs.adjust_refs(db, added=[images.blob_url(OTHER)])
+    db.execute(text("UPDATE image_blobs SET updated_at = now() - interval '2 hours'"))
+
+    assert image_blobs.collect_garbage(db, grace_hours=3, limit=10) == []
+    assert image_blobs.collect_garbage(db, grace_hours=1, limit=10) == [DIGEST]
+    assert refcount(db, DIGEST) is None
+    assert not any(local_storage.exists(key) for key in images.blob_keys(DIGEST))
+    assert all(local_storage.exists(key) for key in images.blob_keys(OTHER))
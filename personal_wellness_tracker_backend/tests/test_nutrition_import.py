@@ -0,0 +1,103 @@
+import io
+import unicodedata
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from personal_wellness_tracker_backend import models, nutrition_import
+from personal_wellness_tracker_backend.nutrition import normalize_name
+
+
+@pytest.fixture
+def empty_catalog(db):
+    """Start from an empty catalog (rolled back with the test)"""
+    db.execute(text("DELETE FROM nutrition_database"))
+
+
+def run_import(db, content: str, fmt: str = "csv", **kwargs):
+    result = nutrition_import.import_stream(db, io.StringIO(content), fmt, **kwargs)
+    # ON COMMIT DELETE ROWS does not fire inside the test's outer transaction
+    db.execute(text("DELETE FROM nutrition_import"))
+    return result
+
+
+def items(db):
+    return {
+        row.food_name: row
+        for row in db.query(models.NutritionDatabase).order_by(models.NutritionDatabase.food_name)
+    }
+
+
+def test_item_id_is_stable_and_tells_names_apart():
+    assert nutrition_import.item_id("ข้าว", None) == nutrition_import.item_id("ข้าว", None)
+    # Same search_name, different foods
+    assert normalize_name("ข้าว") == normalize_name("ขาว")
+    assert nutrition_import.item_id("ข้าว", None) != nutrition_import.item_id("ขาว", None)
+    assert nutrition_import.item_id("ข้าว", "Rice") != nutrition_import.item_id("ข้าว", None)
+    assert nutrition_import.item_id("ข้าว", "rice") != nutrition_import.item_id("ข้าวrice", None)
+    # Canonically equivalent spellings get the same id
+    assert nutrition_import.item_id(unicodedata.normalize("NFD", "Café"), None) == nutrition_import.item_id("Café", None)
+
+
+def test_staging_row_validates_values():
+    row = nutrition_import.staging_row(2, {"food_name": " ข้าวผัด ", "food_name_en": "", "calories": "250", "fat": ""})
+    line, row_id, food_name, food_name_en, search_name, calories, protein, carbs, fat, fiber, sugar, legacy_id = row
+    assert (line, food_name, food_name_en, search_name) == (2, "ข้าวผัด", None, normalize_name("ข้าวผัด"))
+    assert row_id == nutrition_import.item_id("ข้าวผัด", None)
+    assert (calories, protein, fat) == (250.0, None, None)
+    assert legacy_id == str(uuid.uuid5(nutrition_import.NAMESPACE, search_name))
+    own = nutrition_import.staging_row(2, {"id": "own-id", "food_name": "x"})
+    assert (own[1], own[-1]) == ("own-id", None)
+
+    for record, reason in [
+        ({"food_name": ""}, "food_name is empty"),
+        ({"food_name": "x", "calories": "lots"}, "calories is not a number"),
+        ({"food_name": "x", "protein": -1}, "protein must be a non-negative number"),
+        ({"food_name": "x", "sugar": "nan"}, "sugar must be a non-negative number"),
+    ]:
+        with pytest.raises(ValueError, match=reason):
+            nutrition_import.staging_row(1, record)
+
+
+def test_read_rows_requires_a_food_name_column():
+    with pytest.raises(nutrition_import.ImportFormatError):
+        list(nutrition_import.read_rows(io.StringIO("name,calories\nx,1\n"), "csv"))
+
+
+def test_import_inserts_then_updates_only_changed_rows(db, empty_catalog):
+    result = run_import(db, "food_name,food_name_en,calories\nข้าว,Rice,130\nขาว,,0\nต้มยำ,,90\n,,1\nแกง,,abc\n")
+    assert (result.rows, result.inserted, result.updated, result.rejected) == (5, 3, 0, 2)
+    assert [error.split(":")[0] for error in result.errors] == ["line 5", "line 6"]
+    assert set(items(db)) == {"ข้าว", "ขาว", "ต้มยำ"}
+
+    result = run_import(db, '{"food_name": "ข้าว", "food_name_en": "Rice", "calories": 140}\n'
+                            '{"food_name": "ต้มยำ", "calories": 90}\n', "jsonl")
+    assert (result.inserted, result.updated, result.unchanged) == (0, 1, 1)
+    assert items(db)["ข้าว"].calories == 140
+    assert items(db)["ข้าว"].id == nutrition_import.item_id("ข้าว", "Rice")
+
+
+def test_last_row_of_an_id_wins(db, empty_catalog):
+    result = run_import(db, "id,food_name,calories\na,ข้าว,1\na,ข้าว,2\n")
+    assert (result.inserted, items(db)["ข้าว"].calories) == (1, 2)
+
+
+def test_batches_commit_as_they_go(db, empty_catalog):
+    progress = []
+    content = "food_name\n" + "".join(f"item {n}\n" for n in range(25))
+    result = run_import(db, content, batch_size=10, progress=lambda r: progress.append(r.inserted))
+    assert result.inserted == 25
+    assert progress == [10, 20, 25]
+
+
+def test_items_imported_under_the_old_id_are_rekeyed(db, empty_catalog):
+    legacy_id = str(uuid.uuid5(nutrition_import.NAMESPACE, normalize_name("ข้าว")))
+    db.add(models.NutritionDatabase(id=legacy_id, food_name="ข้าว", search_name=normalize_name("ข้าว"), calories=1))
+    db.flush()
+    result = run_import(db, "food_name,calories\nข้าว,130\nขาว,0\n")
+    assert result.inserted == 2
+    assert {name: row.id for name, row in items(db).items()} == {
+        "ข้าว": nutrition_import.item_id("ข้าว", None),
+        "ขาว": nutrition_import.item_id("ขาว", None),
+    }
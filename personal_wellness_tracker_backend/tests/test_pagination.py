@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+import pytest
+
+from personal_wellness_tracker_backend import crud, models
+
+START = date(2024, 1, 1)
+
+
+def test_cursor_round_trip():
+    cursor = crud.encode_cursor(date(2024, 2, 29), "meal-ข้าว/1")
+    assert "=" not in cursor
+    assert crud.decode_cursor(cursor) == (date(2024, 2, 29), "meal-ข้าว/1")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    crud.encode_cursor(date(2024, 1, 1), "x")[:-4],
+    "WyIyMDI0LTEzLTAxIiwgIngiXQ",  # ["2024-13-01", "x"]
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        crud.decode_cursor(cursor)
+
+
+@pytest.fixture
+def meals(db, user):
+    """Three meals a day for ten days, ids out of insertion order"""
+    expected = []
+    for day in range(10):
+        log = models.FoodLog(id=f"log-{day}", user_id=user.uid, date=START + timedelta(days=day))
+        db.add(log)
+        for n in (2, 0, 1):
+            meal = models.Meal(id=f"meal-{day}-{n}", food_log_id=log.id, user_id=user.uid, food_name="ข้าว")
+            db.add(meal)
+            expected.append(meal.id)
+    db.flush()
+    return sorted(expected)
+
+
+def walk(fetch, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = fetch(cursor=cursor, limit=limit)
+        ids.extend(item.id for item in page.items)
+        pages += 1
+        if page.next_cursor is None:
+            return ids, pages
+        cursor = page.next_cursor
+
+
+@pytest.mark.parametrize("limit", [1, 4, 30, 50])
+def test_meal_pages_cover_the_range_once_in_order(db, user, meals, limit):
+    def fetch(**kwargs):
+        return crud.get_meals_range(db, user.uid, START, START + timedelta(days=9), **kwargs)
+    ids, pages = walk(fetch, limit)
+    assert ids == meals
+    # The extra row fetched per page means no empty page after an exact multiple
+    assert pages == max(1, -(-len(meals) // limit))
+
+
+def test_food_log_pages_stop_at_date_to(db, user, meals):
+    def fetch(**kwargs):
+        return crud.get_food_logs_range(db, user.uid, START + timedelta(days=2), START + timedelta(days=5), **kwargs)
+    ids, _ = walk(fetch, 3)
+    assert ids == [f"log-{day}" for day in range(2, 6)]
@@ -0,0 +1,83 @@
+import hashlib
+import json
+from datetime import date, datetime
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from personal_wellness_tracker_backend import images, models, schemas, serializers
+
+DIGEST = hashlib.sha256(b"meal photo").hexdigest()
+CREATED = datetime(2024, 1, 1, 7, 30, 0, 123456)
+
+VALUES = {
+    "id": "meal-1",
+    "user_id": "user-1",
+    "food_log_id": "log-1",
+    "food_name": "ข้าวผัดกะเพราไก่",
+    "description": None,
+    "meal_type": models.MealTypeEnum.lunch,
+    "calories": 550,
+    "protein": 25.5,
+    "carbs": 60.0,
+    "fat": None,
+    "fiber": None,
+    "sugar": 3.0,
+    "has_nutrition_data": True,
+    "created_at": CREATED,
+    "updated_at": CREATED,
+    "date": date(2024, 1, 1),
+    "total_calories": 1200,
+    "meal_count": 3,
+    "type": "first_meal",
+    "name": "First meal",
+    "target": 1,
+    "current": 1,
+    "achieved": True,
+    "achieved_at": CREATED,
+}
+
+
+def row_for(serializer, **values):
+    values = VALUES | values
+    return tuple(values[field] for field in serializer.fields)
+
+
+def response_model_json(schema, serializer, row):
+    """What FastAPI returns for the ORM object through response_model"""
+    return jsonable_encoder(schema.model_validate(dict(zip(serializer.fields, row))))
+
+
+@pytest.mark.parametrize("image_url", [
+    images.blob_url(DIGEST),
+    "/static/meals/legacy.jpg",
+    "https://example.com/a.jpg",
+    None,
+])
+def test_meal_matches_response_model(image_url):
+    row = row_for(serializers.meal, image_url=image_url)
+    body = json.loads(orjson.dumps(serializers.meal(row)))
+    expected = response_model_json(schemas.Meal, serializers.meal, row)
+    assert body == expected
+    assert list(body) == list(expected)
+
+
+def test_meal_variants_are_client_urls():
+    body = serializers.meal(row_for(serializers.meal, image_url=images.blob_url(DIGEST)))
+    assert body["image_url"].endswith(f"{DIGEST}.full.jpg")
+    assert set(body["image_variants"]) == set(images.IMAGE_VARIANTS)
+    assert set(body["image_variants"]["thumb"]) == set(images.VARIANT_FORMATS)
+
+
+@pytest.mark.parametrize("schema, serializer", [
+    (schemas.FoodLog, serializers.food_log),
+    (schemas.Achievement, serializers.achievement),
+])
+def test_lists_match_response_model(schema, serializer):
+    row = row_for(serializer)
+    response = serializers.json_list(serializer, [row, row])
+    assert response.media_type == "application/json"
+    expected = response_model_json(schema, serializer, row)
+    assert json.loads(response.body) == [expected, expected]
+    assert list(json.loads(response.body)[0]) == list(expected)
@@ -0,0 +1,101 @@
+from datetime import date, timedelta
+
+from personal_wellness_tracker_backend import crud, models
+
+TODAY = date.today()
+
+
+def add_day(db, user, days_ago: int, tasks: int = 1) -> models.DailyTask:
+    daily = models.DailyTask(id=f"daily-{days_ago}", user_id=user.uid, date=TODAY - timedelta(days=days_ago))
+    db.add(daily)
+    db.flush()
+    for n in range(tasks):
+        db.add(models.Task(id=f"task-{days_ago}-{n}", daily_task_id=daily.id, task_type="water"))
+    db.flush()
+    return daily
+
+
+def delete_tasks(db, daily: models.DailyTask):
+    db.query(models.Task).filter(models.Task.daily_task_id == daily.id).delete()
+    db.flush()
+
+
+def test_streak_on_counts_days_of_the_stored_run():
+    user = models.User(streak_start_date=TODAY - timedelta(days=2), streak_last_date=TODAY)
+    assert user.streak_on(TODAY) == 3
+    assert user.streak_on(TODAY - timedelta(days=2)) == 1
+    assert user.streak_on(TODAY + timedelta(days=1)) == 0
+    assert models.User().streak_on(TODAY) == 0
+
+
+def test_rebuild_finds_the_latest_run(db, user):
+    for days_ago in (0, 1, 2, 5, 6):
+        add_day(db, user, days_ago)
+    assert crud.compute_and_update_user_streak(db, user.uid) == 3
+    assert (user.streak_start_date, user.streak_last_date) == (TODAY - timedelta(days=2), TODAY)
+
+
+def test_days_without_tasks_do_not_count(db, user):
+    add_day(db, user, 0)
+    add_day(db, user, 1, tasks=0)
+    add_day(db, user, 2)
+    assert crud.compute_and_update_user_streak(db, user.uid) == 1
+
+
+def test_streak_ending_before_today_is_zero(db, user):
+    add_day(db, user, 2)
+    add_day(db, user, 3)
+    assert crud.compute_and_update_user_streak(db, user.uid) == 0
+    assert user.streak_last_date == TODAY - timedelta(days=2)
+
+
+def test_unknown_user_has_no_streak(db):
+    assert crud.compute_and_update_user_streak(db, "nobody") == 0
+
+
+def test_task_write_extends_the_run(db, user):
+    add_day(db, user, 1)
+    crud.compute_and_update_user_streak(db, user.uid)
+    today = add_day(db, user, 0)
+    assert crud.update_streak_on_task_write(db, today.id, added=True) == 2
+
+
+def test_second_task_of_a_day_changes_nothing(db, user):
+    today = add_day(db, user, 0)
+    crud.compute_and_update_user_streak(db, user.uid)
+    db.add(models.Task(id="task-extra", daily_task_id=today.id))
+    db.flush()
+    assert crud.update_streak_on_task_write(db, today.id, added=True) == 1
+
+
+def test_deleting_the_last_task_of_a_middle_day_splits_the_run(db, user):
+    days = {days_ago: add_day(db, user, days_ago) for days_ago in range(4)}
+    assert crud.compute_and_update_user_streak(db, user.uid) == 4
+    delete_tasks(db, days[2])
+    assert crud.update_streak_on_task_write(db, days[2].id, added=False) == 2
+    assert user.streak_start_date == TODAY - timedelta(days=1)
+
+
+def test_deleting_today_shortens_the_run(db, user):
+    days = {days_ago: add_day(db, user, days_ago) for days_ago in range(3)}
+    crud.compute_and_update_user_streak(db, user.uid)
+    delete_tasks(db, days[0])
+    assert crud.update_streak_on_task_write(db, days[0].id, added=False) == 0
+    assert user.streak_last_date == TODAY - timedelta(days=1)
+
+
+def test_filling_a_gap_joins_the_runs(db, user):
+    for days_ago in (0, 1, 3, 4):
+        add_day(db, user, days_ago)
+    assert crud.compute_and_update_user_streak(db, user.uid) == 2
+    gap = add_day(db, user, 2)
+    assert crud.update_streak_on_task_write(db, gap.id, added=True) == 5
+
+
+def test_concurrent_first_tasks_of_a_day_extend_the_run_once(db, user):
+    add_day(db, user, 1)
+    crud.compute_and_update_user_streak(db, user.uid)
+    # Both tasks are written before either streak update takes the user lock
+    today = add_day(db, user, 0, tasks=2)
+    assert crud.update_streak_on_task_write(db, today.id, added=True) == 2
+    assert crud.update_streak_on_task_write(db, today.id, added=True) == 2
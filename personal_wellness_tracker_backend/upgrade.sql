@@ -0,0 +1,107 @@
+-- Personal Wellness Tracker Database Upgrade
+--
+-- Changes to tables of a database created from an older init.sql, and the
+-- tables added since (CREATE TABLE IF NOT EXISTS). Every step is idempotent, so the script can be run again on an upgraded database:
+--   psql -U wellness_user -d wellness_tracker_db -v ON_ERROR_STOP=1 -f upgrade.sql
+
+BEGIN;
+
+-- Day streak: the latest run of days with a task replaces the stored day_streak count
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "streak_start_date" date;
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "streak_last_date" date;
+
+WITH days AS (
+  SELECT dt.user_id, dt.date,
+         dt.date - (row_number() OVER (PARTITION BY dt.user_id ORDER BY dt.date))::int AS island
+  FROM daily_tasks dt
+  WHERE EXISTS (SELECT 1 FROM tasks t WHERE t.daily_task_id = dt.id)
+), runs AS (
+  SELECT DISTINCT ON (user_id) user_id, min(date) AS start_date, max(date) AS last_date
+  FROM days
+  GROUP BY user_id, island
+  ORDER BY user_id, max(date) DESC
+)
+UPDATE "users" u SET "streak_start_date" = runs.start_date, "streak_last_date" = runs.last_date
+FROM runs
+WHERE u.uid = runs.user_id AND u.streak_last_date IS NULL;
+
+ALTER TABLE "users" DROP COLUMN IF EXISTS "day_streak";
+
+-- goal_achievement counts a day once: the days already counted
+CREATE TABLE IF NOT EXISTS "achievement_days" (
+  "user_id" varchar NOT NULL REFERENCES "users" ("uid"),
+  "type" varchar NOT NULL,
+  "date" date NOT NULL,
+  "created_at" timestamp DEFAULT (now()),
+  PRIMARY KEY ("user_id", "type", "date")
+);
+
+-- Keyset pagination of date-range queries: WHERE user_id = ? AND (date, id) > (?, ?)
+CREATE INDEX IF NOT EXISTS "food_logs_user_date_id_idx" ON "food_logs" ("user_id", "date", "id");
+CREATE INDEX IF NOT EXISTS "daily_tasks_user_date_id_idx" ON "daily_tasks" ("user_id", "date", "id");
+CREATE INDEX IF NOT EXISTS "meals_food_log_id_id_idx" ON "meals" ("food_log_id", "id");
+
+-- Default achievement seeding: gen_random_uuid() (pgcrypto before PostgreSQL 13) and one
+-- achievement per (user_id, type). Duplicates are removed first, keeping the unlocked or
+-- most advanced row of each type
+DO $$ BEGIN
+  IF current_setting('server_version_num')::int < 130000 THEN
+    CREATE EXTENSION IF NOT EXISTS pgcrypto;
+  END IF;
+END $$;
+
+DELETE FROM "achievements" a
+USING (
+  SELECT id, row_number() OVER (
+    PARTITION BY user_id, type
+    ORDER BY achieved IS TRUE DESC, current DESC NULLS LAST, created_at, id
+  ) AS rank
+  FROM "achievements"
+) ranked
+WHERE a.id = ranked.id AND ranked.rank > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS "achievements_user_id_type_idx" ON "achievements" ("user_id", "type");
+
+-- Nutrition catalog with its search indexes: fuzzy word similarity and prefix matches on
+-- the normalized name, and the typeahead sync's poll of items written since
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE TABLE IF NOT EXISTS "nutrition_database" (
+  "id" varchar PRIMARY KEY,
+  "food_name" varchar NOT NULL,
+  "food_name_en" varchar,
+  "search_name" varchar NOT NULL,
+  "calories" double precision,
+  "protein" double precision,
+  "carbs" double precision,
+  "fat" double precision,
+  "fiber" double precision,
+  "sugar" double precision,
+  "last_updated" timestamp DEFAULT (now())
+);
+CREATE INDEX IF NOT EXISTS "nutrition_database_search_name_trgm_idx" ON "nutrition_database" USING gin ("search_name" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "nutrition_database_search_name_prefix_idx" ON "nutrition_database" ("search_name" text_pattern_ops);
+CREATE INDEX IF NOT EXISTS "nutrition_database_last_updated_idx" ON "nutrition_database" ("last_updated");
+
+-- Typeahead sync of deleted catalog items: a tombstone per deleted item (PostgreSQL 11+)
+CREATE TABLE IF NOT EXISTS "nutrition_deletions" (
+  "id" varchar PRIMARY KEY,
+  "deleted_at" timestamp NOT NULL DEFAULT (now())
+);
+CREATE INDEX IF NOT EXISTS "nutrition_deletions_deleted_at_idx" ON "nutrition_deletions" ("deleted_at");
+CREATE OR REPLACE FUNCTION nutrition_record_deletion() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO "nutrition_deletions" ("id", "deleted_at") VALUES (OLD.id, now())
+  ON CONFLICT ("id") DO UPDATE SET "deleted_at" = EXCLUDED."deleted_at";
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS "nutrition_database_deleted" ON "nutrition_database";
+CREATE TRIGGER "nutrition_database_deleted" AFTER DELETE ON "nutrition_database"
+  FOR EACH ROW EXECUTE FUNCTION nutrition_record_deletion();
+
+-- Meal enrichment: meals without a catalog match are marked and leave the pending scan
+ALTER TABLE "meals" ADD COLUMN IF NOT EXISTS "nutrition_checked_at" timestamp;
+DROP INDEX IF EXISTS "meals_needs_nutrition_idx";
+CREATE INDEX "meals_needs_nutrition_idx" ON "meals" ("created_at", "id")
+  WHERE "has_nutrition_data" = false AND "nutrition_checked_at" IS NULL;
+
+COMMIT;